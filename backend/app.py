@@ -1,7 +1,10 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 from search import SearchEngine
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import logging
+import os
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -10,13 +13,47 @@ CORS(app, origins=["http://localhost:3000"])  # Allow CORS for React app
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
-# Initialize Search Engine with paths to the necessary files
+# Initialize Search Engine from the current index snapshot written by snapshot.py
 search_engine = SearchEngine(
-    lexicon_path=r"C:\Users\AT\CSV Dataset files\lexicon.csv",
-    barrels_folder=r"C:\Users\AT\CSV Dataset files\inverted_index_barrels",
-    cleaned_dataset_path=r"C:\Users\AT\CSV Dataset files\cleaned_articles_test.csv"
+    snapshot_folder=os.environ.get("SEARCH_SNAPSHOT_FOLDER", r"C:\Users\AT\CSV Dataset files\snapshots"),
+    reload_in_background=True,  # Keep serving the current snapshot while a newer one is opened
+    # Set by gunicorn.conf.py, so /metrics adds up the metrics of all workers
+    metrics_folder=os.environ.get("SEARCH_METRICS_FOLDER"),
+    slow_query_seconds=0.25  # Requests slower than this are logged with their stage timings
 )
 
+# Scoring runs here for /search/async, so the event loop is never blocked on it
+search_executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+PER_PAGE = 10  # Number of results per page
+MAX_BATCH_SIZE = 10000  # Queries accepted by one /search/batch request
+MAX_SUGGESTIONS = 20  # Completions returned by one /suggest request
+MAX_BATCH_RESULTS = 1000  # Results per query of a /search/batch request
+
+def parse_count(value, default, maximum):
+    # A count in 1..maximum, the default when missing, None when invalid
+    if value is None:
+        return default
+    try:
+        count = int(value)
+    except (TypeError, ValueError):
+        return None
+    return count if 1 <= count <= maximum else None
+
+def search_response(query, page):
+    # Perform the search using the SearchEngine; later pages reuse the cached ranking
+    paginated_results, total_results = search_engine.search_page(query, page, PER_PAGE)
+
+    logging.info(f"Returning {len(paginated_results)} results for page {page}.")
+
+    # Return paginated results in the response
+    return {
+        'results': paginated_results,
+        'total_results': total_results,
+        'page': page,
+        'total_pages': (total_results + PER_PAGE - 1) // PER_PAGE  # Calculate total pages
+    }
+
 @app.route('/search', methods=['GET'])
 def search():
     # Get query and page from the request
@@ -28,33 +65,82 @@ def search():
         return jsonify({'error': 'Query parameter is required'}), 400
 
     try:
-        # Perform the search using the SearchEngine
-        results = search_engine.search(query)
-        
-        per_page = 10  # Number of results per page
-        start = (page - 1) * per_page
-        end = start + per_page
-        paginated_results = results[start:end]
-
-        logging.info(f"Returning {len(paginated_results)} results for page {page}.")
-
-        # Return paginated results in the response
-        return jsonify({
-            'results': paginated_results,
-            'total_results': len(results),
-            'page': page,
-            'total_pages': (len(results) + per_page - 1) // per_page  # Calculate total pages
-        }), 200
+        return jsonify(search_response(query, page)), 200
 
     except Exception as e:
         logging.error(f"Error during search: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/search/async', methods=['GET'])
+async def search_async():
+    # Same as /search, with the CPU-bound scoring handed to the executor (needs flask[async])
+    query = request.args.get('query', '').strip()
+    page = int(request.args.get('page', 1))
+
+    if not query:
+        logging.warning("No query provided.")
+        return jsonify({'error': 'Query parameter is required'}), 400
+
+    try:
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(search_executor, search_response, query, page)
+        return jsonify(response), 200
+
+    except Exception as e:
+        logging.error(f"Error during search: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/search/batch', methods=['POST'])
+def search_batch():
+    # Body: {"queries": [...], "max_results": 25}; results come back in query order
+    body = request.get_json(silent=True) or {}
+    queries = body.get('queries')
+    max_results = parse_count(body.get('max_results'), 25, MAX_BATCH_RESULTS)
+
+    if not isinstance(queries, list) or not all(isinstance(query, str) for query in queries):
+        logging.warning("No query list provided.")
+        return jsonify({'error': 'queries must be a list of strings'}), 400
+    if len(queries) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SIZE} queries per batch'}), 400
+    if max_results is None:
+        return jsonify({'error': f'max_results must be an integer from 1 to {MAX_BATCH_RESULTS}'}), 400
+
+    try:
+        results = search_engine.search_batch([query.strip() for query in queries], max_results)
+        logging.info(f"Returning results for a batch of {len(queries)} queries.")
+        return jsonify({'results': results}), 200
+
+    except Exception as e:
+        logging.error(f"Error during batch search: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/suggest', methods=['GET'])
+def suggest():
+    # Completions of the last word typed, for suggest-as-you-type
+    query = request.args.get('query', '')
+    limit = parse_count(request.args.get('limit'), 10, MAX_SUGGESTIONS)
+    if limit is None:
+        return jsonify({'error': f'limit must be an integer from 1 to {MAX_SUGGESTIONS}'}), 400
+    return jsonify({'suggestions': search_engine.suggest(query, limit)}), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Per-stage latency histograms and query counters in the Prometheus text format
+    return Response(search_engine.metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/health', methods=['GET'])
 def health_check():
     # Endpoint for health check
     return jsonify({'status': 'ok'}), 200
 
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    # Hit/miss counters of the query result and postings caches
+    return jsonify({
+        'results': search_engine.result_cache.stats(),
+        'postings': search_engine.postings_cache.stats()
+    }), 200
+
 if __name__ == "__main__":
     # Run the Flask app
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,510 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from columnar import TableWriter, is_parquet, table_schema
+
+try:
+    import resource
+except ImportError:
+    # Peak RSS is left out on Windows
+    resource = None
+
+BUILD_STAGES = ("clean", "lexicon", "forward", "inverted", "tiers", "snapshot")
+
+# Rows generated and written at a time, so corpora larger than memory can be generated
+GENERATE_CHUNK_SIZE = 10000
+
+SYLLABLES = [consonant + vowel for consonant in "bcdfghjklmnprstvz" for vowel in "aeiou"]
+MAX_SYLLABLES = 4
+
+BACKEND_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+
+class SyntheticCorpusGenerator:
+    def __init__(self, num_docs=10000, vocabulary_size=50000, mean_doc_length=200, zipf_exponent=1.1, seed=0):
+        """
+        Generate a reproducible corpus whose word frequencies follow Zipf's law.
+
+        Words are made-up syllable strings ending in "q", so none of them is a
+        stop word or changes when lemmatized, and the same seed always gives
+        the same corpus and query log.
+
+        Args:
+            num_docs (int): Documents to generate
+            vocabulary_size (int): Distinct words
+            mean_doc_length (int): Average tokens per document
+            zipf_exponent (float): Exponent s of P(rank r) ~ 1 / r^s
+            seed (int): Random seed
+        """
+        self.num_docs = num_docs
+        self.vocabulary_size = vocabulary_size
+        self.mean_doc_length = mean_doc_length
+        self.zipf_exponent = zipf_exponent
+        self.seed = seed
+
+        rng = np.random.default_rng(seed)
+        # A dict keeps the first vocabulary_size distinct words in the order they were drawn
+        words = {}
+        while len(words) < vocabulary_size:
+            syllables = rng.integers(0, len(SYLLABLES), size=(vocabulary_size, MAX_SYLLABLES)).tolist()
+            lengths = rng.integers(1, MAX_SYLLABLES + 1, size=vocabulary_size).tolist()
+            for row, length in zip(syllables, lengths):
+                words.setdefault("".join(SYLLABLES[syllable] for syllable in row[:length]) + "q")
+        self.vocabulary = np.array(list(words)[:vocabulary_size])
+
+        ranks = np.arange(1, vocabulary_size + 1, dtype=np.float64)
+        self.probabilities = ranks ** -zipf_exponent
+        self.probabilities /= self.probabilities.sum()
+
+    def _sample(self, rng, size):
+        return self.vocabulary[rng.choice(self.vocabulary_size, size=size, p=self.probabilities)]
+
+    def write(self, output_cleaned_file, output_raw_file=None):
+        """
+        Write the corpus as a cleaned dataset, and optionally as raw articles.
+
+        Args:
+            output_cleaned_file (str): CSV or Parquet file with title, url,
+                tags and cleaned_text columns, as written by DatasetCleaner
+            output_raw_file (str, optional): CSV or Parquet file with url,
+                title, text and tags columns, as written by load_dataset.py,
+                for timing the cleaning stage
+
+        Returns:
+            int: Total number of tokens
+        """
+        rng = np.random.default_rng(self.seed + 1)
+        num_tokens = 0
+        writers = [TableWriter(path, table_schema(dict.fromkeys(columns, "string")) if is_parquet(path) else None)
+                   for path, columns in ((output_cleaned_file, ["title", "url", "tags", "cleaned_text"]),
+                                         (output_raw_file, ["url", "title", "text", "tags"]))
+                   if path is not None]
+        for chunk_start in range(0, self.num_docs, GENERATE_CHUNK_SIZE):
+            doc_ids = np.arange(chunk_start, min(chunk_start + GENERATE_CHUNK_SIZE, self.num_docs))
+            lengths = np.maximum(1, rng.poisson(self.mean_doc_length, len(doc_ids)))
+            tokens = self._sample(rng, int(lengths.sum()))
+            ends = np.cumsum(lengths)
+            texts = [" ".join(tokens[end - length:end]) for end, length in zip(ends.tolist(), lengths.tolist())]
+            num_tokens += int(lengths.sum())
+
+            # Titles and tags repeat words of their document, as real articles mostly do
+            titles = [" ".join(tokens[end - length:end - length + 6]) for end, length in zip(ends.tolist(), lengths.tolist())]
+            tags = [str(tokens[end - length:end - length + 3].tolist()) for end, length in zip(ends.tolist(), lengths.tolist())]
+            urls = [f"https://example.com/article/{doc_id}" for doc_id in doc_ids.tolist()]
+
+            writers[0].write(pd.DataFrame({"title": titles, "url": urls, "tags": tags, "cleaned_text": texts}))
+            if output_raw_file is not None:
+                # Capitals and punctuation give the cleaner something to remove
+                raw_texts = [text.capitalize().replace(" ", ". ", 1) + "." for text in texts]
+                writers[1].write(pd.DataFrame({"url": urls, "title": titles, "text": raw_texts, "tags": tags}))
+
+        for writer in writers:
+            writer.close()
+
+        print(f"Synthetic corpus of {self.num_docs} documents and {num_tokens} tokens saved to {output_cleaned_file}")
+        return num_tokens
+
+    def queries(self, num_queries, seed=None):
+        """
+        Generate a query log: mostly one to three words, with some phrase,
+        prefix and boolean queries. Popular words are queried most often,
+        so the log repeats queries like a real one.
+
+        Args:
+            num_queries (int): Queries to generate
+            seed (int, optional): Random seed; defaults to the corpus seed
+
+        Returns:
+            list: Query strings
+        """
+        rng = np.random.default_rng((self.seed if seed is None else seed) + 2)
+        queries = []
+        for kind in rng.choice(["plain", "phrase", "prefix", "boolean"], num_queries, p=[0.8, 0.1, 0.05, 0.05]):
+            words = self._sample(rng, int(rng.integers(1, 4)))
+            if kind == "phrase":
+                queries.append('"' + " ".join(self._sample(rng, 2)) + '"')
+            elif kind == "prefix":
+                queries.append(words[0][:3] + "*")
+            elif kind == "boolean":
+                first, second = self._sample(rng, 2)
+                queries.append(f"{first} AND {second}" if rng.random() < 0.5 else f"{first} -{second}")
+            else:
+                queries.append(" ".join(words))
+        return queries
+
+
+def _peak_rss_mb(who):
+    if who == "self" and os.path.exists("/proc/self/status"):
+        # Linux carries ru_maxrss over from the parent through exec, the high water mark starts afresh
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _run_build_stage(stage, paths):
+    if stage == "clean":
+        from dataset.clean_dataset import DatasetCleaner
+        # The cleaner's output is only timed; later stages read the generated cleaned corpus
+        if DatasetCleaner(paths["raw"], paths["cleaner_output"]).clean_dataset() is None:
+            raise RuntimeError("Cleaning failed")
+    elif stage == "lexicon":
+        from lexicon import LexiconGenerator
+        LexiconGenerator(paths["cleaned"], paths["lexicon"]).create_lexicon()
+    elif stage == "forward":
+        from forward_indexing import ForwardIndexGenerator
+        ForwardIndexGenerator(paths["cleaned"], paths["lexicon"], paths["forward"],
+                              paths["doc_store"]).create_forward_index()
+    elif stage == "inverted":
+        from inverted_indexing import InvertedIndexGenerator
+        InvertedIndexGenerator(paths["forward"], paths["inverted"], paths["barrels"],
+                               paths["binary_index"]).create_inverted_index()
+    elif stage == "tiers":
+        from tiered_index import TieredIndexBuilder
+        TieredIndexBuilder(paths["binary_index"], paths["doc_store"]).build()
+    elif stage == "snapshot":
+        from snapshot import IndexSnapshotBuilder
+        IndexSnapshotBuilder(paths["lexicon"], paths["binary_index"], paths["doc_store"],
+                             paths["snapshots"]).create_snapshot()
+
+
+def _build_stage_process(stage, paths, connection):
+    try:
+        started = time.perf_counter()
+        _run_build_stage(stage, paths)
+        connection.send({
+            "seconds": round(time.perf_counter() - started, 3),
+            "peak_rss_mb": _peak_rss_mb("self"),
+            # Largest worker process the stage started and waited for, counting
+            # the pages it shared with the stage process
+            "peak_worker_rss_mb": _peak_rss_mb("children"),
+        })
+    except Exception as e:
+        connection.send({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        connection.close()
+
+
+def measure_build_stage(stage, paths):
+    """
+    Run one build stage in a fresh process and measure it.
+
+    A fresh process per stage keeps one stage's memory from counting
+    towards the next one's peak RSS.
+
+    Returns:
+        dict: Wall time in seconds and peak RSS in MB, or an error message
+    """
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_build_stage_process, args=(stage, paths, sender))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = {"error": "Stage process exited without a result"}
+    process.join()
+    print(f"Stage {stage}: {result}")
+    return result
+
+
+def latency_summary(latencies, total_seconds, errors=0):
+    """
+    Summarize request latencies.
+
+    Args:
+        latencies (list): Seconds taken by every request
+        total_seconds (float): Wall time of the whole replay
+        errors (int): Requests that failed
+
+    Returns:
+        dict: Request count, QPS, and mean, p50, p95, p99 and max latency in ms
+    """
+    milliseconds = np.asarray(latencies, dtype=np.float64) * 1000
+    if len(milliseconds) == 0:
+        return {"requests": 0, "errors": errors}
+    p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+    return {
+        "requests": len(milliseconds),
+        "errors": errors,
+        "qps": round(len(milliseconds) / total_seconds, 1) if total_seconds else None,
+        "mean_ms": round(float(milliseconds.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(milliseconds.max()), 3),
+    }
+
+
+def replay_in_process(search_engine, queries, warmup=100, max_results=25):
+    """
+    Replay a query log through SearchEngine.search on this thread.
+
+    Args:
+        search_engine (SearchEngine): Engine to query
+        queries (list): Query strings
+        warmup (int): Queries run first and left out of the results
+        max_results (int): Results per query
+
+    Returns:
+        dict: See latency_summary
+    """
+    for query in queries[:warmup]:
+        search_engine.search(query, max_results)
+
+    latencies = []
+    started = time.perf_counter()
+    for query in queries:
+        query_started = time.perf_counter()
+        search_engine.search(query, max_results)
+        latencies.append(time.perf_counter() - query_started)
+    return latency_summary(latencies, time.perf_counter() - started)
+
+
+def replay_http(base_url, queries, concurrency=8, warmup=100, timeout=30):
+    """
+    Replay a query log against the /search endpoint of a running server.
+
+    Args:
+        base_url (str): Server URL, e.g. http://127.0.0.1:5000
+        queries (list): Query strings
+        concurrency (int): Clients sending requests at the same time
+        warmup (int): Queries sent first and left out of the results
+        timeout (float): Seconds to wait for one response
+
+    Returns:
+        dict: See latency_summary
+    """
+    def fetch(query):
+        url = f"{base_url}/search?" + urllib.parse.urlencode({"query": query, "page": 1})
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as response:
+                response.read()
+            return time.perf_counter() - started, response.status == 200
+        except Exception:
+            return time.perf_counter() - started, False
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(fetch, queries[:warmup]))
+        started = time.perf_counter()
+        responses = list(executor.map(fetch, queries))
+        total_seconds = time.perf_counter() - started
+
+    latencies = [seconds for seconds, ok in responses if ok]
+    return latency_summary(latencies, total_seconds, errors=len(responses) - len(latencies))
+
+
+def start_server(snapshots_folder, port):
+    """
+    Start app.py on the benchmark snapshot with Flask's threaded server.
+
+    Returns:
+        subprocess.Popen: The server process, ready to answer
+    """
+    env = dict(os.environ, SEARCH_SNAPSHOT_FOLDER=snapshots_folder)
+    code = f"import app; app.app.run(host='127.0.0.1', port={port}, threaded=True)"
+    server = subprocess.Popen([sys.executable, "-c", code], cwd=BACKEND_FOLDER, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("The benchmark server exited during startup")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1):
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise TimeoutError("The benchmark server did not start within 120 seconds")
+
+
+def folder_size_mb(folder):
+    total = 0
+    for root, _, filenames in os.walk(folder):
+        total += sum(os.path.getsize(os.path.join(root, filename)) for filename in filenames)
+    return round(total / (1024 * 1024), 2)
+
+
+def _environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_FOLDER,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": commit,
+    }
+
+
+# Metrics compared between runs; for all of them, lower is better except QPS
+COMPARED_METRICS = ("seconds", "peak_rss_mb", "qps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def _flatten(results, prefix=""):
+    values = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            values.update(_flatten(value, f"{prefix}{key}."))
+        elif key in COMPARED_METRICS and isinstance(value, (int, float)):
+            values[prefix + key] = value
+    return values
+
+
+def compare_results(baseline, current, tolerance=0.1):
+    """
+    Compare two benchmark runs.
+
+    Args:
+        baseline (dict): Results of the earlier run
+        current (dict): Results of this run
+        tolerance (float): Relative change treated as noise
+
+    Returns:
+        list: Names of the metrics that got worse by more than tolerance
+    """
+    baseline_values, current_values = _flatten(baseline), _flatten(current)
+    regressions = []
+    for name in sorted(baseline_values.keys() & current_values.keys()):
+        before, after = baseline_values[name], current_values[name]
+        if not before:
+            continue
+        change = (after - before) / before
+        worse = -change if name.endswith("qps") else change
+        flag = "REGRESSION" if worse > tolerance else ""
+        print(f"{name:45} {before:>12} -> {after:>12} ({change:+.1%}) {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a synthetic corpus, time every build stage and replay a query log.")
+    parser.add_argument("--work-folder", default=os.path.join(BACKEND_FOLDER, "benchmark_data"),
+                        help="Folder for the corpus and every file built from it")
+    parser.add_argument("--docs", type=int, default=10000, help="Documents in the synthetic corpus")
+    parser.add_argument("--vocabulary", type=int, default=50000, help="Distinct words in the corpus")
+    parser.add_argument("--doc-length", type=int, default=200, help="Average tokens per document")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of word frequencies")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=5000, help="Queries in the generated query log")
+    parser.add_argument("--query-log", help="Text file with one query per line, instead of a generated log")
+    parser.add_argument("--stages", default=",".join(BUILD_STAGES),
+                        help="Comma-separated build stages to run; skipped stages reuse earlier output")
+    parser.add_argument("--format", choices=("parquet", "csv"), default="parquet",
+                        help="Format of the files passed between build stages")
+    parser.add_argument("--no-result-cache", action="store_true", help="Rank every replayed query")
+    parser.add_argument("--http", action="store_true", help="Also replay through the /search endpoint")
+    parser.add_argument("--url", help="Server to replay against instead of starting app.py")
+    parser.add_argument("--port", type=int, default=5050, help="Port for the app.py server started by --http")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent HTTP clients")
+    parser.add_argument("--output", help="Results JSON file; defaults to a timestamped file in the work folder")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    work_folder = os.path.abspath(args.work_folder)
+    os.makedirs(work_folder, exist_ok=True)
+    extension = "." + args.format
+    paths = {
+        "raw": os.path.join(work_folder, "raw_articles" + extension),
+        "cleaner_output": os.path.join(work_folder, "cleaned_by_cleaner" + extension),
+        "cleaned": os.path.join(work_folder, "cleaned_articles" + extension),
+        "lexicon": os.path.join(work_folder, "lexicon.csv"),
+        "forward": os.path.join(work_folder, "forward_indexing" + extension),
+        "doc_store": os.path.join(work_folder, "doc_store"),
+        "inverted": os.path.join(work_folder, "inverted_indexing" + extension),
+        "barrels": os.path.join(work_folder, "inverted_index_barrels"),
+        "binary_index": os.path.join(work_folder, "binary_index"),
+        "snapshots": os.path.join(work_folder, "snapshots"),
+    }
+    stages = [stage for stage in args.stages.split(",") if stage]
+
+    corpus = SyntheticCorpusGenerator(args.docs, args.vocabulary, args.doc_length, args.zipf, args.seed)
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": _environment(),
+        "corpus": {"docs": args.docs, "vocabulary": args.vocabulary, "doc_length": args.doc_length,
+                   "zipf": args.zipf, "seed": args.seed, "format": args.format},
+        "build": {},
+    }
+
+    try:
+        if stages:
+            started = time.perf_counter()
+            results["corpus"]["tokens"] = corpus.write(paths["cleaned"], paths["raw"] if "clean" in stages else None)
+            results["corpus"]["generate_seconds"] = round(time.perf_counter() - started, 3)
+
+        for stage in stages:
+            results["build"][stage] = measure_build_stage(stage, paths)
+            if "error" in results["build"][stage]:
+                # Replaying now would time the index left by an earlier build
+                print(f"Build stage {stage} failed: {results['build'][stage]['error']}")
+                sys.exit(1)
+        results["build"]["binary_index_mb"] = folder_size_mb(paths["binary_index"])
+        results["build"]["doc_store_mb"] = folder_size_mb(paths["doc_store"])
+
+        if args.query_log:
+            with open(args.query_log, encoding="utf-8") as f:
+                queries = [line.strip() for line in f if line.strip()]
+        else:
+            queries = corpus.queries(args.queries)
+        results["queries"] = {"count": len(queries)}
+
+        from search import SearchEngine
+        started = time.perf_counter()
+        search_engine = SearchEngine(snapshot_folder=paths["snapshots"],
+                                     cache_size=0 if args.no_result_cache else 1024)
+        results["queries"]["open_seconds"] = round(time.perf_counter() - started, 3)
+        results["queries"]["in_process"] = replay_in_process(search_engine, queries)
+        print(f"In-process replay: {results['queries']['in_process']}")
+
+        if args.http or args.url:
+            server = None if args.url else start_server(paths["snapshots"], args.port)
+            try:
+                base_url = args.url or f"http://127.0.0.1:{args.port}"
+                results["queries"]["http"] = replay_http(base_url.rstrip("/"), queries, args.concurrency)
+                results["queries"]["http"]["concurrency"] = args.concurrency
+                print(f"HTTP replay: {results['queries']['http']}")
+            finally:
+                if server is not None:
+                    server.terminate()
+                    server.wait()
+
+        output = args.output or os.path.join(work_folder, f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json")
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Benchmark results saved to {output}")
+
+        if args.compare:
+            with open(args.compare) as f:
+                regressions = compare_results(json.load(f), results, args.tolerance)
+            if regressions:
+                print(f"{len(regressions)} metrics regressed by more than {args.tolerance:.0%}")
+                sys.exit(1)
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,514 @@
+import json
+import os
+import time
+import numpy as np
+from ranking import BM25Scorer
+from postings_codecs import RAW, get_codec
+
+MANIFEST_FILE = "manifest.json"
+POSTINGS_FILE = "postings.bin"
+OFFSETS_FILE = "offsets.bin"
+FREQUENCIES_FILE = "term_frequencies.bin"
+DOC_LENGTHS_FILE = "doc_lengths.bin"
+UPPER_BOUNDS_FILE = "upper_bounds.bin"
+BLOCK_OFFSETS_FILE = "block_offsets.bin"
+BLOCK_LAST_DOCS_FILE = "block_last_docs.bin"
+BLOCK_MAX_SCORES_FILE = "block_max_scores.bin"
+POSITIONS_FILE = "positions.bin"
+POSITION_OFFSETS_FILE = "position_offsets.bin"
+# Byte offset of every encoded block, written when postings use a codec
+BLOCK_DATA_OFFSETS_FILE = "block_data_offsets.bin"
+FREQUENCY_BLOCK_OFFSETS_FILE = "frequency_block_offsets.bin"
+
+DOC_ID_DTYPE = np.int32
+OFFSET_DTYPE = np.int64
+FREQUENCY_DTYPE = np.int32
+SCORE_DTYPE = np.float32
+
+BLOCK_SIZE = 128
+
+
+class BinaryIndexWriter:
+    def __init__(self, output_folder, doc_lengths, k1=1.2, b=0.75, positional=False, codec=RAW,
+                 num_docs=None, avg_doc_length=None):
+        """
+        Stream posting lists into a binary index folder.
+
+        Posting lists must be added in increasing word_id order. Doc IDs are
+        written as one contiguous array of sorted int32 values, term
+        frequencies as a parallel int32 array, and the offsets table maps
+        word_id -> [start, end) into both.
+
+        With a codec (see postings_codecs), doc IDs and term frequencies are
+        instead compressed block by block, and the byte offset of every block
+        is written so any block can be decoded on its own.
+
+        For top-k pruning, every term also gets a BM25 upper bound, and every
+        block of BLOCK_SIZE postings gets its last doc ID and maximum score.
+
+        A positional index also stores every term's token positions, grouped
+        by posting in doc_id order, with an offsets table keyed by word_id.
+
+        Args:
+            output_folder (str): Folder to write the binary index to
+            doc_lengths (iterable): Token count of every document, indexed by doc_id
+            k1 (float): BM25 k1 the upper bounds are computed with
+            b (float): BM25 b the upper bounds are computed with
+            positional (bool): Whether add() receives token positions
+            codec (str): Postings codec name: raw, varint, pfor or elias_fano
+            num_docs (int, optional): Collection size the bounds are computed
+                with, for a shard of a larger collection
+            avg_doc_length (float, optional): Collection average document length
+        """
+        self.output_folder = output_folder
+        os.makedirs(output_folder, exist_ok=True)
+        self.codec_name = codec
+        self.codec = get_codec(codec, BLOCK_SIZE)
+
+        self.doc_lengths = np.asarray(doc_lengths, dtype=FREQUENCY_DTYPE)
+        self.scorer = BM25Scorer(self.doc_lengths, k1=k1, b=b, num_docs=num_docs, avg_doc_length=avg_doc_length)
+        self.collection = None
+        if num_docs is not None or avg_doc_length is not None:
+            self.collection = {"num_docs": num_docs, "avg_doc_length": avg_doc_length}
+
+        self._staged_files = []
+        self._postings_file = open(self._staging_path(POSTINGS_FILE), "wb")
+        self._frequencies_file = open(self._staging_path(FREQUENCIES_FILE), "wb")
+        self._block_last_docs_file = open(self._staging_path(BLOCK_LAST_DOCS_FILE), "wb")
+        self._block_max_scores_file = open(self._staging_path(BLOCK_MAX_SCORES_FILE), "wb")
+        self.positional = positional
+        if positional:
+            self._positions_file = open(self._staging_path(POSITIONS_FILE), "wb")
+        self._position_offsets = [0]
+        self._num_positions = 0
+        self._offsets = [0]
+        self._block_offsets = [0]
+        self._upper_bounds = []
+        self._num_postings = 0
+        self._num_blocks = 0
+        self._num_terms = 0
+        self._block_data_offsets = [0]
+        self._frequency_block_offsets = [0]
+        # Term being added with start_term()/add_postings(), if any
+        self._term = None
+
+    def _staging_path(self, filename):
+        # Files are written under a temporary name and swapped in by close(), so a
+        # search engine mapping the previous index never sees a half-written file
+        self._staged_files.append(filename)
+        return os.path.join(self.output_folder, filename + ".tmp")
+
+    def add(self, word_id, doc_ids, term_frequencies, positions=None, document_frequency=None):
+        """
+        Append the posting list of a single term.
+
+        Args:
+            word_id (int): Term ID, greater than any previously added ID
+            doc_ids (iterable): Sorted document IDs containing the term
+            term_frequencies (iterable): Occurrences of the term in each doc
+            positions (iterable, optional): Token positions of the term, for
+                each doc in order; required for a positional index
+            document_frequency (int, optional): Collection document frequency
+                the bounds are computed with; defaults to len(doc_ids)
+        """
+        doc_ids = np.asarray(doc_ids, dtype=DOC_ID_DTYPE)
+        self.start_term(word_id, document_frequency or len(doc_ids))
+        self.add_postings(doc_ids, term_frequencies, positions)
+        self.finish_term()
+
+    def start_term(self, word_id, document_frequency):
+        """
+        Start a posting list that is added a slice at a time with add_postings().
+
+        Only one partial block of the term is held in memory, so lists of
+        any length can be streamed in. finish_term() ends the list.
+
+        Args:
+            word_id (int): Term ID, greater than any previously added ID
+            document_frequency (int): Number of documents the whole list
+                will hold; the bounds are computed with it
+        """
+        if self._term is not None:
+            raise ValueError(f"word_id {self._term['word_id']} was not finished")
+        if word_id < len(self._offsets) - 1:
+            raise ValueError(f"word_id {word_id} added out of order")
+
+        # Word IDs without postings get empty [start, start) ranges
+        while len(self._offsets) <= word_id:
+            self._offsets.append(self._num_postings)
+            self._block_offsets.append(self._num_blocks)
+            self._upper_bounds.append(0.0)
+            self._position_offsets.append(self._num_positions)
+
+        self._term = {
+            "word_id": word_id,
+            "document_frequency": document_frequency,
+            "upper_bound": 0.0,
+            # Last doc ID written, which the next block's first gap is taken from
+            "last_doc": 0,
+            # Postings of the block that is not full yet
+            "doc_ids": np.empty(0, dtype=DOC_ID_DTYPE),
+            "term_frequencies": np.empty(0, dtype=FREQUENCY_DTYPE),
+        }
+
+    def add_postings(self, doc_ids, term_frequencies, positions=None):
+        """
+        Append the next slice of the current term's posting list.
+
+        Args:
+            doc_ids (iterable): Sorted document IDs, all after those already added
+            term_frequencies (iterable): Occurrences of the term in each doc
+            positions (iterable, optional): Token positions of the term, for
+                each doc in order; required for a positional index
+        """
+        term = self._term
+        doc_ids = np.asarray(doc_ids, dtype=DOC_ID_DTYPE)
+        term_frequencies = np.asarray(term_frequencies, dtype=FREQUENCY_DTYPE)
+        if len(doc_ids) != len(term_frequencies):
+            raise ValueError(f"word_id {term['word_id']} has mismatched doc_ids and term_frequencies")
+
+        if self.positional:
+            positions = np.asarray(positions, dtype=DOC_ID_DTYPE)
+            if len(positions) != int(term_frequencies.sum()):
+                raise ValueError(f"word_id {term['word_id']} has positions that don't match its term frequencies")
+            positions.tofile(self._positions_file)
+            self._num_positions += len(positions)
+
+        # Whole blocks are written now; the rest waits for the next slice
+        doc_ids = np.concatenate((term["doc_ids"], doc_ids))
+        term_frequencies = np.concatenate((term["term_frequencies"], term_frequencies))
+        full = len(doc_ids) - len(doc_ids) % BLOCK_SIZE
+        self._write_postings(doc_ids[:full], term_frequencies[:full])
+        term["doc_ids"], term["term_frequencies"] = doc_ids[full:], term_frequencies[full:]
+
+    def finish_term(self):
+        """End the posting list started by start_term()."""
+        term = self._term
+        self._write_postings(term["doc_ids"], term["term_frequencies"])
+        self._term = None
+
+        self._upper_bounds.append(term["upper_bound"])
+        self._position_offsets.append(self._num_positions)
+        self._num_terms += 1
+        self._offsets.append(self._num_postings)
+        self._block_offsets.append(self._num_blocks)
+
+    def _write_postings(self, doc_ids, term_frequencies):
+        if len(doc_ids) == 0:
+            return
+
+        if self.codec is None:
+            doc_ids.tofile(self._postings_file)
+            term_frequencies.tofile(self._frequencies_file)
+        else:
+            self._write_encoded(doc_ids, term_frequencies)
+        self._write_blocks(doc_ids, term_frequencies)
+        self._term["last_doc"] = int(doc_ids[-1])
+        self._num_postings += len(doc_ids)
+
+    def _write_encoded(self, doc_ids, term_frequencies):
+        data, block_lengths = self.codec.encode_doc_ids_many(doc_ids, base=self._term["last_doc"])
+        self._postings_file.write(data)
+        self._block_data_offsets.extend((self._block_data_offsets[-1] + np.cumsum(block_lengths)).tolist())
+
+        data, block_lengths = self.codec.encode_values_many(term_frequencies)
+        self._frequencies_file.write(data)
+        self._frequency_block_offsets.extend((self._frequency_block_offsets[-1] + np.cumsum(block_lengths)).tolist())
+
+    def _write_blocks(self, doc_ids, term_frequencies):
+        scores = self.scorer.term_scores(doc_ids, term_frequencies, self._term["document_frequency"])
+        block_starts = np.arange(0, len(doc_ids), BLOCK_SIZE)
+        block_ends = np.minimum(block_starts + BLOCK_SIZE, len(doc_ids))
+
+        doc_ids[block_ends - 1].tofile(self._block_last_docs_file)
+        np.maximum.reduceat(scores, block_starts).astype(SCORE_DTYPE).tofile(self._block_max_scores_file)
+
+        self._term["upper_bound"] = max(self._term["upper_bound"], float(scores.max()))
+        self._num_blocks += len(block_starts)
+
+    def close(self):
+        """
+        Write the offsets tables, upper bounds, document lengths and manifest.
+        """
+        self._postings_file.close()
+        self._frequencies_file.close()
+        self._block_last_docs_file.close()
+        self._block_max_scores_file.close()
+        np.asarray(self._offsets, dtype=OFFSET_DTYPE).tofile(self._staging_path(OFFSETS_FILE))
+        np.asarray(self._block_offsets, dtype=OFFSET_DTYPE).tofile(self._staging_path(BLOCK_OFFSETS_FILE))
+        np.asarray(self._upper_bounds, dtype=SCORE_DTYPE).tofile(self._staging_path(UPPER_BOUNDS_FILE))
+        if self.codec is not None:
+            np.asarray(self._block_data_offsets, dtype=OFFSET_DTYPE).tofile(
+                self._staging_path(BLOCK_DATA_OFFSETS_FILE)
+            )
+            np.asarray(self._frequency_block_offsets, dtype=OFFSET_DTYPE).tofile(
+                self._staging_path(FREQUENCY_BLOCK_OFFSETS_FILE)
+            )
+        if self.positional:
+            self._positions_file.close()
+            np.asarray(self._position_offsets, dtype=OFFSET_DTYPE).tofile(
+                self._staging_path(POSITION_OFFSETS_FILE)
+            )
+
+        doc_lengths = self.doc_lengths
+        doc_lengths.tofile(self._staging_path(DOC_LENGTHS_FILE))
+        num_docs = len(doc_lengths)
+
+        manifest = {
+            "doc_id_dtype": np.dtype(DOC_ID_DTYPE).name,
+            "offset_dtype": np.dtype(OFFSET_DTYPE).name,
+            "frequency_dtype": np.dtype(FREQUENCY_DTYPE).name,
+            "score_dtype": np.dtype(SCORE_DTYPE).name,
+            "block_size": BLOCK_SIZE,
+            "codec": self.codec_name,
+            "bm25": {"k1": self.scorer.k1, "b": self.scorer.b},
+            "positional": self.positional,
+            "num_docs": num_docs,
+            "avg_doc_length": float(doc_lengths.mean()) if num_docs else 0.0,
+            "num_terms": self._num_terms,
+            "num_postings": self._num_postings,
+            "max_word_id": len(self._offsets) - 2,
+            "build_id": time.time_ns(),
+        }
+        if self.collection is not None:
+            manifest["collection"] = self.collection
+        with open(self._staging_path(MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        # The manifest goes last: readers treat a new manifest as a finished build
+        for filename in self._staged_files:
+            os.replace(os.path.join(self.output_folder, filename + ".tmp"),
+                       os.path.join(self.output_folder, filename))
+
+
+class BinaryIndex:
+    def __init__(self, index_folder):
+        """
+        Open a binary index folder with memory-mapped postings.
+
+        Args:
+            index_folder (str): Folder written by BinaryIndexWriter
+        """
+        manifest_path = os.path.join(index_folder, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"No binary index manifest found at {manifest_path}")
+
+        with open(manifest_path) as f:
+            self.manifest = json.load(f)
+
+        self.index_folder = index_folder
+        self.num_docs = self.manifest["num_docs"]
+        self.block_size = self.manifest["block_size"]
+        # Indexes written before codecs existed hold raw postings
+        self.codec = get_codec(self.manifest.get("codec", RAW), self.block_size)
+        self._offsets = self._map(OFFSETS_FILE, self.manifest["offset_dtype"])
+        if self.codec is None:
+            self._doc_ids = self._map(POSTINGS_FILE, self.manifest["doc_id_dtype"])
+            self._frequencies = self._map(FREQUENCIES_FILE, self.manifest["frequency_dtype"])
+        else:
+            self._doc_ids = self._map(POSTINGS_FILE, np.uint8)
+            self._frequencies = self._map(FREQUENCIES_FILE, np.uint8)
+            self._block_data_offsets = self._map(BLOCK_DATA_OFFSETS_FILE, self.manifest["offset_dtype"])
+            self._frequency_block_offsets = self._map(FREQUENCY_BLOCK_OFFSETS_FILE, self.manifest["offset_dtype"])
+        self.doc_lengths = self._map(DOC_LENGTHS_FILE, self.manifest["frequency_dtype"])
+        self._upper_bounds = self._map(UPPER_BOUNDS_FILE, self.manifest["score_dtype"])
+        self._block_offsets = self._map(BLOCK_OFFSETS_FILE, self.manifest["offset_dtype"])
+        self._block_last_docs = self._map(BLOCK_LAST_DOCS_FILE, self.manifest["doc_id_dtype"])
+        self._block_max_scores = self._map(BLOCK_MAX_SCORES_FILE, self.manifest["score_dtype"])
+
+        self.positional = self.manifest.get("positional", False)
+        if self.positional:
+            self._positions = self._map(POSITIONS_FILE, self.manifest["doc_id_dtype"])
+            self._position_offsets = self._map(POSITION_OFFSETS_FILE, self.manifest["offset_dtype"])
+
+    def _map(self, filename, dtype):
+        path = os.path.join(self.index_folder, filename)
+        # np.memmap refuses empty files, which an index without postings has
+        if os.path.getsize(path) == 0:
+            return np.empty(0, dtype=dtype)
+        # Plain ndarray view of the map: slicing np.memmap objects is much slower
+        return np.asarray(np.memmap(path, dtype=dtype, mode="r"))
+
+    def _range(self, word_id):
+        if word_id < 0 or word_id + 1 >= len(self._offsets):
+            return 0, 0
+        return int(self._offsets[word_id]), int(self._offsets[word_id + 1])
+
+    def _block_range(self, word_id):
+        if word_id < 0 or word_id + 1 >= len(self._block_offsets):
+            return 0, 0
+        return int(self._block_offsets[word_id]), int(self._block_offsets[word_id + 1])
+
+    def _block_counts(self, word_id):
+        start, end = self._range(word_id)
+        first_block, end_block = self._block_range(word_id)
+        counts = np.full(end_block - first_block, self.block_size, dtype=np.int64)
+        if len(counts):
+            counts[-1] = end - start - self.block_size * (len(counts) - 1)
+        return counts
+
+    def _decode(self, word_id, data, block_data_offsets, doc_ids):
+        first_block, end_block = self._block_range(word_id)
+        if first_block == end_block:
+            return np.empty(0, dtype=DOC_ID_DTYPE if doc_ids else FREQUENCY_DTYPE)
+
+        byte_offsets = block_data_offsets[first_block:end_block + 1]
+        data = data[byte_offsets[0]:byte_offsets[-1]]
+        byte_offsets = byte_offsets - byte_offsets[0]
+        if doc_ids:
+            values = self.codec.decode_doc_ids_many(data, byte_offsets, self._block_counts(word_id))
+            return values.astype(DOC_ID_DTYPE)
+        values = self.codec.decode_values_many(data, byte_offsets, self._block_counts(word_id))
+        return values.astype(FREQUENCY_DTYPE)
+
+    def postings(self, word_id):
+        """
+        Return the sorted doc IDs of a term.
+
+        Args:
+            word_id (int): Term ID from the lexicon
+
+        Returns:
+            np.ndarray: Read-only int32 view into the mapped postings, or the
+                decoded doc IDs when the index uses a codec
+        """
+        if self.codec is not None:
+            return self._decode(word_id, self._doc_ids, self._block_data_offsets, doc_ids=True)
+        start, end = self._range(word_id)
+        return self._doc_ids[start:end]
+
+    def posting_blocks(self, word_id):
+        """
+        Return the doc IDs of a term for block-wise access.
+
+        Intersections only look at the blocks their candidates fall into (see
+        boolean_query.locate), so with a codec the other blocks are never
+        decoded.
+
+        Args:
+            word_id (int): Term ID from the lexicon
+
+        Returns:
+            np.ndarray or PostingBlocks: The raw postings view, or a lazily
+                decoded posting list when the index uses a codec
+        """
+        if self.codec is None:
+            return self.postings(word_id)
+        return PostingBlocks(self, word_id)
+
+    def term_frequencies(self, word_id):
+        """
+        Return the term frequencies parallel to postings(word_id).
+
+        Args:
+            word_id (int): Term ID from the lexicon
+
+        Returns:
+            np.ndarray: Read-only int32 view into the mapped frequencies, or
+                the decoded frequencies when the index uses a codec
+        """
+        if self.codec is not None:
+            return self._decode(word_id, self._frequencies, self._frequency_block_offsets, doc_ids=False)
+        start, end = self._range(word_id)
+        return self._frequencies[start:end]
+
+    def document_frequency(self, word_id):
+        start, end = self._range(word_id)
+        return end - start
+
+    def word_ids(self):
+        """Sorted IDs of the terms with at least one posting."""
+        return np.flatnonzero(np.diff(self._offsets))
+
+    def upper_bound(self, word_id):
+        """
+        Return the highest BM25 score any document gets from this term.
+
+        Bounds are computed with the k1/b recorded in manifest["bm25"].
+        """
+        if word_id < 0 or word_id >= len(self._upper_bounds):
+            return 0.0
+        return float(self._upper_bounds[word_id])
+
+    def blocks(self, word_id):
+        """
+        Return the skip data of a term's posting blocks.
+
+        Args:
+            word_id (int): Term ID from the lexicon
+
+        Returns:
+            tuple: (last doc ID of each block, max BM25 score of each block)
+        """
+        start, end = self._block_range(word_id)
+        return self._block_last_docs[start:end], self._block_max_scores[start:end]
+
+    def positions(self, word_id, posting_indices):
+        """
+        Return the token positions of a term in some of its postings.
+
+        Args:
+            word_id (int): Term ID from the lexicon
+            posting_indices (np.ndarray): Indices into postings(word_id)
+
+        Returns:
+            tuple: (positions of all requested postings concatenated in the
+                given order, number of positions per requested posting)
+        """
+        if not self.positional:
+            raise ValueError("This index was built without positions")
+
+        frequencies = self.term_frequencies(word_id)
+        posting_indices = np.asarray(posting_indices, dtype=np.int64)
+        counts = frequencies[posting_indices].astype(np.int64)
+
+        # Start of each posting's positions, relative to the term's first position
+        posting_starts = np.cumsum(frequencies, dtype=np.int64) - frequencies
+        starts = int(self._position_offsets[word_id]) + posting_starts[posting_indices]
+
+        # Expand every [start, start + count) range into one flat gather index
+        ends = np.cumsum(counts)
+        gather = np.repeat(starts - (ends - counts), counts) + np.arange(ends[-1] if len(ends) else 0)
+        return self._positions[gather], counts
+
+
+class PostingBlocks:
+    def __init__(self, index, word_id):
+        """
+        Posting list of a codec-compressed index, decoded one block at a time.
+
+        Args:
+            index (BinaryIndex): Index using a postings codec
+            word_id (int): Term ID from the lexicon
+        """
+        self.index = index
+        self.word_id = word_id
+        self._first_block, self._end_block = index._block_range(word_id)
+        self._length = index.document_frequency(word_id)
+        self._block_last_docs = index.blocks(word_id)[0]
+
+    def __len__(self):
+        return self._length
+
+    def __array__(self, dtype=None, copy=None):
+        doc_ids = self.index.postings(self.word_id)
+        return doc_ids if dtype is None else doc_ids.astype(dtype)
+
+    def block(self, block):
+        """
+        Decode a single block.
+
+        Args:
+            block (int): Block number within the term, starting at 0
+
+        Returns:
+            np.ndarray: int32 doc IDs of the block
+        """
+        index = self.index
+        data_block = self._first_block + block
+        start = int(index._block_data_offsets[data_block])
+        end = int(index._block_data_offsets[data_block + 1])
+        count = min(index.block_size, self._length - block * index.block_size)
+        # The previous block's last doc ID is the base the block's gaps start from
+        base = int(self._block_last_docs[block - 1]) if block else 0
+        return index.codec.decode_doc_ids(index._doc_ids[start:end], count, base).astype(DOC_ID_DTYPE)
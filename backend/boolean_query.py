@@ -0,0 +1,139 @@
+import numpy as np
+from query_parser import Term, Phrase, And, Or, Not
+
+EMPTY = np.empty(0, dtype=np.int32)
+
+
+def locate(candidates, doc_ids, block_last_docs=None, block_size=None):
+    """
+    Find sorted candidate doc IDs in a sorted posting list.
+
+    With block skip data, each candidate is first mapped to the only block
+    that can hold it, and just that block is searched; blocks without
+    candidates are never touched. Without skip data the whole list is
+    searched; NumPy's searchsorted resumes from the previous hit when the
+    keys are sorted, which behaves like a galloping merge.
+
+    Args:
+        candidates (np.ndarray): Sorted doc IDs to look up
+        doc_ids (np.ndarray or PostingBlocks): Sorted posting list; a
+            PostingBlocks list needs block_last_docs
+        block_last_docs (np.ndarray, optional): Last doc ID of each block
+        block_size (int, optional): Postings per block
+
+    Returns:
+        tuple: (boolean mask of candidates present in doc_ids, index of each
+            candidate in doc_ids where present)
+    """
+    found = np.zeros(len(candidates), dtype=bool)
+    positions = np.zeros(len(candidates), dtype=np.int64)
+    if len(candidates) == 0 or len(doc_ids) == 0:
+        return found, positions
+
+    if block_last_docs is None:
+        positions = np.minimum(np.searchsorted(doc_ids, candidates), len(doc_ids) - 1)
+        return np.asarray(doc_ids[positions]) == candidates, positions
+
+    blocks = np.searchsorted(block_last_docs, candidates)
+    # Candidates are sorted, so each block's candidates form one contiguous run
+    boundaries = np.flatnonzero(np.diff(blocks)) + 1
+    for run in np.split(np.arange(len(candidates)), boundaries):
+        block = int(blocks[run[0]])
+        if block >= len(block_last_docs):
+            break
+        start = block * block_size
+        # Compressed posting lists decode just this block (binary_index.PostingBlocks)
+        block_docs = doc_ids.block(block) if hasattr(doc_ids, "block") else doc_ids[start:start + block_size]
+        in_block = np.minimum(np.searchsorted(block_docs, candidates[run]), len(block_docs) - 1)
+        found[run] = block_docs[in_block] == candidates[run]
+        positions[run] = start + in_block
+    return found, positions
+
+
+class BooleanQueryEvaluator:
+    def __init__(self, index, lexicon):
+        """
+        Evaluate parsed AND/OR/NOT and phrase queries to matching doc IDs.
+
+        Args:
+            index (BinaryIndex): Index to read postings and positions from
+            lexicon (dict): word -> word_id
+        """
+        self.index = index
+        self.lexicon = lexicon
+        # Phrase matching packs (doc_id, position) into one int64 key
+        self._position_stride = int(index.doc_lengths.max()) + 1 if len(index.doc_lengths) else 1
+
+    def _operand(self, node):
+        """Matching doc IDs of a node, with skip data when it is a single term."""
+        if isinstance(node, Term):
+            word_id = self.lexicon.get(node.word)
+            if word_id is None:
+                return EMPTY, None
+            return self.index.posting_blocks(word_id), self.index.blocks(word_id)[0]
+        return self.evaluate(node), None
+
+    def _intersect(self, operands):
+        """AND together (doc_ids, skip data) operands, starting from the shortest list."""
+        operands = sorted(operands, key=lambda operand: len(operand[0]))
+        result = np.asarray(operands[0][0])
+        for doc_ids, block_last_docs in operands[1:]:
+            if len(result) == 0:
+                break
+            found, _ = locate(result, doc_ids, block_last_docs, self.index.block_size)
+            result = result[found]
+        return result
+
+    def _phrase(self, words):
+        word_ids = [self.lexicon.get(word) for word in words]
+        if None in word_ids:
+            return EMPTY
+
+        operands = [(self.index.posting_blocks(word_id), self.index.blocks(word_id)[0]) for word_id in word_ids]
+        candidates = self._intersect(operands)
+        if len(candidates) == 0 or not self.index.positional:
+            return candidates
+
+        # Keep (doc, start) pairs where every word sits at start + its offset in the phrase
+        starts = None
+        for offset, word_id in enumerate(word_ids):
+            _, posting_indices = locate(candidates, self.index.postings(word_id))
+            positions, counts = self.index.positions(word_id, posting_indices)
+
+            owners = np.repeat(candidates.astype(np.int64), counts)
+            phrase_starts = positions.astype(np.int64) - offset
+            valid = phrase_starts >= 0
+            keys = np.unique(owners[valid] * self._position_stride + phrase_starts[valid])
+
+            starts = keys if starts is None else np.intersect1d(starts, keys, assume_unique=True)
+            if len(starts) == 0:
+                return EMPTY
+
+        return np.unique(starts // self._position_stride).astype(np.int32)
+
+    def evaluate(self, node):
+        """
+        Return the sorted doc IDs matching a query tree.
+
+        A Not is only meaningful inside an And; a bare Not matches nothing.
+        """
+        if node is None or isinstance(node, Not):
+            return EMPTY
+        if isinstance(node, Term):
+            return np.asarray(self._operand(node)[0])
+        if isinstance(node, Phrase):
+            return self._phrase(node.words)
+        if isinstance(node, Or):
+            parts = [self.evaluate(child) for child in node.children]
+            return np.unique(np.concatenate(parts)) if parts else EMPTY
+
+        included = [self._operand(child) for child in node.children if not isinstance(child, Not)]
+        if not included:
+            return EMPTY
+        result = self._intersect(included)
+        for child in node.children:
+            if isinstance(child, Not) and len(result):
+                doc_ids, block_last_docs = self._operand(child.child)
+                found, _ = locate(result, doc_ids, block_last_docs, self.index.block_size)
+                result = result[~found]
+        return result
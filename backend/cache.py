@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class QueryResultCache:
+    def __init__(self, max_entries=1024, ttl_seconds=300):
+        """
+        LRU cache of ranked results with a time-to-live.
+
+        Args:
+            max_entries (int): Entries kept before the least recently used is evicted
+            ttl_seconds (float): Age after which an entry is treated as a miss
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Look up a cached value.
+
+        Args:
+            key: Hashable cache key
+
+        Returns:
+            The cached value, or None on a miss or an expired entry
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if time.monotonic() - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+            }
+
+
+class PostingsCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        """
+        LRU cache of decoded posting lists within a memory budget.
+
+        Args:
+            max_bytes (int): Total size of cached arrays before the least
+                recently used lists are evicted; 0 disables the cache
+        """
+        self.max_bytes = max_bytes
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Look up the cached arrays of a term.
+
+        Args:
+            key: Hashable key of the term, e.g. (index generation, word_id)
+
+        Returns:
+            tuple: The cached arrays, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, arrays):
+        """
+        Cache the arrays of a term, evicting others to stay within budget.
+
+        Args:
+            key: Hashable key of the term
+            arrays (tuple): NumPy arrays of the posting list
+
+        Returns:
+            bool: Whether the arrays were cached; lists larger than the
+                whole budget never are
+        """
+        size = sum(array.nbytes for array in arrays)
+        if size > self.max_bytes:
+            return False
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.resident_bytes -= previous[0]
+
+            self._entries[key] = (size, arrays)
+            self.resident_bytes += size
+            while self.resident_bytes > self.max_bytes:
+                _, (evicted_size, _) = self._entries.popitem(last=False)
+                self.resident_bytes -= evicted_size
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.resident_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'resident_bytes': self.resident_bytes,
+                'max_bytes': self.max_bytes,
+            }
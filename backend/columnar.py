@@ -0,0 +1,271 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # Parquet is optional; CSV files are read and written without pyarrow
+    pa = pq = None
+
+PARQUET_SUFFIX = ".parquet"
+# Rows per Parquet row group, and per batch when streaming one
+ROW_GROUP_SIZE = 10000
+
+
+def is_parquet(path):
+    """Pipeline files ending in .parquet are Parquet; any other file is CSV."""
+    return str(path).lower().endswith(PARQUET_SUFFIX)
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is needed for Parquet files: pip install pyarrow")
+
+
+def table_schema(columns):
+    """
+    Arrow schema of a pipeline table.
+
+    Args:
+        columns (dict): Column name -> "string", "int32" or "list<int32>"
+
+    Returns:
+        pa.Schema: The schema, with the columns in the given order
+    """
+    _require_pyarrow()
+    types = {"string": pa.string(), "int32": pa.int32(), "list<int32>": pa.list_(pa.int32())}
+    return pa.schema([(name, types[type_name]) for name, type_name in columns.items()])
+
+
+def column_names(path):
+    """Column names of a CSV or Parquet file, read from its header or footer only."""
+    if is_parquet(path):
+        _require_pyarrow()
+        return pq.ParquetFile(path).schema_arrow.names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def iter_batches(path, columns=None, batch_size=ROW_GROUP_SIZE, row_groups=None):
+    """
+    Stream a Parquet file as Arrow record batches.
+
+    Only the given columns and row groups are read from disk, one row group
+    at a time.
+
+    Args:
+        path (str): Parquet file
+        columns (list, optional): Columns to read; all of them by default
+        batch_size (int): Rows per batch at most
+        row_groups (list, optional): Row groups to read; all of them by default
+
+    Yields:
+        tuple: (row number of the batch's first row, pa.RecordBatch)
+    """
+    _require_pyarrow()
+    parquet_file = pq.ParquetFile(path)
+    metadata = parquet_file.metadata
+    group_starts = np.concatenate(([0], np.cumsum([metadata.row_group(group).num_rows
+                                                   for group in range(metadata.num_row_groups)])))
+    if row_groups is None:
+        row_groups = range(metadata.num_row_groups)
+
+    for group in row_groups:
+        start = int(group_starts[group])
+        # Read group by group, so row numbers stay known when groups are skipped
+        for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=[group], columns=columns):
+            yield start, batch
+            start += batch.num_rows
+
+
+def read_chunks(path, columns=None, chunk_size=ROW_GROUP_SIZE, row_groups=None):
+    """
+    Stream a CSV or Parquet file as DataFrames indexed by row number.
+
+    The indexers use row numbers as doc IDs, so chunks of either format are
+    indexed the same way as pd.read_csv(chunksize=...) chunks.
+
+    Args:
+        path (str): CSV or Parquet file
+        columns (list, optional): Columns to read; all of them by default
+        chunk_size (int): Rows per chunk at most
+        row_groups (list, optional): Parquet row groups to read; CSV files
+            are always read whole
+
+    Yields:
+        pd.DataFrame: The next chunk of rows
+    """
+    if not is_parquet(path):
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_size)
+        return
+
+    for start, batch in iter_batches(path, columns, chunk_size, row_groups):
+        chunk = batch.to_pandas()
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        yield chunk
+
+
+def list_array(lengths, values):
+    """
+    Build a list<int32> array without a Python object per row.
+
+    Args:
+        lengths (np.ndarray): Number of values of each row
+        values (np.ndarray): Values of all rows, one row after another
+
+    Returns:
+        pa.ListArray: One list per row
+    """
+    _require_pyarrow()
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int32)
+    np.cumsum(lengths, out=offsets[1:])
+    return pa.ListArray.from_arrays(pa.array(offsets, type=pa.int32()),
+                                    pa.array(np.asarray(values, dtype=np.int32), type=pa.int32()))
+
+
+def list_lengths_and_values(array):
+    """
+    Split a list<int32> column into numpy arrays; the inverse of list_array.
+
+    Returns:
+        tuple: (length of each row, values of all rows), int32 arrays; null
+            rows have length 0
+    """
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    lengths = array.value_lengths().fill_null(0).to_numpy(zero_copy_only=False).astype(np.int32)
+    # flatten() honours slicing and skips null rows, unlike .values
+    values = array.flatten().to_numpy(zero_copy_only=False).astype(np.int32)
+    return lengths, values
+
+
+def _csv_frame(table):
+    # List columns are written space-separated, like the CSV pipeline always did
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        if pa.types.is_list(column.type):
+            columns[name] = [" ".join(map(str, values)) if values is not None else ""
+                             for values in column.to_pylist()]
+        else:
+            columns[name] = column.to_pandas()
+    return pd.DataFrame(columns)
+
+
+class TableWriter:
+    def __init__(self, path, schema=None, columns=None, row_group_size=ROW_GROUP_SIZE):
+        """
+        Stream tables into a Parquet file, or into a CSV file when the path
+        does not end in .parquet.
+
+        Rows are written under a temporary name that close() moves into
+        place, so readers never see a half-written file.
+
+        Args:
+            path (str): File to write
+            schema (pa.Schema, optional): Schema of the Parquet file; DataFrames
+                are converted to it. Required for Parquet.
+            columns (list, optional): Header of a CSV file that gets no rows;
+                defaults to the schema's column names
+            row_group_size (int): Rows per Parquet row group at most
+        """
+        self.path = path
+        self.schema = schema
+        self.columns = columns if columns is not None or schema is None else schema.names
+        self.row_group_size = row_group_size
+        self.parquet = is_parquet(path)
+        self.num_rows = 0
+        self._temp_path = path + ".tmp"
+        self._writer = None
+        self._header = True
+
+        if self.parquet:
+            _require_pyarrow()
+            if schema is None:
+                raise ValueError(f"A schema is needed to write {path}")
+            self._writer = pq.ParquetWriter(self._temp_path, schema)
+
+    def write(self, data):
+        """
+        Append rows.
+
+        Args:
+            data (pd.DataFrame | dict | pa.RecordBatch | pa.Table): Rows with
+                the writer's columns; a dict maps column names to numpy or
+                Arrow arrays. The DataFrame index is not written.
+        """
+        if isinstance(data, dict):
+            data = pa.Table.from_pydict(data, schema=self.schema)
+        if self.parquet:
+            if isinstance(data, pd.DataFrame):
+                data = pa.Table.from_pandas(data, schema=self.schema, preserve_index=False)
+            elif isinstance(data, pa.RecordBatch):
+                data = pa.Table.from_batches([data])
+            self._writer.write_table(data.cast(self.schema), row_group_size=self.row_group_size)
+        else:
+            if not isinstance(data, pd.DataFrame):
+                data = _csv_frame(data)
+            data.to_csv(self._temp_path, mode="w" if self._header else "a", header=self._header, index=False)
+            self._header = False
+        self.num_rows += len(data)
+
+    def close(self):
+        """Finish the file and move it into place."""
+        if self.parquet:
+            self._writer.close()
+        elif self._header:
+            # Nothing was written; still write the header
+            pd.DataFrame(columns=self.columns).to_csv(self._temp_path, index=False)
+        os.replace(self._temp_path, self.path)
+
+    def abort(self):
+        """Drop the partly written file."""
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def export_csv(input_file, output_file, chunk_size=ROW_GROUP_SIZE):
+    """
+    Export a Parquet pipeline file to CSV, streaming it a batch at a time.
+
+    List columns become space-separated numbers, so the CSV matches the one
+    the stage would have written with a .csv output path.
+
+    Returns:
+        int: Number of rows exported
+    """
+    try:
+        _require_pyarrow()
+        with TableWriter(output_file, pq.ParquetFile(input_file).schema_arrow) as writer:
+            for _, batch in iter_batches(input_file, batch_size=chunk_size):
+                writer.write(batch)
+        print(f"Exported {writer.num_rows} rows from {input_file} to {output_file}")
+        return writer.num_rows
+
+    except Exception as e:
+        print(f"Error exporting {input_file}: {e}")
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a Parquet pipeline file to CSV.")
+    parser.add_argument("input_file", help="Parquet file written by a pipeline stage")
+    parser.add_argument("output_file", help="CSV file to write")
+    args = parser.parse_args()
+    export_csv(args.input_file, args.output_file)
+
+if __name__ == "__main__":
+    main()
@@ -1,75 +1,132 @@
-import pandas as pd
+import multiprocessing
+import os
 import re
+import sys
+from collections import deque
+from functools import lru_cache
 import nltk
 from nltk.tokenize import word_tokenize
 from nltk.stem import WordNetLemmatizer
 from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
-import unicodedata
-from joblib import Parallel, delayed
+
+# Pipeline modules live in backend/, which is not on the path when this script is run directly
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from columnar import TableWriter, is_parquet, read_chunks, table_schema
 
 # Ensure necessary NLTK resources are available
 nltk.download('punkt', quiet=True)
 nltk.download('wordnet', quiet=True)
 
+URL_PATTERN = re.compile(r'http[s]?://\S+')
+# Special characters and numbers are both deleted outright, so one pass removes them
+SPECIAL_CHARS_AND_NUMBERS_PATTERN = re.compile(r'[^\w\s]|\d+')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# Distinct tokens remembered per worker; the vocabulary of the articles is far
+# smaller than their token count, so almost every token is a cache hit
+LEMMA_CACHE_SIZE = 1 << 20
+
+RAW_COLUMNS = ['title', 'url', 'text', 'tags']
+CLEANED_COLUMNS = ['title', 'url', 'tags', 'cleaned_text']
+
+_lemmatizer = WordNetLemmatizer()
+
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def _clean_token(token):
+    """The lemma of a token, or None when the token is dropped."""
+    if not token.isalpha():  # Only keep alphabetic words
+        return None
+    word = token.lower()
+    if word in ENGLISH_STOP_WORDS:
+        return None
+    return _lemmatizer.lemmatize(word)
+
+
+def _clean_chunk(df_chunk):
+    # Workers get a module-level function, so every chunk a worker cleans shares its lemma cache
+    return DatasetCleaner(None, None).clean_chunk(df_chunk)
+
+
 class DatasetCleaner:
     def __init__(self, input_file, output_file):
         self.input_file = input_file
         self.output_file = output_file
-        self.lemmatizer = WordNetLemmatizer()
 
-    def _normalize_text(self, text):
+    def _normalize_text(self, texts):
         # Normalize text (e.g., remove non-ASCII characters)
-        return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('utf-8').lower().strip()
+        return (texts.fillna('').str.normalize('NFKD').str.encode('ascii', 'ignore')
+                .str.decode('utf-8').str.lower().str.strip())
 
-    def _remove_urls_and_special_chars(self, text):
+    def _remove_urls_and_special_chars(self, texts):
         # Remove URLs, special characters, and numbers
-        text = re.sub(r'http[s]?://\S+', '', text)  # Remove URLs
-        text = re.sub(r'[^\w\s]', '', text)        # Remove special characters
-        text = re.sub(r'\d+', '', text)            # Remove numbers
-        text = re.sub(r'\s+', ' ', text).strip()    # Remove extra whitespace
-        return text
+        texts = texts.fillna('').str.replace(URL_PATTERN, '', regex=True)
+        texts = texts.str.replace(SPECIAL_CHARS_AND_NUMBERS_PATTERN, '', regex=True)
+        return texts.str.replace(WHITESPACE_PATTERN, ' ', regex=True).str.strip()  # Remove extra whitespace
 
     def _preprocess_text(self, text):
         # Tokenize, remove stop words, and lemmatize
-        tokens = word_tokenize(text)
-        return ' '.join(
-            sorted(set(self.lemmatizer.lemmatize(word.lower()) for word in tokens 
-                        if word.isalpha() and word.lower() not in ENGLISH_STOP_WORDS))  # Only keep alphabetic words
-        )
+        # Token order and repeats are kept so the indexers can count term frequencies
+        lemmas = map(_clean_token, word_tokenize(text))
+        return ' '.join(lemma for lemma in lemmas if lemma is not None)
 
     def clean_chunk(self, df_chunk):
-        # Apply text cleaning steps to each chunk of data
-        df_chunk['title'] = df_chunk['title'].apply(self._normalize_text)
-        df_chunk['text'] = df_chunk['text'].apply(self._remove_urls_and_special_chars)
-        df_chunk['tags_text'] = df_chunk['tags'].apply(self._normalize_text)
+        # Apply text cleaning steps to each chunk of data, a column at a time
+        df_chunk['title'] = self._normalize_text(df_chunk['title'])
+        df_chunk['text'] = self._remove_urls_and_special_chars(df_chunk['text'])
+        df_chunk['tags_text'] = self._normalize_text(df_chunk['tags'])
         # Combine title, text, and tags and apply preprocessing
-        df_chunk['cleaned_text'] = (df_chunk['title'] + " " + df_chunk['text'] + " " + df_chunk['tags_text']).apply(self._preprocess_text)
-        return df_chunk[['title', 'url', 'tags', 'cleaned_text']]  # Only retain essential columns
+        combined = df_chunk['title'] + " " + df_chunk['text'] + " " + df_chunk['tags_text']
+        df_chunk['cleaned_text'] = [self._preprocess_text(text) for text in combined]
+        return df_chunk[CLEANED_COLUMNS]  # Only retain essential columns
 
-    def clean_dataset(self):
-        try:
-            # Load dataset in chunks to avoid high memory usage
-            chunk_size = 50000  # Adjust as necessary
-            chunks = pd.read_csv(self.input_file, chunksize=chunk_size)
+    def clean_dataset(self, chunk_size=10000, num_processes=None):
+        """
+        Clean the raw dataset into the cleaned dataset, streaming it in chunks.
 
-            # Process the dataset in parallel using multiple jobs
-            processed_chunks = Parallel(n_jobs=-1)(delayed(self.clean_chunk)(chunk) for chunk in chunks)
+        Chunks are cleaned by a pool of workers and appended to the output in
+        their original order as soon as they are done. At most two chunks per
+        worker are in flight, so memory use does not grow with the dataset.
+        Either file can be CSV or Parquet, chosen by its .parquet extension;
+        a Parquet input is read without its other columns.
 
-            # Concatenate all processed chunks into one DataFrame
-            df_cleaned = pd.concat(processed_chunks, ignore_index=True)
+        Args:
+            chunk_size (int): Rows per chunk sent to a worker
+            num_processes (int, optional): Worker processes; defaults to one
+                less than the number of CPUs
+
+        Returns:
+            int: Number of cleaned rows, or None when cleaning failed
+        """
+        try:
+            if num_processes is None:
+                num_processes = max(1, multiprocessing.cpu_count() - 1)
+
+            # Load dataset in chunks to avoid high memory usage
+            columns = RAW_COLUMNS if is_parquet(self.input_file) else None
+            chunks = read_chunks(self.input_file, columns=columns, chunk_size=chunk_size)
+            schema = table_schema(dict.fromkeys(CLEANED_COLUMNS, "string")) if is_parquet(self.output_file) else None
 
-            # Save the cleaned dataset
-            df_cleaned.to_csv(self.output_file, index=False)
+            with multiprocessing.Pool(processes=num_processes) as pool, \
+                    TableWriter(self.output_file, schema, CLEANED_COLUMNS) as writer:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.apply_async(_clean_chunk, (chunk,)))
+                    # Wait for the oldest chunk before reading further ahead
+                    if len(pending) >= 2 * num_processes:
+                        writer.write(pending.popleft().get())
+                while pending:
+                    writer.write(pending.popleft().get())
 
             print(f"Cleaned dataset saved to {self.output_file}")
-            return df_cleaned
+            return writer.num_rows
         except Exception as e:
             print(f"Error cleaning dataset: {e}")
             return None
 
 def main():
-    input_file = r"C:\Users\AT\CSV Dataset files\test_100k.csv"  # Provide the correct path to your raw dataset
-    output_file = r"C:\Users\AT\CSV Dataset files\cleaned_articles_test.csv"  # Specify the cleaned dataset path
+    input_file = r"C:\Users\AT\CSV Dataset files\test_100k.parquet"  # Provide the correct path to your raw dataset
+    output_file = r"C:\Users\AT\CSV Dataset files\cleaned_articles_test.parquet"  # Specify the cleaned dataset path
     cleaner = DatasetCleaner(input_file, output_file)
     cleaner.clean_dataset()
 
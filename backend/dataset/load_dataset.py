@@ -1,5 +1,10 @@
 import pandas as pd
 import os
+import sys
+
+# Pipeline modules live in backend/, which is not on the path when this script is run directly
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from columnar import TableWriter, is_parquet, table_schema
 
 def load_data(input_file, output_file, nrows=100004):
     try:
@@ -17,8 +22,10 @@ def load_data(input_file, output_file, nrows=100004):
         # Drop rows with missing essential columns to avoid processing incomplete rows
         df.dropna(subset=['title', 'text', 'tags', 'url'], inplace=True)
 
-        # Save a smaller dataset for testing
-        df.to_csv(output_file, index=False)
+        # Save a smaller dataset for testing, as Parquet when the output path ends in .parquet
+        schema = table_schema(dict.fromkeys(required_columns, "string")) if is_parquet(output_file) else None
+        with TableWriter(output_file, schema) as writer:
+            writer.write(df)
 
         print(f"Loaded {len(df)} rows from {input_file}, saved to {output_file}")
         return df
@@ -28,5 +35,5 @@ def load_data(input_file, output_file, nrows=100004):
 
 if __name__ == "__main__":
     input_file = r"C:\Users\AT\CSV Dataset files\medium_articles.csv"
-    output_file = r"C:\Users\AT\CSV Dataset files\test_100k.csv"
+    output_file = r"C:\Users\AT\CSV Dataset files\test_100k.parquet"
     load_data(input_file, output_file)
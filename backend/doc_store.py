@@ -0,0 +1,126 @@
+import json
+import os
+import numpy as np
+
+MANIFEST_FILE = "manifest.json"
+RECORDS_FILE = "records.bin"
+OFFSETS_FILE = "offsets.bin"
+
+FIELDS = ("title", "url", "tags")
+# ASCII unit separator between the fields of a record
+FIELD_SEPARATOR = "\x1f"
+
+OFFSET_DTYPE = np.int64
+
+
+class DocStoreWriter:
+    def __init__(self, output_folder):
+        """
+        Stream document records into a doc store folder.
+
+        Records hold the display fields (title, url, tags) of one document
+        as UTF-8 text. They are appended to a single blob, and an offsets
+        table maps doc_id -> [start, end) into it.
+
+        Args:
+            output_folder (str): Folder to write the doc store to
+        """
+        self.output_folder = output_folder
+        os.makedirs(output_folder, exist_ok=True)
+
+        # Written under temporary names and swapped in by close(), like the binary index
+        self._records_file = open(os.path.join(output_folder, RECORDS_FILE + ".tmp"), "wb")
+        self._offsets = [0]
+        self._size = 0
+
+    def add(self, doc_id, title, url, tags):
+        """
+        Append the record of a single document.
+
+        Args:
+            doc_id (int): Document ID, greater than any previously added ID
+            title (str): Article title
+            url (str): Article URL
+            tags (str): Article tags
+        """
+        if doc_id < len(self._offsets) - 1:
+            raise ValueError(f"doc_id {doc_id} added out of order")
+
+        # Doc IDs without a record get empty [start, start) ranges
+        while len(self._offsets) <= doc_id:
+            self._offsets.append(self._size)
+
+        fields = ["" if not isinstance(value, str) else value.replace(FIELD_SEPARATOR, " ")
+                  for value in (title, url, tags)]
+        record = FIELD_SEPARATOR.join(fields).encode("utf-8")
+        self._records_file.write(record)
+
+        self._size += len(record)
+        self._offsets.append(self._size)
+
+    def close(self):
+        """Write the offsets table and manifest."""
+        self._records_file.close()
+        np.asarray(self._offsets, dtype=OFFSET_DTYPE).tofile(
+            os.path.join(self.output_folder, OFFSETS_FILE + ".tmp")
+        )
+
+        manifest = {
+            "fields": list(FIELDS),
+            "offset_dtype": np.dtype(OFFSET_DTYPE).name,
+            "num_docs": len(self._offsets) - 1,
+        }
+        with open(os.path.join(self.output_folder, MANIFEST_FILE + ".tmp"), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        for filename in (RECORDS_FILE, OFFSETS_FILE, MANIFEST_FILE):
+            os.replace(os.path.join(self.output_folder, filename + ".tmp"),
+                       os.path.join(self.output_folder, filename))
+
+
+class DocStore:
+    def __init__(self, doc_store_folder):
+        """
+        Open a doc store folder with a memory-mapped record blob.
+
+        Args:
+            doc_store_folder (str): Folder written by DocStoreWriter
+        """
+        manifest_path = os.path.join(doc_store_folder, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"No doc store manifest found at {manifest_path}")
+
+        with open(manifest_path) as f:
+            self.manifest = json.load(f)
+
+        self.fields = self.manifest["fields"]
+        self.num_docs = self.manifest["num_docs"]
+        self.doc_store_folder = doc_store_folder
+        self._offsets = self._map(OFFSETS_FILE, self.manifest["offset_dtype"])
+        self._records = self._map(RECORDS_FILE, np.uint8)
+
+    def _map(self, filename, dtype):
+        path = os.path.join(self.doc_store_folder, filename)
+        if os.path.getsize(path) == 0:
+            return np.empty(0, dtype=dtype)
+        return np.asarray(np.memmap(path, dtype=dtype, mode="r"))
+
+    def get(self, doc_id):
+        """
+        Fetch the record of a document.
+
+        Args:
+            doc_id (int): Document ID
+
+        Returns:
+            dict: Field name -> value, or None for an unknown doc_id
+        """
+        if doc_id < 0 or doc_id >= self.num_docs:
+            return None
+
+        start, end = int(self._offsets[doc_id]), int(self._offsets[doc_id + 1])
+        if start == end:
+            return None
+
+        values = self._records[start:end].tobytes().decode("utf-8").split(FIELD_SEPARATOR)
+        return dict(zip(self.fields, values))
@@ -1,90 +1,157 @@
 import pandas as pd
 import numpy as np
 import multiprocessing
-from nltk.tokenize import word_tokenize
-from collections import defaultdict
+import os
+import shutil
+import tempfile
 import warnings
+from columnar import TableWriter, is_parquet, list_array, read_chunks, table_schema
+from doc_store import DocStoreWriter
+from lexicon_table import LexiconTable
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
+FORWARD_INDEX_COLUMNS = {"doc_id": "int32", "word_ids": "list<int32>", "doc_length": "int32"}
+
+# Lexicon table of the current worker process, opened once by the pool initializer
+_lexicon_table = None
+
+
+def _open_lexicon_table(table_folder):
+    global _lexicon_table
+    _lexicon_table = LexiconTable(table_folder)
+
+
 class ForwardIndexGenerator:
-    def __init__(self, input_cleaned_file, input_lexicon_file, output_forward_index_file):
+    def __init__(self, input_cleaned_file, input_lexicon_file, output_forward_index_file,
+                 output_doc_store_folder=None):
         self.input_cleaned_file = input_cleaned_file
         self.input_lexicon_file = input_lexicon_file
         self.output_forward_index_file = output_forward_index_file
 
-    def _process_document_chunk(self, chunk_data):
+        # The doc store holds the title/url/tags the search engine displays
+        if output_doc_store_folder is None:
+            output_doc_store_folder = os.path.join(
+                os.path.dirname(os.path.abspath(output_forward_index_file)), "doc_store"
+            )
+        self.output_doc_store_folder = output_doc_store_folder
+
+    def _process_document_chunk(self, texts):
         """
         Process a chunk of documents to create forward index.
+
+        cleaned_text is already whitespace-joined clean tokens, so the whole
+        chunk is split and looked up in the shared lexicon table at once.
+
+        Args:
+            texts (pd.Series): cleaned_text of each document, indexed by doc_id
+
+        Returns:
+            tuple: Forward index rows (doc_id, word_ids, doc_length) of the
+                chunk, and the number of documents without any lexicon word.
+                The rows are a dict of arrays with word_ids as a list<int32>
+                array for Parquet output, or a DataFrame with space-separated
+                word_ids for CSV output.
         """
-        df_chunk, lexicon = chunk_data
-        forward_index = defaultdict(list)
-        missed_words = set()
+        tokens = texts.fillna('').str.split().explode().dropna()
+        word_ids = _lexicon_table.lookup(tokens)
+        known = word_ids > 0
+        word_ids = word_ids[known]
+        doc_ids = tokens.index.to_numpy()[known]
+
+        # word_ids keeps document order and repeats, so it also carries term frequencies
+        unique_doc_ids, first_token, doc_lengths = np.unique(doc_ids, return_index=True, return_counts=True)
+        missed = len(texts) - len(unique_doc_ids)
 
-        for idx, row in df_chunk.iterrows():
-            if isinstance(row['cleaned_text'], str):
-                tokens = word_tokenize(row['cleaned_text'].lower())
-                word_ids = [lexicon.get(word) for word in tokens if lexicon.get(word)]
+        if is_parquet(self.output_forward_index_file):
+            return {
+                "doc_id": unique_doc_ids.astype(np.int32),
+                "word_ids": list_array(doc_lengths, word_ids),
+                "doc_length": doc_lengths.astype(np.int32),
+            }, missed
 
-                if word_ids:
-                    forward_index[idx] = word_ids
-                else:
-                    missed_words.add(row['cleaned_text'])
+        # Join the whole chunk once, then cut it into one string per document.
+        text = " ".join(map(str, word_ids.tolist()))
+        token_ends = np.cumsum(np.floor(np.log10(word_ids)).astype(np.int64) + 2) - 1
+        ends = token_ends[first_token + doc_lengths - 1]
+        starts = np.concatenate(([0], ends[:-1] + 1))
 
-        return forward_index, missed_words
+        forward_index_df = pd.DataFrame({
+            "doc_id": unique_doc_ids,
+            "word_ids": [text[start:end] for start, end in zip(starts.tolist(), ends.tolist())],
+            "doc_length": doc_lengths,
+        })
 
-    def create_forward_index(self, num_processes=None):
+        return forward_index_df, missed
+
+    def create_forward_index(self, num_processes=None, chunk_size=10000):
         """
         Create forward index with parallel processing.
+
+        The cleaned dataset is streamed in chunks of chunk_size rows. Workers
+        open the lexicon as a memory-mapped table once, instead of receiving
+        a copy of it with every chunk, and rows are written as soon as their
+        chunk is done.
+
+        The cleaned dataset and the forward index can each be CSV or Parquet,
+        chosen by their .parquet extension. In Parquet, word_ids is a
+        list<int32> column, so no IDs are formatted as text or parsed back.
+
+        Returns:
+            int: Number of documents in the forward index
         """
+        table_folder = tempfile.mkdtemp(prefix="lexicon_table_")
         try:
-            df = pd.read_csv(self.input_cleaned_file)
-            lexicon = pd.read_csv(self.input_lexicon_file).set_index("word")['word_id'].to_dict()
-            
+            LexiconTable.build(self.input_lexicon_file, table_folder)
+
             if num_processes is None:
                 num_processes = max(1, multiprocessing.cpu_count() - 1)
-            
-            # Split dataset into chunks for parallel processing
-            df_chunks = np.array_split(df, num_processes)
-            chunk_data = [(chunk, lexicon) for chunk in df_chunks]
-
-            with multiprocessing.Pool(processes=num_processes) as pool:
-                results = pool.map(self._process_document_chunk, chunk_data)
-            
-            # Merge results
-            forward_index = {}
-            global_missed_words = set()
-
-            for chunk_forward_index, missed_words in results:
-                forward_index.update(chunk_forward_index)
-                global_missed_words.update(missed_words)
-
-            if global_missed_words:
-                print(f"Missed words: {global_missed_words}")
-
-            # Convert forward index to DataFrame
-            forward_index_df = pd.DataFrame(
-                [{"doc_id": doc_id, "word_ids": " ".join(map(str, word_ids))} 
-                 for doc_id, word_ids in forward_index.items()]
-            )
 
-            # Save to CSV
-            forward_index_df.to_csv(self.output_forward_index_file, index=False)
+            reader = read_chunks(self.input_cleaned_file, columns=['title', 'url', 'tags', 'cleaned_text'],
+                                 chunk_size=chunk_size)
+            doc_store_writer = DocStoreWriter(self.output_doc_store_folder)
+            schema = table_schema(FORWARD_INDEX_COLUMNS) if is_parquet(self.output_forward_index_file) else None
+            num_missed = 0
+
+            def texts():
+                # The doc store is written here, so workers only receive the text
+                for chunk in reader:
+                    for doc_id, title, url, tags in zip(chunk.index, chunk['title'], chunk['url'], chunk['tags']):
+                        doc_store_writer.add(doc_id, title, url, tags)
+                    yield chunk['cleaned_text']
+
+            with multiprocessing.Pool(processes=num_processes, initializer=_open_lexicon_table,
+                                      initargs=(table_folder,)) as pool, \
+                    TableWriter(self.output_forward_index_file, schema, list(FORWARD_INDEX_COLUMNS)) as writer:
+                # imap keeps chunks in doc_id order
+                for rows, missed in pool.imap(self._process_document_chunk, texts()):
+                    writer.write(rows)
+                    num_missed += missed
+
+            doc_store_writer.close()
+            if num_missed:
+                print(f"Documents without lexicon words: {num_missed}")
             print(f"Forward index saved to {self.output_forward_index_file}")
-            return forward_index
+            print(f"Doc store saved to {self.output_doc_store_folder}")
+            return writer.num_rows
         
         except Exception as e:
             print(f"Error creating forward index: {e}")
             raise
 
+        finally:
+            shutil.rmtree(table_folder, ignore_errors=True)
+
 # Example usage:
 def main():
     # Define file paths
-    input_cleaned_file = r"C:\Users\AT\CSV Dataset files\cleaned_articles_test.csv"  # Path to cleaned dataset
+    input_cleaned_file = r"C:\Users\AT\CSV Dataset files\cleaned_articles_test.parquet"  # Path to cleaned dataset
     input_lexicon_file = r"C:\Users\AT\CSV Dataset files\lexicon.csv"  # Path to lexicon file
-    output_forward_index_file = r"C:\Users\AT\CSV Dataset files\forward_indexing.csv"  # Output path for forward index
+    output_forward_index_file = r"C:\Users\AT\CSV Dataset files\forward_indexing.parquet"  # Output path for forward index
+    output_doc_store_folder = r"C:\Users\AT\CSV Dataset files\doc_store"  # Output folder for title/url/tags records
 
     # Create an instance of ForwardIndexGenerator and generate the forward index
-    forward_index_generator = ForwardIndexGenerator(input_cleaned_file, input_lexicon_file, output_forward_index_file)
+    forward_index_generator = ForwardIndexGenerator(input_cleaned_file, input_lexicon_file, output_forward_index_file,
+                                                    output_doc_store_folder)
     forward_index_generator.create_forward_index(num_processes=4)  # Adjust number of processes as needed
 
 if __name__ == "__main__":
@@ -0,0 +1,45 @@
+# Production serving mode, run from the backend folder:
+#   gunicorn -c gunicorn.conf.py app:app
+import gc
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = "0.0.0.0:5000"
+
+# One worker process per core, each answering several requests at once
+workers = multiprocessing.cpu_count()
+worker_class = "gthread"
+threads = 4
+
+# Open the index once in the master before forking: the index files are
+# memory-mapped, so every worker shares the same pages instead of holding its
+# own copy, and the lexicon is shared copy-on-write
+preload_app = True
+
+# Restart workers that stop responding, e.g. on a stuck request
+timeout = 60
+graceful_timeout = 30
+
+# Every worker writes its query metrics to a file in this folder, and /metrics
+# adds them up; app.py reads the folder from the environment
+metrics_folder = os.path.join(tempfile.gettempdir(), "searchit_metrics")
+os.environ["SEARCH_METRICS_FOLDER"] = metrics_folder
+
+
+def on_starting(server):
+    # Metrics start from zero with every server start
+    shutil.rmtree(metrics_folder, ignore_errors=True)
+
+
+def pre_fork(server, worker):
+    # Objects loaded by the master are never collected; freezing them keeps the
+    # garbage collector from touching (and so copying) their pages in workers
+    gc.freeze()
+
+
+def worker_exit(server, worker):
+    # A sharded index runs its shards in processes of the worker; stop them with it
+    from app import search_engine
+    search_engine.close()
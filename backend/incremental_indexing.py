@@ -0,0 +1,347 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+import shutil
+import threading
+from binary_index import BinaryIndexWriter, MANIFEST_FILE
+from doc_store import DocStoreWriter
+from snapshot import publish_index
+from spimi_indexing import collapse_occurrences
+from tiered_index import TieredIndexBuilder, FIRST_TIER_SIZE, PRIOR_WEIGHT
+from segments import (SegmentedIndex, SegmentedDocStore, deltas_folder, read_segments_state,
+                      read_tombstones, SEGMENTS_FILE, TOMBSTONES_FILE, LEXICON_ADDITIONS_FILE,
+                      DELTA_INDEX_FOLDER, DELTA_DOC_STORE_FOLDER)
+
+
+def _write_atomically(path, data):
+    # Readers never see a half-written file: write a temporary copy, then swap it in
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(data)
+    os.replace(temporary_path, path)
+
+
+def _replace_folder_contents(source_folder, target_folder):
+    """Move every file and folder of source_folder over target_folder, the manifest last."""
+    names = sorted(os.listdir(source_folder), key=lambda name: name == MANIFEST_FILE)
+    for name in names:
+        source, target = os.path.join(source_folder, name), os.path.join(target_folder, name)
+        # A folder can't be replaced while it has files, so the old one is moved aside first
+        if os.path.isdir(source) and os.path.isdir(target):
+            os.replace(target, target + ".old")
+            os.replace(source, target)
+            shutil.rmtree(target + ".old", ignore_errors=True)
+        else:
+            os.replace(source, target)
+    os.rmdir(source_folder)
+
+
+class IncrementalIndexer:
+    def __init__(self, index_folder, doc_store_folder, lexicon_path, positional=True, merge_threshold=8,
+                 snapshots_folder=None):
+        """
+        Add and delete documents without rebuilding the whole index.
+
+        New documents are written as a delta segment: a small binary index
+        and doc store under index_folder/deltas, with doc IDs continuing
+        after the last existing one. Words missing from the lexicon get new
+        IDs after the highest existing one, so IDs already in use never
+        change. Deleted doc IDs are marked in a tombstone bitmap.
+
+        SearchEngine reads the base index and all deltas together and picks
+        up new segments on its next query. Once merge_threshold deltas pile
+        up, they are merged into the base index on a background thread.
+
+        A search engine serving snapshots only sees the index copied into
+        its current snapshot. With snapshots_folder, every change is
+        published as a new snapshot (see snapshot.publish_index), which the
+        engine picks up on its next query like any other.
+
+        After a full rebuild of the base index, delete its deltas folder:
+        the segments refer to the doc IDs of the previous build.
+
+        Args:
+            index_folder (str): Base binary index folder
+            doc_store_folder (str): Base doc store folder
+            lexicon_path (str): Path to the lexicon the base index was built with
+            positional (bool): Store token positions in delta segments
+            merge_threshold (int): Number of deltas that triggers a
+                background merge; 0 disables automatic merging
+            snapshots_folder (str, optional): Snapshots folder written by
+                IndexSnapshotBuilder from this index, to publish changes to
+        """
+        self.index_folder = index_folder
+        self.doc_store_folder = doc_store_folder
+        self.lexicon_path = lexicon_path
+        self.positional = positional
+        self.merge_threshold = merge_threshold
+        self.snapshots_folder = snapshots_folder
+        self.deltas_folder = deltas_folder(index_folder)
+        os.makedirs(self.deltas_folder, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # Held while a snapshot is published or a merge swaps in its files, so a snapshot
+        # never mixes files from before and after a merge
+        self._publish_lock = threading.Lock()
+        self._merge_thread = None
+
+        self.lexicon = pd.read_csv(lexicon_path, keep_default_na=False).set_index('word')['word_id'].to_dict()
+        additions_path = os.path.join(self.deltas_folder, LEXICON_ADDITIONS_FILE)
+        if os.path.exists(additions_path):
+            self.lexicon.update(pd.read_csv(additions_path, keep_default_na=False).set_index('word')['word_id'].to_dict())
+
+        self.state = read_segments_state(index_folder)
+        if self.state is None:
+            base = SegmentedIndex(index_folder)
+            self.state = {
+                "generation": 0,
+                "next_doc_id": base.num_docs,
+                "next_word_id": max([base.manifest["max_word_id"], *self.lexicon.values()]) + 1,
+                "num_deleted": 0,
+                "purged_deleted": 0,
+                "deltas": [],
+            }
+            self._save_state()
+
+    def _publish(self):
+        if self.snapshots_folder is None:
+            return
+        # Taken in the order merge() takes them, so they can't deadlock
+        with self._publish_lock, self._lock:
+            publish_index(self.snapshots_folder, self.index_folder, self.doc_store_folder)
+
+    def _save_state(self):
+        self.state["generation"] += 1
+        _write_atomically(
+            os.path.join(self.deltas_folder, SEGMENTS_FILE),
+            json.dumps(self.state, indent=2).encode("utf-8")
+        )
+
+    def _assign_word_ids(self, token_lists):
+        """Give unseen words the next free IDs and append them to the lexicon additions."""
+        new_words = []
+        for tokens in token_lists:
+            for word in tokens:
+                if word not in self.lexicon:
+                    self.lexicon[word] = self.state["next_word_id"]
+                    self.state["next_word_id"] += 1
+                    new_words.append(word)
+
+        if new_words:
+            additions_path = os.path.join(self.deltas_folder, LEXICON_ADDITIONS_FILE)
+            additions_df = pd.DataFrame({"word": new_words, "word_id": [self.lexicon[word] for word in new_words]})
+            # Searchers read the file while documents are added, so it is replaced rather than appended to
+            existing = b""
+            if os.path.exists(additions_path):
+                with open(additions_path, "rb") as f:
+                    existing = f.read()
+            rows = additions_df.to_csv(index=False, header=not existing, lineterminator="\n")
+            _write_atomically(additions_path, existing + rows.encode("utf-8"))
+
+    def _clean(self, documents):
+        if 'cleaned_text' in documents.columns:
+            return documents
+        # Raw articles go through the same cleaning as the dataset
+        from dataset.clean_dataset import DatasetCleaner
+        return DatasetCleaner(None, None).clean_chunk(documents.copy())
+
+    def add_documents(self, documents):
+        """
+        Index new documents as a delta segment.
+
+        Args:
+            documents (pd.DataFrame): Articles with title, url and tags, and
+                either a cleaned_text column or the raw text column
+
+        Returns:
+            list: Doc IDs assigned to the documents, in order
+        """
+        try:
+            documents = self._clean(documents).reset_index(drop=True)
+            token_lists = [text.split() if isinstance(text, str) else [] for text in documents['cleaned_text']]
+
+            with self._lock:
+                self._assign_word_ids(token_lists)
+                doc_id_start = self.state["next_doc_id"]
+                name = f"delta_{self.state['generation']:06d}"
+                delta_folder = os.path.join(self.deltas_folder, name)
+
+                doc_store_writer = DocStoreWriter(os.path.join(delta_folder, DELTA_DOC_STORE_FOLDER))
+                for doc_id, (title, url, tags) in enumerate(zip(documents['title'], documents['url'], documents['tags'])):
+                    doc_store_writer.add(doc_id, title, url, tags)
+                doc_store_writer.close()
+
+                self._write_delta_index(os.path.join(delta_folder, DELTA_INDEX_FOLDER), token_lists)
+
+                self.state["deltas"].append({"name": name, "doc_id_start": doc_id_start, "num_docs": len(documents)})
+                self.state["next_doc_id"] += len(documents)
+                self._save_state()
+                num_deltas = len(self.state["deltas"])
+
+            print(f"Added {len(documents)} documents as {name}")
+            self._publish()
+            if self.merge_threshold and num_deltas >= self.merge_threshold:
+                self.merge_in_background()
+            return list(range(doc_id_start, doc_id_start + len(documents)))
+
+        except Exception as e:
+            print(f"Error adding documents: {e}")
+            raise
+
+    def _write_delta_index(self, output_folder, token_lists):
+        doc_lengths = np.array([len(tokens) for tokens in token_lists], dtype=np.int32)
+        word_ids = np.array([self.lexicon[word] for tokens in token_lists for word in tokens], dtype=np.int32)
+        doc_ids = np.repeat(np.arange(len(token_lists), dtype=np.int32), doc_lengths)
+        positions = np.concatenate([np.arange(length, dtype=np.int32) for length in doc_lengths]) \
+            if len(doc_lengths) else np.empty(0, dtype=np.int32)
+
+        # Occurrences are in doc and position order, so a stable sort keeps each word's postings sorted
+        order = np.argsort(word_ids, kind='stable')
+        word_ids, doc_ids, positions = word_ids[order], doc_ids[order], positions[order]
+        word_starts = np.flatnonzero(np.diff(word_ids, prepend=-1))
+        word_ends = np.append(word_starts[1:], len(word_ids))
+
+        writer = BinaryIndexWriter(output_folder, doc_lengths, positional=self.positional)
+        for start, end in zip(word_starts, word_ends):
+            unique_doc_ids, term_frequencies = collapse_occurrences(doc_ids[start:end])
+            writer.add(int(word_ids[start]), unique_doc_ids, term_frequencies,
+                       positions[start:end] if self.positional else None)
+        writer.close()
+
+    def delete_documents(self, doc_ids):
+        """
+        Mark documents as deleted; they stop matching on the next query.
+
+        Args:
+            doc_ids (iterable): Doc IDs to delete; unknown IDs are ignored
+
+        Returns:
+            int: Number of documents newly deleted
+        """
+        with self._lock:
+            deleted = read_tombstones(self.index_folder, self.state["next_doc_id"])
+            doc_ids = np.asarray(list(doc_ids), dtype=np.int64)
+            doc_ids = doc_ids[(doc_ids >= 0) & (doc_ids < len(deleted))]
+            newly_deleted = int((~deleted[doc_ids]).sum()) if len(doc_ids) else 0
+            if not newly_deleted:
+                return 0
+
+            deleted[doc_ids] = True
+            _write_atomically(os.path.join(self.deltas_folder, TOMBSTONES_FILE), np.packbits(deleted).tobytes())
+            self.state["num_deleted"] = int(deleted.sum())
+            self._save_state()
+        self._publish()
+        return newly_deleted
+
+    def merge(self):
+        """
+        Merge the base index and all current deltas into a new base index.
+
+        Deleted documents lose their postings, doc store records and length.
+        Documents added or deleted while the merge runs are kept as deltas
+        and tombstones. The merged index keeps the base index's postings
+        codec, and when the base index has priors, TieredIndexBuilder runs
+        on the merged index with the same settings, so the priors and first
+        tier cover the merged documents. The new files replace the old ones
+        one by one with the manifest last, so searchers switch over on their
+        next query.
+        """
+        try:
+            with self._lock:
+                snapshot = json.loads(json.dumps(self.state))
+                deleted = read_tombstones(self.index_folder, snapshot["next_doc_id"])
+            if not snapshot["deltas"] and snapshot["num_deleted"] == snapshot["purged_deleted"]:
+                return
+
+            index = SegmentedIndex(self.index_folder, state=snapshot, deleted=deleted)
+            doc_store = SegmentedDocStore(self.doc_store_folder, index)
+            merged_index_folder = os.path.normpath(self.index_folder) + ".merging"
+            merged_doc_store_folder = os.path.normpath(self.doc_store_folder) + ".merging"
+
+            doc_lengths = np.array(index.doc_lengths)
+            doc_lengths[deleted[:len(doc_lengths)]] = 0
+            # Deleted documents keep their empty slots, so the BM25 statistics of the
+            # live documents are recorded in the manifest
+            writer = BinaryIndexWriter(merged_index_folder, doc_lengths,
+                                       k1=index.manifest["bm25"]["k1"], b=index.manifest["bm25"]["b"],
+                                       positional=index.positional,
+                                       codec=index.manifest.get("codec", "raw"),
+                                       num_docs=index.collection["num_docs"],
+                                       avg_doc_length=index.collection["avg_doc_length"])
+            # Only terms with postings, not every ID up to the end of the vocabulary
+            for word_id in index.word_ids().tolist():
+                doc_ids = index.postings(word_id)
+                if len(doc_ids) == 0:
+                    continue
+                positions = index.positions(word_id, np.arange(len(doc_ids)))[0] if index.positional else None
+                writer.add(word_id, doc_ids, index.term_frequencies(word_id), positions)
+            writer.close()
+
+            doc_store_writer = DocStoreWriter(merged_doc_store_folder)
+            for doc_id in range(index.num_docs):
+                document = doc_store.get(doc_id)
+                if document is not None:
+                    doc_store_writer.add(doc_id, document['title'], document['url'], document['tags'])
+            doc_store_writer.close()
+
+            if "priors" in index.manifest:
+                first_tier = index.manifest.get("first_tier", {})
+                TieredIndexBuilder(merged_index_folder, merged_doc_store_folder,
+                                   popularity_file=index.manifest["priors"].get("popularity_file"),
+                                   first_tier_size=first_tier.get("postings_per_term", FIRST_TIER_SIZE),
+                                   prior_weight=first_tier.get("prior_weight", PRIOR_WEIGHT)
+                                   ).build(first_tier="first_tier" in index.manifest)
+
+            merged_names = {delta["name"] for delta in snapshot["deltas"]}
+            with self._publish_lock:
+                _replace_folder_contents(merged_doc_store_folder, self.doc_store_folder)
+                _replace_folder_contents(merged_index_folder, self.index_folder)
+                with self._lock:
+                    self.state["deltas"] = [delta for delta in self.state["deltas"]
+                                            if delta["name"] not in merged_names]
+                    self.state["purged_deleted"] = snapshot["num_deleted"]
+                    self._save_state()
+                # Searchers may still have old segments mapped, which some platforms refuse to delete
+                for name in merged_names:
+                    shutil.rmtree(os.path.join(self.deltas_folder, name), ignore_errors=True)
+            self._publish()
+
+            print(f"Merged {len(merged_names)} delta segments into {self.index_folder}")
+
+        except Exception as e:
+            print(f"Error merging segments: {e}")
+            raise
+
+    def merge_in_background(self):
+        """
+        Start merge() on a daemon thread unless one is already running.
+
+        Returns:
+            threading.Thread: The merge thread
+        """
+        with self._lock:
+            if self._merge_thread is None or not self._merge_thread.is_alive():
+                self._merge_thread = threading.Thread(target=self.merge, daemon=True)
+                self._merge_thread.start()
+            return self._merge_thread
+
+
+def main():
+    # File paths
+    index_folder = r"C:\Users\AT\CSV Dataset files\binary_index"
+    doc_store_folder = r"C:\Users\AT\CSV Dataset files\doc_store"
+    lexicon_path = r"C:\Users\AT\CSV Dataset files\lexicon.csv"
+    new_articles_file = r"C:\Users\AT\CSV Dataset files\new_articles.csv"
+
+    try:
+        indexer = IncrementalIndexer(index_folder, doc_store_folder, lexicon_path)
+        doc_ids = indexer.add_documents(pd.read_csv(new_articles_file))
+        print(f"Indexed doc IDs {doc_ids[0]}-{doc_ids[-1]}" if doc_ids else "No new articles")
+        indexer.merge()
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+if __name__ == "__main__":
+    main()
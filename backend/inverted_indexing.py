@@ -1,28 +1,57 @@
 import pandas as pd
 import os
+import csv
 import numpy as np
 import multiprocessing
-from collections import defaultdict
 import warnings
+from binary_index import BinaryIndexWriter
+from columnar import TableWriter, is_parquet, iter_batches, list_array, list_lengths_and_values, table_schema
 
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
+INVERTED_INDEX_COLUMNS = {"word_id": "int32", "doc_ids": "list<int32>", "term_frequencies": "list<int32>"}
+# Tokens of the sorted runs merged and written at a time
+MERGE_BATCH_TOKENS = 1 << 22
+
 class InvertedIndexGenerator:
     def __init__(self, 
                  input_forward_index_file, 
                  output_inverted_index_file, 
-                 output_barrels_folder):
+                 output_barrels_folder,
+                 output_binary_index_folder=None,
+                 positional=True,
+                 codec="raw"):
         """
         Initialize the inverted index generator.
 
         Args:
-            input_forward_index_file (str): Path to forward index file
-            output_inverted_index_file (str): Path to save full inverted index
+            input_forward_index_file (str): Path to forward index file, CSV
+                or Parquet
+            output_inverted_index_file (str): Path to save full inverted index;
+                with a .parquet extension it and the barrels are written as
+                Parquet, with doc_ids and term_frequencies as list<int32>
+                columns
             output_barrels_folder (str): Folder to save inverted index barrels
+            output_binary_index_folder (str, optional): Folder to save the
+                memory-mapped binary index. Defaults to a "binary_index"
+                folder next to the full inverted index file.
+            positional (bool): Also store token positions in the binary
+                index, which phrase queries need
+            codec (str): Postings codec of the binary index (raw, varint,
+                pfor or elias_fano), recorded in its manifest
         """
         self.input_forward_index_file = input_forward_index_file
         self.output_inverted_index_file = output_inverted_index_file
         self.output_barrels_folder = output_barrels_folder
+
+        if output_binary_index_folder is None:
+            output_binary_index_folder = os.path.join(
+                os.path.dirname(os.path.abspath(output_inverted_index_file)),
+                "binary_index"
+            )
+        self.output_binary_index_folder = output_binary_index_folder
+        self.positional = positional
+        self.codec = codec
         
         # Ensure output directory exists
         os.makedirs(output_barrels_folder, exist_ok=True)
@@ -32,117 +61,277 @@ class InvertedIndexGenerator:
         Process a chunk of forward index to create inverted index.
 
         Args:
-            chunk (pd.DataFrame): Chunk of forward index data
+            chunk (pd.DataFrame | pa.RecordBatch): Chunk of forward index
+                data, from a CSV or a Parquet forward index
 
         Returns:
-            dict: Partial inverted index for the chunk
+            tuple: (word_ids, doc_ids, positions) with one entry per token,
+                sorted by word_id and then doc_id and position, and the
+                (doc_ids, doc_lengths) of the chunk's documents
         """
-        inverted_index = defaultdict(set)
-        
-        for _, row in chunk.iterrows():
-            doc_id = row['doc_id']
-            word_ids = [int(word_id) for word_id in row['word_ids'].split()]
-            
-            # Create inverted index for this chunk
-            for word_id in word_ids:
-                inverted_index[word_id].add(doc_id)
-        
-        return dict(inverted_index)
+        if isinstance(chunk, pd.DataFrame):
+            texts = chunk['word_ids'].fillna('').astype(str)
+            # Word IDs are single-space separated, so each document has spaces + 1 tokens
+            doc_lengths = np.where(texts.str.len() > 0, texts.str.count(' ') + 1, 0).astype(np.int32)
+            doc_ids = chunk['doc_id'].to_numpy(dtype=np.int32)
+            word_ids = np.array(" ".join(texts).split(), dtype=np.int32)
+        else:
+            # A Parquet record batch already holds the word IDs as integers
+            doc_lengths, word_ids = list_lengths_and_values(chunk.column('word_ids'))
+            doc_ids = chunk.column('doc_id').to_numpy().astype(np.int32)
+
+        token_doc_ids = np.repeat(doc_ids, doc_lengths)
+        doc_starts = np.cumsum(doc_lengths) - doc_lengths
+        positions = (np.arange(len(word_ids)) - np.repeat(doc_starts, doc_lengths)).astype(np.int32)
+
+        # Tokens are in doc and position order, so a stable sort keeps each word's postings sorted
+        order = np.argsort(word_ids, kind='stable')
+        return (word_ids[order], token_doc_ids[order], positions[order]), (doc_ids, doc_lengths)
 
-    def _distribute_to_barrels(self, inverted_index, num_barrels=10):
+    def _doc_lengths(self, doc_id_parts, length_parts):
         """
-        Distribute inverted index to multiple barrels.
+        Build the document length array used for BM25 length normalization.
 
         Args:
-            inverted_index (dict): Full inverted index
-            num_barrels (int): Number of barrels to distribute
+            doc_id_parts (list): Doc IDs of each forward index chunk
+            length_parts (list): Token counts parallel to doc_id_parts
 
         Returns:
-            list: Barrels with distributed word IDs
+            np.ndarray: Token count of every document, indexed by doc_id
         """
-        barrels = [{} for _ in range(num_barrels)]
-        
-        for word_id, doc_ids in inverted_index.items():
-            # Distribute to barrel based on word_id modulo
-            barrel_id = word_id % num_barrels
-            barrels[barrel_id][word_id] = sorted(list(doc_ids))
-        
+        doc_ids = np.concatenate(doc_id_parts) if doc_id_parts else np.zeros(0, dtype=np.int32)
+        if len(doc_ids) == 0:
+            return np.zeros(0, dtype=np.int32)
+
+        doc_lengths = np.zeros(int(doc_ids.max()) + 1, dtype=np.int32)
+        doc_lengths[doc_ids] = np.concatenate(length_parts)
+        return doc_lengths
+
+    def _barrel_file(self, barrel):
+        extension = ".parquet" if is_parquet(self.output_inverted_index_file) else ".csv"
+        return os.path.join(self.output_barrels_folder, f"inverted_index_barrel_{barrel}{extension}")
+
+    def _open_barrels(self, num_barrels):
+        barrels = []
+        for i in range(num_barrels):
+            barrel_file = open(self._barrel_file(i), "w", newline="")
+            writer = csv.writer(barrel_file)
+            writer.writerow(["word_id", "doc_ids", "term_frequencies"])
+            barrels.append((barrel_file, writer))
         return barrels
 
-    def create_inverted_index(self, num_processes=None, num_barrels=10):
+    def _merge_runs(self, runs, batch_tokens):
+        """
+        Merge the workers' runs, each sorted by word_id, into batches of
+        whole posting lists.
+
+        Runs arrive in doc_id order, so within a word every run's tokens
+        follow the previous run's. Each token is moved straight to its
+        place in the batch rather than sorted again, and only one batch of
+        tokens is copied at a time.
+
+        Args:
+            runs (list): (word_ids, doc_ids, positions) of every chunk, in
+                chunk order
+            batch_tokens (int): Tokens per batch; a word with more tokens
+                gets a batch of its own
+
+        Yields:
+            tuple: (word_ids, doc_ids, positions) of a range of word IDs,
+                sorted by word_id and then doc_id and position
+        """
+        runs = [run for run in runs if len(run[0])]
+        if not runs:
+            return
+        max_word_id = max(int(word_ids[-1]) for word_ids, _, _ in runs)
+        word_counts = np.zeros(max_word_id + 1, dtype=np.int64)
+        for word_ids, _, _ in runs:
+            starts = np.flatnonzero(np.diff(word_ids, prepend=-1))
+            word_counts[word_ids[starts]] += np.diff(np.append(starts, len(word_ids)))
+        word_ends = np.cumsum(word_counts)
+
+        # A batch ends with the word that takes it to a multiple of batch_tokens
+        batch_ends = np.searchsorted(word_ends, np.arange(batch_tokens, word_ends[-1], batch_tokens)) + 1
+        batch_ends = np.unique(np.append(batch_ends, max_word_id + 1))
+        for low, high in zip(np.append(0, batch_ends[:-1]).tolist(), batch_ends.tolist()):
+            first_token = int(word_ends[low - 1]) if low else 0
+            num_tokens = int(word_ends[high - 1]) - first_token
+            # Where each word's tokens start in the batch, and how many are already there
+            word_starts = word_ends[low:high] - word_counts[low:high] - first_token
+            filled = np.zeros(high - low, dtype=np.int64)
+
+            batch = [np.empty(num_tokens, dtype=np.int32) for _ in range(3)]
+            for run in runs:
+                start, end = np.searchsorted(run[0], [low, high])
+                if start == end:
+                    continue
+                words = run[0][start:end] - low
+                starts = np.flatnonzero(np.diff(words, prepend=-1))
+                counts = np.diff(np.append(starts, len(words)))
+                ranks = np.arange(len(words)) - np.repeat(starts, counts)
+                destinations = word_starts[words] + filled[words] + ranks
+                filled[words[starts]] += counts
+                for merged, values in zip(batch, run):
+                    merged[destinations] = values[start:end]
+            yield tuple(batch)
+
+    def _open_csv(self, num_barrels):
+        inverted_index_file = open(self.output_inverted_index_file, "w", newline="")
+        # Columns "word_id", "doc_ids" and "term_frequencies"
+        inverted_index_writer = csv.writer(inverted_index_file)
+        inverted_index_writer.writerow(["word_id", "doc_ids", "term_frequencies"])
+        return inverted_index_file, inverted_index_writer, self._open_barrels(num_barrels)
+
+    def _write_csv(self, writers, word_ids, posting_offsets, doc_ids, term_frequencies):
+        """
+        Write posting lists to the full inverted index and the barrels as
+        CSV, one posting list per row.
+
+        Args:
+            writers (tuple): Full inverted index file and writer, and the
+                barrels, from _open_csv
+            word_ids (np.ndarray): Word ID of every posting list
+            posting_offsets (np.ndarray): Start of each list in doc_ids, and
+                the end of the last one
+            doc_ids (np.ndarray): Doc IDs of all postings, list after list
+            term_frequencies (np.ndarray): Term frequencies parallel to doc_ids
+        """
+        _, inverted_index_writer, barrels = writers
+        for word_number, word_id in enumerate(word_ids.tolist()):
+            start, end = posting_offsets[word_number], posting_offsets[word_number + 1]
+            row = [
+                word_id,
+                " ".join(map(str, doc_ids[start:end].tolist())),
+                " ".join(map(str, term_frequencies[start:end].tolist()))
+            ]
+            inverted_index_writer.writerow(row)
+            barrels[word_id % len(barrels)][1].writerow(row)
+
+    def _close_csv(self, writers):
+        inverted_index_file, _, barrels = writers
+        inverted_index_file.close()
+        for i, (barrel_file, _) in enumerate(barrels):
+            barrel_file.close()
+            print(f"Inverted index barrel {i} saved to {barrel_file.name}")
+
+    def _open_parquet(self, num_barrels):
+        schema = table_schema(INVERTED_INDEX_COLUMNS)
+        # The full inverted index takes every word, each barrel the words of its number
+        writers = [(None, TableWriter(self.output_inverted_index_file, schema))]
+        writers += [(i, TableWriter(self._barrel_file(i), schema)) for i in range(num_barrels)]
+        return writers
+
+    def _write_parquet(self, writers, word_ids, posting_counts, doc_ids, term_frequencies):
+        """
+        Write posting lists to the full inverted index and the barrels as
+        Parquet, without a Python object per posting.
+
+        Args:
+            writers (list): (barrel number or None, TableWriter) pairs from
+                _open_parquet
+            word_ids (np.ndarray): Word ID of every posting list
+            posting_counts (np.ndarray): Postings in each list
+            doc_ids (np.ndarray): Doc IDs of all postings, list after list
+            term_frequencies (np.ndarray): Term frequencies parallel to doc_ids
+        """
+        num_barrels = len(writers) - 1
+        for barrel, writer in writers:
+            selected = np.ones(len(word_ids), dtype=bool) if barrel is None else word_ids % num_barrels == barrel
+            postings = np.repeat(selected, posting_counts)
+            writer.write({
+                "word_id": word_ids[selected],
+                "doc_ids": list_array(posting_counts[selected], doc_ids[postings]),
+                "term_frequencies": list_array(posting_counts[selected], term_frequencies[postings]),
+            })
+
+    def _close_parquet(self, writers):
+        for barrel, writer in writers:
+            writer.close()
+            if barrel is not None:
+                print(f"Inverted index barrel saved to {writer.path}")
+
+    def create_inverted_index(self, num_processes=None, num_barrels=10, chunk_size=10000,
+                              batch_tokens=MERGE_BATCH_TOKENS):
         """
         Create inverted index with parallel processing and barrel distribution.
 
+        The forward index is streamed in chunks of chunk_size rows; workers
+        turn each chunk into token arrays sorted by word_id. The sorted runs
+        are merged a batch of words at a time, collapsed into postings, and
+        written to the full inverted index, the barrels (word_id modulo
+        num_barrels) and the binary index. A Parquet forward index is
+        streamed as record batches of its doc_id and word_ids columns only.
+
         Args:
             num_processes (int, optional): Number of processes
             num_barrels (int): Number of inverted index barrels
+            chunk_size (int): Forward index rows per worker task
+            batch_tokens (int): Tokens merged and written at a time
 
         Returns:
-            dict: Complete inverted index
+            int: Number of unique words in the inverted index
         """
         try:
-            # Load forward index
-            forward_index_df = pd.read_csv(self.input_forward_index_file)
-            
             # Determine number of processes
             if num_processes is None:
                 num_processes = max(1, multiprocessing.cpu_count() - 1)
             
-            # Split forward index into chunks
-            chunks = np.array_split(forward_index_df, num_processes)
-            
-            # Parallel processing of forward index chunks
+            if is_parquet(self.input_forward_index_file):
+                reader = (batch for _, batch in iter_batches(self.input_forward_index_file, ['doc_id', 'word_ids'],
+                                                             chunk_size))
+            else:
+                reader = pd.read_csv(self.input_forward_index_file, chunksize=chunk_size,
+                                     usecols=['doc_id', 'word_ids'], dtype={'word_ids': str})
+            runs = []
+            doc_id_parts, length_parts = [], []
             with multiprocessing.Pool(processes=num_processes) as pool:
-                partial_inverted_indices = pool.map(self._process_forward_index_chunk, chunks)
-            
-            # Merge partial inverted indices
-            full_inverted_index = {}
-            for partial_index in partial_inverted_indices:
-                for word_id, doc_ids in partial_index.items():
-                    if word_id not in full_inverted_index:
-                        full_inverted_index[word_id] = set()
-                    full_inverted_index[word_id].update(doc_ids)
-            
-            # Convert sets to sorted lists
-            full_inverted_index = {
-                word_id: sorted(list(doc_ids)) 
-                for word_id, doc_ids in full_inverted_index.items()
-            }
-            
-            # Sort the inverted index by word_id
-            full_inverted_index = dict(sorted(full_inverted_index.items()))
-            
-            # Save the full inverted index in the desired format (word_id : doc_ids)
-            inverted_index_df = pd.DataFrame([{
-                "word_id": word_id, 
-                "doc_ids": " ".join(map(str, doc_ids))} 
-                for word_id, doc_ids in full_inverted_index.items()
-            ])
-            
-            # Save to CSV with columns "word_id" and "doc_ids"
-            inverted_index_df.to_csv(self.output_inverted_index_file, index=False)
-            
-            # Distribute to barrels
-            inverted_index_barrels = self._distribute_to_barrels(full_inverted_index, num_barrels)
-            
-            # Save each barrel to a separate file
-            for i, barrel in enumerate(inverted_index_barrels):
-                barrel_df = pd.DataFrame([{
-                    "word_id": word_id, 
-                    "doc_ids": " ".join(map(str, doc_ids))}
-                    for word_id, doc_ids in barrel.items()
-                ])
-                barrel_file = os.path.join(
-                    self.output_barrels_folder, 
-                    f"inverted_index_barrel_{i}.csv"
-                )
-                barrel_df.to_csv(barrel_file, index=False)
-                print(f"Inverted index barrel {i} saved to {barrel_file}")
+                for run, (doc_ids, doc_lengths) in pool.imap(self._process_forward_index_chunk, reader):
+                    runs.append(run)
+                    doc_id_parts.append(doc_ids)
+                    length_parts.append(doc_lengths)
+
+            doc_lengths = self._doc_lengths(doc_id_parts, length_parts)
+            parquet = is_parquet(self.output_inverted_index_file)
+            writers = self._open_parquet(num_barrels) if parquet else self._open_csv(num_barrels)
+            index_writer = BinaryIndexWriter(self.output_binary_index_folder, doc_lengths,
+                                             positional=self.positional, codec=self.codec)
+            num_words = 0
+            for word_ids, doc_ids, positions in self._merge_runs(runs, batch_tokens):
+                word_starts = np.flatnonzero(np.diff(word_ids, prepend=-1))
+                word_ends = np.append(word_starts[1:], len(word_ids))
+
+                # Collapse each word's repeated doc IDs into postings, for all words at once
+                posting_starts = np.flatnonzero((np.diff(word_ids, prepend=-1) != 0) | (np.diff(doc_ids, prepend=-1) != 0))
+                posting_doc_ids = doc_ids[posting_starts]
+                posting_term_frequencies = np.diff(np.append(posting_starts, len(doc_ids)))
+                posting_offsets = np.append(np.searchsorted(posting_starts, word_starts), len(posting_starts))
+                posting_counts = np.diff(posting_offsets)
+
+                if parquet:
+                    self._write_parquet(writers, word_ids[word_starts], posting_counts, posting_doc_ids,
+                                        posting_term_frequencies)
+                else:
+                    self._write_csv(writers, word_ids[word_starts], posting_offsets, posting_doc_ids,
+                                    posting_term_frequencies)
+
+                for word_number, (start, end) in enumerate(zip(word_starts, word_ends)):
+                    posting_start, posting_end = posting_offsets[word_number], posting_offsets[word_number + 1]
+                    index_writer.add(int(word_ids[start]), posting_doc_ids[posting_start:posting_end],
+                                     posting_term_frequencies[posting_start:posting_end],
+                                     positions[start:end] if self.positional else None)
+                num_words += len(word_starts)
+
+            if parquet:
+                self._close_parquet(writers)
+            else:
+                self._close_csv(writers)
+            index_writer.close()
+            print(f"Binary index saved to {self.output_binary_index_folder}")
             
             print(f"Full inverted index saved to {self.output_inverted_index_file}")
-            print(f"Total unique words in inverted index: {len(full_inverted_index)}")
+            print(f"Total unique words in inverted index: {num_words}")
             
-            return full_inverted_index
+            return num_words
         
         except Exception as e:
             print(f"Error creating inverted index: {e}")
@@ -150,16 +339,18 @@ class InvertedIndexGenerator:
 
 def main():
     # File paths
-    input_forward_index_file = r"C:\Users\AT\CSV Dataset files\forward_indexing.csv"
-    output_inverted_index_file = r"C:\Users\AT\CSV Dataset files\inverted_indexing.csv"
+    input_forward_index_file = r"C:\Users\AT\CSV Dataset files\forward_indexing.parquet"
+    output_inverted_index_file = r"C:\Users\AT\CSV Dataset files\inverted_indexing.parquet"
     output_barrels_folder = r"C:\Users\AT\CSV Dataset files\inverted_index_barrels"
+    output_binary_index_folder = r"C:\Users\AT\CSV Dataset files\binary_index"
     
     try:
         # Initialize and run inverted index generator
         inverted_index_generator = InvertedIndexGenerator(
             input_forward_index_file, 
             output_inverted_index_file, 
-            output_barrels_folder
+            output_barrels_folder,
+            output_binary_index_folder
         )
         inverted_index_generator.create_inverted_index()
     
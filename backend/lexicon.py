@@ -1,14 +1,36 @@
 import pandas as pd
-import numpy as np
 from collections import Counter
+from itertools import islice
 import multiprocessing
 import warnings
+from columnar import column_names, read_chunks
+from lexicon_trie import LexiconTrie, default_trie_folder
+from spelling import SpellingIndex, default_spelling_folder
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
 class LexiconGenerator:
-    def __init__(self, input_file, output_lexicon_file):
+    def __init__(self, input_file, output_lexicon_file, output_trie_folder=None, output_spelling_folder=None):
+        """
+        Initialize the lexicon generator.
+
+        Args:
+            input_file (str): Path to cleaned dataset, CSV or Parquet
+            output_lexicon_file (str): Path to save the lexicon
+            output_trie_folder (str, optional): Folder to save the prefix index
+                used for autocompletion. Defaults to a "lexicon_trie" folder
+                next to the lexicon file.
+            output_spelling_folder (str, optional): Folder to save the spelling
+                index used for typo tolerance. Defaults to a "spelling" folder
+                next to the lexicon file.
+        """
         self.input_file = input_file
         self.output_lexicon_file = output_lexicon_file
+        if output_trie_folder is None:
+            output_trie_folder = default_trie_folder(output_lexicon_file)
+        self.output_trie_folder = output_trie_folder
+        if output_spelling_folder is None:
+            output_spelling_folder = default_spelling_folder(output_lexicon_file)
+        self.output_spelling_folder = output_spelling_folder
 
     def _process_text_chunk(self, text_chunk):
         """
@@ -21,40 +43,52 @@ class LexiconGenerator:
                 word_counter.update(set(tokens))  # Use set to avoid duplicates
         return word_counter
     
-    def create_lexicon(self, num_processes=None):
+    def create_lexicon(self, num_processes=None, chunk_size=50000):
         """
         Create a lexicon with unique words and their IDs.
+
+        The dataset is streamed in chunks of chunk_size rows, and at most
+        num_processes chunks are held in memory at a time. Only the
+        cleaned_text column is read.
         """
         try:
-            df = pd.read_csv(self.input_file)
-            
-            if 'cleaned_text' not in df.columns:
+            if 'cleaned_text' not in column_names(self.input_file):
                 raise ValueError("Dataset must contain 'cleaned_text' column")
             
             # Determine number of processes
             if num_processes is None:
                 num_processes = max(1, multiprocessing.cpu_count() - 1)
             
-            chunks = np.array_split(df['cleaned_text'], num_processes)
+            reader = read_chunks(self.input_file, columns=['cleaned_text'], chunk_size=chunk_size)
             
-            # Parallel processing using multiple processes
-            with multiprocessing.Pool(processes=num_processes) as pool:
-                word_counters = pool.map(self._process_text_chunk, chunks)
-            
-            # Merge all word counters into one
+            # Parallel processing using multiple processes, one batch of chunks at a time
             global_counter = Counter()
-            for counter in word_counters:
-                global_counter.update(counter)
+            with multiprocessing.Pool(processes=num_processes) as pool:
+                while True:
+                    batch = [chunk['cleaned_text'] for chunk in islice(reader, num_processes)]
+                    if not batch:
+                        break
+                    
+                    # Merge the batch's word counters into the global one
+                    for counter in pool.map(self._process_text_chunk, batch):
+                        global_counter.update(counter)
             
             # Sort words by frequency
             sorted_words = sorted(global_counter.items(), key=lambda x: x[1], reverse=True)
             lexicon = {word: word_id + 1 for word_id, (word, _) in enumerate(sorted_words)}
             
-            # Save lexicon
+            # Save lexicon; the counts are document frequencies, since each document counts a word once
             lexicon_df = pd.DataFrame(list(lexicon.items()), columns=["word", "word_id"])
+            lexicon_df["document_frequency"] = [count for _, count in sorted_words]
             lexicon_df.to_csv(self.output_lexicon_file, index=False)
             
             print(f"Lexicon saved to {self.output_lexicon_file}")
+
+            LexiconTrie.build(self.output_lexicon_file, self.output_trie_folder)
+            print(f"Lexicon trie saved to {self.output_trie_folder}")
+
+            SpellingIndex.build(self.output_lexicon_file, self.output_spelling_folder)
+            print(f"Spelling index saved to {self.output_spelling_folder}")
             return lexicon
         
         except Exception as e:
@@ -62,7 +96,7 @@ class LexiconGenerator:
             raise
 
 def main():
-    input_file = r"C:\Users\AT\CSV Dataset files\cleaned_articles_test.csv"  # Path to the cleaned dataset
+    input_file = r"C:\Users\AT\CSV Dataset files\cleaned_articles_test.parquet"  # Path to the cleaned dataset
     output_lexicon_file = r"C:\Users\AT\CSV Dataset files\lexicon.csv"  # Path where lexicon will be saved
 
     lexicon_generator = LexiconGenerator(input_file, output_lexicon_file)
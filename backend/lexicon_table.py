@@ -0,0 +1,176 @@
+import os
+from collections.abc import Mapping
+import numpy as np
+
+WORDS_FILE = "words.npy"
+WORD_IDS_FILE = "word_ids.npy"
+SLOTS_FILE = "slots.npy"
+
+# 64-bit FNV-1a, computed the same way by build() (vectorized) and lookups (per word)
+FNV_OFFSET = 0xCBF29CE484222325
+FNV_PRIME = 0x100000001B3
+HASH_MASK = 0xFFFFFFFFFFFFFFFF
+
+
+def _hash(key):
+    value = FNV_OFFSET
+    for byte in key:
+        value = ((value ^ byte) * FNV_PRIME) & HASH_MASK
+    return value
+
+
+def _hash_many(words):
+    """FNV-1a of every word of a fixed-width bytes array."""
+    values = np.full(len(words), FNV_OFFSET, dtype=np.uint64)
+    if len(words) == 0:
+        return values
+    lengths = np.char.str_len(words)
+    columns = words.view(np.uint8).reshape(len(words), words.dtype.itemsize)
+    for column in range(words.dtype.itemsize):
+        # Multiplication wraps around at 64 bits, like the & HASH_MASK in _hash
+        hashed = (values ^ columns[:, column]) * np.uint64(FNV_PRIME)
+        values = np.where(lengths > column, hashed, values)
+    return values
+
+
+class LexiconTable:
+    def __init__(self, table_folder):
+        """
+        Open a memory-mapped lexicon table for vectorized word -> word_id lookups.
+
+        The table is a sorted array of fixed-width UTF-8 words and a parallel
+        array of word IDs. Every process that opens it maps the same files, so
+        worker processes share one copy of the lexicon through the OS page
+        cache instead of each receiving a pickled dict.
+
+        Args:
+            table_folder (str): Folder written by LexiconTable.build
+        """
+        self.table_folder = table_folder
+        self.words = np.load(os.path.join(table_folder, WORDS_FILE), mmap_mode='r')
+        self.word_ids = np.load(os.path.join(table_folder, WORD_IDS_FILE), mmap_mode='r')
+        self.width = self.words.dtype.itemsize
+
+    @staticmethod
+    def build(input_lexicon_file, table_folder):
+        """
+        Write the lookup table of a lexicon CSV.
+
+        Args:
+            input_lexicon_file (str): Lexicon with word and word_id columns
+            table_folder (str): Folder to write the table to
+
+        Returns:
+            LexiconTable: The opened table
+        """
+        # Only the offline build reads CSVs, so pandas is not imported when serving
+        import pandas as pd
+
+        os.makedirs(table_folder, exist_ok=True)
+        lexicon_df = pd.read_csv(input_lexicon_file, keep_default_na=False)
+
+        words = np.array(lexicon_df['word'].astype(str).str.encode('utf-8').tolist(), dtype=bytes)
+        if len(words) == 0:
+            words = np.empty(0, dtype='S1')
+        order = np.argsort(words, kind='stable')
+        np.save(os.path.join(table_folder, WORDS_FILE), words[order])
+        np.save(os.path.join(table_folder, WORD_IDS_FILE), lexicon_df['word_id'].to_numpy(dtype=np.int32)[order])
+        return LexiconTable(table_folder)
+
+    def lookup(self, tokens):
+        """
+        Map tokens to word IDs.
+
+        Args:
+            tokens (iterable): Token strings without whitespace
+
+        Returns:
+            np.ndarray: int32 word ID of every token, 0 for tokens missing
+                from the lexicon (word IDs start at 1)
+        """
+        tokens = list(tokens)
+        if len(tokens) == 0 or len(self.words) == 0:
+            return np.zeros(len(tokens), dtype=np.int32)
+
+        # Encoding one joined string is much faster than encoding token by token
+        keys = np.array(" ".join(tokens).encode('utf-8').split(b" "))
+        fixed_width_keys = keys.astype(self.words.dtype)
+        # Fixed-width keys truncate longer tokens, which must not match a shorter word
+        truncated = fixed_width_keys != keys if keys.dtype.itemsize > self.width else False
+
+        positions = np.minimum(np.searchsorted(self.words, fixed_width_keys), len(self.words) - 1)
+        found = (self.words[positions] == fixed_width_keys) & ~truncated
+        return np.where(found, self.word_ids[positions], 0).astype(np.int32)
+
+
+class LexiconHashTable(LexiconTable, Mapping):
+    def __init__(self, table_folder):
+        """
+        Open a memory-mapped lexicon hash table, usable like a read-only
+        word -> word_id dict.
+
+        The table adds an open-addressing slot array (linear probing, at most
+        half full) to the sorted arrays of LexiconTable, so single words are
+        found in about one probe and vectorized lookup() keeps working.
+        Opening it reads nothing up front, unlike building a dict from the
+        lexicon CSV.
+
+        Args:
+            table_folder (str): Folder written by LexiconHashTable.build
+        """
+        super().__init__(table_folder)
+        self.slots = np.load(os.path.join(table_folder, SLOTS_FILE), mmap_mode='r')
+        self._slot_mask = len(self.slots) - 1
+
+    @staticmethod
+    def build(input_lexicon_file, table_folder):
+        """
+        Write the hash table of a lexicon CSV.
+
+        Args:
+            input_lexicon_file (str): Lexicon with word and word_id columns
+            table_folder (str): Folder to write the table to
+
+        Returns:
+            LexiconHashTable: The opened table
+        """
+        words = LexiconTable.build(input_lexicon_file, table_folder).words
+
+        # A power of two at least twice the number of words
+        capacity = 1 << max(1, (2 * len(words) - 1).bit_length())
+        slots = np.full(capacity, -1, dtype=np.int32)
+        pending = np.arange(len(words))
+        positions = (_hash_many(np.asarray(words)) & np.uint64(capacity - 1)).astype(np.int64)
+
+        # Insert all words at once: each round, the first pending word aiming at a
+        # free slot takes it, and every other pending word probes the next slot
+        while len(pending):
+            aiming_at_free = np.flatnonzero(slots[positions] == -1)
+            _, first = np.unique(positions[aiming_at_free], return_index=True)
+            placed = aiming_at_free[first]
+            slots[positions[placed]] = pending[placed]
+
+            waiting = np.ones(len(pending), dtype=bool)
+            waiting[placed] = False
+            pending, positions = pending[waiting], (positions[waiting] + 1) & (capacity - 1)
+
+        np.save(os.path.join(table_folder, SLOTS_FILE), slots)
+        return LexiconHashTable(table_folder)
+
+    def __getitem__(self, word):
+        key = word.encode('utf-8') if isinstance(word, str) else b""
+        if key and len(key) <= self.width:
+            position = _hash(key) & self._slot_mask
+            row = int(self.slots[position])
+            while row >= 0:
+                if self.words[row] == key:
+                    return int(self.word_ids[row])
+                position = (position + 1) & self._slot_mask
+                row = int(self.slots[position])
+        raise KeyError(word)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __iter__(self):
+        return (word.decode('utf-8') for word in self.words)
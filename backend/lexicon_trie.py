@@ -0,0 +1,153 @@
+import os
+import numpy as np
+
+TRIE_FOLDER = "lexicon_trie"
+WORDS_FILE = "words.npy"
+WORD_IDS_FILE = "word_ids.npy"
+DOCUMENT_FREQUENCIES_FILE = "document_frequencies.npy"
+HEAVY_PREFIXES_FILE = "heavy_prefixes.npy"
+HEAVY_COMPLETIONS_FILE = "heavy_completions.npy"
+
+# Prefixes matching more words than this get their best completions precomputed
+SCAN_LIMIT = 1024
+# Completions stored per precomputed prefix, the most complete() returns for them
+TOP_K = 64
+
+# UTF-8 never contains this byte, so prefix + it sorts after every word with the prefix
+PREFIX_END = b"\xff"
+
+
+def default_trie_folder(lexicon_file):
+    """Trie folder LexiconGenerator writes next to a lexicon CSV."""
+    return os.path.join(os.path.dirname(os.path.abspath(lexicon_file)), TRIE_FOLDER)
+
+
+class LexiconTrie:
+    def __init__(self, trie_folder):
+        """
+        Open a memory-mapped prefix index over the lexicon for autocompletion.
+
+        Words are stored sorted as fixed-width UTF-8, which makes the array
+        an implicit trie: the words under any prefix form one contiguous
+        range, found with two binary searches. Short ranges are ranked on
+        the fly; for the few prefixes matching more than SCAN_LIMIT words
+        the TOP_K best completions are precomputed, so every lookup takes
+        well under a millisecond. Completions are ranked by document
+        frequency, then by word ID.
+
+        Args:
+            trie_folder (str): Folder written by LexiconTrie.build
+        """
+        self.trie_folder = trie_folder
+        self.words = np.load(os.path.join(trie_folder, WORDS_FILE), mmap_mode='r')
+        self.word_ids = np.load(os.path.join(trie_folder, WORD_IDS_FILE), mmap_mode='r')
+        self.document_frequencies = np.load(os.path.join(trie_folder, DOCUMENT_FREQUENCIES_FILE), mmap_mode='r')
+        self.heavy_prefixes = np.load(os.path.join(trie_folder, HEAVY_PREFIXES_FILE), mmap_mode='r')
+        self.heavy_completions = np.load(os.path.join(trie_folder, HEAVY_COMPLETIONS_FILE), mmap_mode='r')
+        self.width = self.words.dtype.itemsize
+
+    @staticmethod
+    def build(input_lexicon_file, trie_folder):
+        """
+        Write the prefix index of a lexicon CSV.
+
+        Args:
+            input_lexicon_file (str): Lexicon with word and word_id columns,
+                and a document_frequency column to rank completions by;
+                without it completions are ranked by word ID, which the
+                lexicon assigns in order of frequency
+            trie_folder (str): Folder to write the prefix index to
+
+        Returns:
+            LexiconTrie: The opened prefix index
+        """
+        # Only the offline build reads CSVs, so pandas is not imported when serving
+        import pandas as pd
+
+        os.makedirs(trie_folder, exist_ok=True)
+        lexicon_df = pd.read_csv(input_lexicon_file, keep_default_na=False)
+
+        words = np.array(lexicon_df['word'].astype(str).str.encode('utf-8').tolist(), dtype=bytes)
+        if len(words) == 0:
+            words = np.empty(0, dtype='S1')
+        word_ids = lexicon_df['word_id'].to_numpy(dtype=np.int32)
+        if 'document_frequency' in lexicon_df.columns:
+            document_frequencies = lexicon_df['document_frequency'].to_numpy(dtype=np.int32)
+        else:
+            document_frequencies = np.zeros(len(words), dtype=np.int32)
+
+        order = np.argsort(words, kind='stable')
+        words, word_ids, document_frequencies = words[order], word_ids[order], document_frequencies[order]
+        heavy_prefixes, heavy_completions = LexiconTrie._heavy_prefixes(words, word_ids, document_frequencies)
+
+        for filename, array in ((WORDS_FILE, words), (WORD_IDS_FILE, word_ids),
+                                (DOCUMENT_FREQUENCIES_FILE, document_frequencies),
+                                (HEAVY_PREFIXES_FILE, heavy_prefixes),
+                                (HEAVY_COMPLETIONS_FILE, heavy_completions)):
+            np.save(os.path.join(trie_folder, filename), array)
+        return LexiconTrie(trie_folder)
+
+    @staticmethod
+    def _heavy_prefixes(words, word_ids, document_frequencies):
+        """Every prefix matching more than SCAN_LIMIT words, with its TOP_K best completions."""
+        lengths = np.char.str_len(words) if len(words) else np.zeros(0, dtype=np.int64)
+        prefix_parts, completion_parts = [np.empty(0, dtype='S1')], [np.empty((0, TOP_K), dtype=np.int32)]
+
+        for length in range(1, words.dtype.itemsize + 1):
+            # Sorted words truncated to a length are still sorted, so unique() is cheap
+            prefixes = np.unique(words[lengths >= length].astype(f'S{length}'))
+            if len(prefixes) == 0:
+                break
+            starts = np.searchsorted(words, prefixes, side='left')
+            ends = np.searchsorted(words, np.char.add(prefixes, PREFIX_END), side='left')
+            heavy = np.flatnonzero(ends - starts > SCAN_LIMIT)
+            if len(heavy) == 0:
+                break
+
+            completions = np.full((len(heavy), TOP_K), -1, dtype=np.int32)
+            for row, prefix_number in enumerate(heavy.tolist()):
+                start, end = starts[prefix_number], ends[prefix_number]
+                best = np.lexsort((word_ids[start:end], -document_frequencies[start:end].astype(np.int64)))[:TOP_K]
+                completions[row, :len(best)] = best + start
+            prefix_parts.append(prefixes[heavy])
+            completion_parts.append(completions)
+
+        heavy_prefixes = np.concatenate(prefix_parts)
+        heavy_completions = np.concatenate(completion_parts)
+        order = np.argsort(heavy_prefixes, kind='stable')
+        return heavy_prefixes[order], heavy_completions[order]
+
+    def complete(self, prefix, max_results=10):
+        """
+        Return the most frequent lexicon words starting with a prefix.
+
+        Args:
+            prefix (str): Word prefix
+            max_results (int): Completions to return; prefixes matching more
+                than SCAN_LIMIT words return at most TOP_K
+
+        Returns:
+            list: (word, word_id, document_frequency) tuples, most frequent first
+        """
+        key = prefix.encode('utf-8')
+        if not key or len(self.words) == 0 or max_results <= 0:
+            return []
+
+        if len(key) >= self.width:
+            # Only a word of exactly the maximum length can match
+            start = int(np.searchsorted(self.words, key[:self.width]))
+            end = start + int(len(key) == self.width and start < len(self.words) and self.words[start] == key)
+        else:
+            start = int(np.searchsorted(self.words, key, side='left'))
+            end = int(np.searchsorted(self.words, key + PREFIX_END, side='left'))
+
+        if end - start > SCAN_LIMIT:
+            row = int(np.searchsorted(self.heavy_prefixes, key))
+            positions = self.heavy_completions[row, :max_results]
+            positions = positions[positions >= 0]
+        else:
+            document_frequencies = -self.document_frequencies[start:end].astype(np.int64)
+            positions = np.lexsort((self.word_ids[start:end], document_frequencies))[:max_results] + start
+
+        return [(self.words[position].decode('utf-8'), int(self.word_ids[position]),
+                 int(self.document_frequencies[position])) for position in positions.tolist()]
@@ -0,0 +1,260 @@
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+import numpy as np
+
+# Stages a query's time is split into; time in a nested stage is not counted in its parent
+STAGES = ("parse", "postings", "rank", "boolean", "shards", "documents")
+# Request kinds with their own latency histogram
+KINDS = ("search", "batch")
+# Upper bounds in seconds of the latency histogram buckets, plus +Inf
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+COUNTERS = {
+    "queries": "Queries answered, counting every query of a batch",
+    "errors": "Requests that raised an error",
+    "slow_queries": "Requests slower than the slow query threshold",
+    "result_cache_hits": "Queries answered from the result cache",
+    "result_cache_misses": "Queries ranked because the result cache missed",
+    "postings_cache_hits": "Posting lists found in the postings cache",
+    "postings_cache_misses": "Posting lists read from the index",
+    "postings_bytes": "Bytes of doc IDs and term frequencies read from the index",
+    "candidates_scored": "Documents scored with BM25 before the top results were chosen",
+    "first_tier_answers": "Queries answered from the first tier of a tiered index",
+    "first_tier_fallthroughs": "Queries the first tier could not answer exactly, ranked over the full index",
+}
+
+# Every process adds up its own metrics in one list of floats: the counters, then
+# per histogram the count of every bucket and the sum of observations
+HISTOGRAM_SLOTS = len(LATENCY_BUCKETS) + 2
+HISTOGRAMS = [("stage", stage) for stage in STAGES] + [("kind", kind) for kind in KINDS]
+NUM_SLOTS = len(COUNTERS) + len(HISTOGRAMS) * HISTOGRAM_SLOTS
+
+_COUNTER_SLOTS = {name: slot for slot, name in enumerate(COUNTERS)}
+_HISTOGRAM_OFFSETS = {histogram: len(COUNTERS) + number * HISTOGRAM_SLOTS
+                      for number, histogram in enumerate(HISTOGRAMS)}
+
+slow_query_logger = logging.getLogger("search.slow_queries")
+
+_local = threading.local()
+
+
+class _NullTrace:
+    """Stands in for a trace outside of traced requests, e.g. when warming caches."""
+    _stage = nullcontext()
+
+    def stage(self, name):
+        return self._stage
+
+    def count(self, name, amount=1):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+def current_trace():
+    """The trace of the request running on this thread, or a trace that records nothing."""
+    return getattr(_local, "trace", NULL_TRACE)
+
+
+class _Stage:
+    __slots__ = ("trace", "name")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        trace = self.trace
+        now = time.perf_counter()
+        if trace._stack:
+            parent = trace._stack[-1]
+            trace.stage_seconds[parent] = trace.stage_seconds.get(parent, 0.0) + now - trace._mark
+        trace._stack.append(self.name)
+        trace._mark = now
+
+    def __exit__(self, *exc_info):
+        trace = self.trace
+        now = time.perf_counter()
+        trace._stack.pop()
+        trace.stage_seconds[self.name] = trace.stage_seconds.get(self.name, 0.0) + now - trace._mark
+        trace._mark = now
+        return False
+
+
+class QueryTrace:
+    def __init__(self, metrics, query, kind="search", num_queries=1):
+        """
+        Time the stages of one request and count the work it does.
+
+        Used as a context manager around a request; while it is open,
+        current_trace() returns it on the request's thread, so the query path
+        can report to it without passing it around.
+
+        Args:
+            metrics (QueryMetrics): Metrics the trace is recorded into
+            query (str): Query text, for the slow query log
+            kind (str): One of KINDS
+            num_queries (int): Queries answered by the request
+        """
+        self.metrics = metrics
+        self.query = query
+        self.kind = kind
+        self.num_queries = num_queries
+        self.stage_seconds = {}
+        self.counts = {}
+        self.seconds = None
+        self.failed = False
+        self._stack = []
+        self._mark = None
+        self._started = None
+        self._previous = None
+
+    def __enter__(self):
+        self._previous = getattr(_local, "trace", None)
+        _local.trace = self
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.seconds = time.perf_counter() - self._started
+        self.failed = exc_type is not None
+        _local.trace = self._previous if self._previous is not None else NULL_TRACE
+        self.metrics.record(self)
+        return False
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def count(self, name, amount=1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+
+class QueryMetrics:
+    def __init__(self, metrics_folder=None, slow_query_seconds=None):
+        """
+        Latency histograms and work counters of the query path, rendered in
+        the Prometheus text format.
+
+        Recording a request takes a few microseconds: its stage times and
+        counts are added to a list of floats under a lock. When metrics_folder
+        is set, every process keeps its array in its own memory-mapped file
+        there and render() adds up all of them, so any worker of a pre-forked
+        server reports the totals of the whole server.
+
+        Args:
+            metrics_folder (str, optional): Folder shared by the worker
+                processes; metrics stay in process memory without it
+            slow_query_seconds (float, optional): Requests taking longer are
+                logged with their stage breakdown to the "search.slow_queries"
+                logger; None turns the slow query log off
+        """
+        self.metrics_folder = metrics_folder
+        self.slow_query_seconds = slow_query_seconds
+        self._lock = threading.Lock()
+        self._pid = None
+        self._values = None
+        self._file = None
+
+    def trace(self, query, kind="search", num_queries=1):
+        """Start tracing a request; see QueryTrace."""
+        return QueryTrace(self, query, kind, num_queries)
+
+    def _open(self):
+        # Opened on first use in each process, so forked workers don't share the master's file
+        self._pid = os.getpid()
+        self._values = [0.0] * NUM_SLOTS
+        if self.metrics_folder is not None:
+            os.makedirs(self.metrics_folder, exist_ok=True)
+            path = os.path.join(self.metrics_folder, f"metrics_{self._pid}.bin")
+            self._file = np.asarray(np.memmap(path, dtype=np.float64, mode="w+", shape=(NUM_SLOTS,)))
+
+    def _observe(self, histogram, seconds):
+        values = self._values
+        offset = _HISTOGRAM_OFFSETS[histogram]
+        values[offset + bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        values[offset + HISTOGRAM_SLOTS - 1] += seconds
+
+    def record(self, trace):
+        """Add a finished trace to the metrics, and log it when it was slow."""
+        slow = self.slow_query_seconds is not None and trace.seconds > self.slow_query_seconds
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            # Plain Python floats are the cheapest to update; the file gets a copy of them
+            values = self._values
+            values[_COUNTER_SLOTS["queries"]] += trace.num_queries
+            values[_COUNTER_SLOTS["errors"]] += trace.failed
+            values[_COUNTER_SLOTS["slow_queries"]] += slow
+            for name, amount in trace.counts.items():
+                values[_COUNTER_SLOTS[name]] += amount
+            for stage, seconds in trace.stage_seconds.items():
+                self._observe(("stage", stage), seconds)
+            self._observe(("kind", trace.kind), trace.seconds)
+            if self._file is not None:
+                self._file[:] = values
+
+        if slow:
+            slow_query_logger.warning(json.dumps({
+                "query": trace.query,
+                "kind": trace.kind,
+                "ms": round(trace.seconds * 1000, 3),
+                "stages_ms": {stage: round(seconds * 1000, 3) for stage, seconds in trace.stage_seconds.items()},
+                "counts": trace.counts,
+                "failed": trace.failed,
+            }))
+
+    def totals(self):
+        """
+        Add up the metrics of this process, or of every process sharing metrics_folder.
+
+        Returns:
+            np.ndarray: float64 array laid out like the per-process arrays
+        """
+        if self.metrics_folder is None:
+            with self._lock:
+                return np.array(self._values if self._pid == os.getpid() else [0.0] * NUM_SLOTS)
+
+        totals = np.zeros(NUM_SLOTS, dtype=np.float64)
+        if not os.path.exists(self.metrics_folder):
+            return totals
+        for filename in os.listdir(self.metrics_folder):
+            path = os.path.join(self.metrics_folder, filename)
+            # Files of an older layout are left out
+            if filename.startswith("metrics_") and os.path.getsize(path) == NUM_SLOTS * 8:
+                totals += np.fromfile(path, dtype=np.float64)
+        return totals
+
+    def render(self):
+        """
+        Render the metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The body of a /metrics response
+        """
+        totals = self.totals()
+        lines = []
+        for name, help_text in COUNTERS.items():
+            lines += [f"# HELP search_{name}_total {help_text}",
+                      f"# TYPE search_{name}_total counter",
+                      f"search_{name}_total {totals[_COUNTER_SLOTS[name]]:.17g}"]
+
+        for metric, label, help_text in (
+                ("search_stage_seconds", "stage", "Time spent in each stage of the query path"),
+                ("search_request_seconds", "kind", "Time to answer a request")):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+            for histogram in HISTOGRAMS:
+                if histogram[0] != label:
+                    continue
+                offset = _HISTOGRAM_OFFSETS[histogram]
+                counts = np.cumsum(totals[offset:offset + len(LATENCY_BUCKETS) + 1])
+                for bound, count in zip([*LATENCY_BUCKETS, "+Inf"], counts):
+                    lines.append(f'{metric}_bucket{{{label}="{histogram[1]}",le="{bound}"}} {count:.17g}')
+                lines.append(f'{metric}_sum{{{label}="{histogram[1]}"}} {totals[offset + HISTOGRAM_SLOTS - 1]:.17g}')
+                lines.append(f'{metric}_count{{{label}="{histogram[1]}"}} {counts[-1]:.17g}')
+        return "\n".join(lines) + "\n"
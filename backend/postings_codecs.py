@@ -0,0 +1,336 @@
+import numpy as np
+
+# Posting lists are stored as raw int32 arrays unless a codec is chosen at build time
+RAW = "raw"
+VARINT = "varint"
+PFOR = "pfor"
+ELIAS_FANO = "elias_fano"
+
+
+def _bit_lengths(values):
+    # frexp gives v = m * 2**e with 0.5 <= m < 1, so e is the bit length of v > 0
+    return np.frexp(values.astype(np.float64))[1].astype(np.int64)
+
+
+def _pack_bits(values, width):
+    """Pack the low width bits of every value, least significant first."""
+    if width == 0 or len(values) == 0:
+        return b""
+    bits = (values[:, None] >> np.arange(width)) & 1
+    return np.packbits(bits.astype(np.uint8).ravel(), bitorder='little').tobytes()
+
+
+def _unpack_bits(data, count, width):
+    if width == 0:
+        return np.zeros(count, dtype=np.int64)
+    bits = np.unpackbits(np.asarray(data), count=count * width, bitorder='little').reshape(count, width)
+    return bits.astype(np.int64) @ (np.int64(1) << np.arange(width, dtype=np.int64))
+
+
+class BlockCodec:
+    """
+    Base class of the block codecs.
+
+    A term's postings are split into blocks of block_size. Doc IDs are
+    stored as gaps from the previous doc ID; the first gap of a block is
+    taken from the last doc ID of the previous block, which the index keeps
+    as skip data, so every block decodes on its own. Term frequencies are
+    stored as they are.
+
+    Subclasses implement encode_values and decode_values for one block and
+    may override the *_many methods with vectorized versions.
+    """
+    name = None
+
+    def __init__(self, block_size):
+        self.block_size = block_size
+
+    def encode_values(self, values):
+        raise NotImplementedError
+
+    def decode_values(self, data, count):
+        raise NotImplementedError
+
+    def encode_values_many(self, values, block_size=None):
+        """
+        Encode a term's values block by block.
+
+        Returns:
+            tuple: (encoded bytes, encoded length of every block)
+        """
+        block_size = block_size or self.block_size
+        values = np.asarray(values, dtype=np.int64)
+        parts = [self.encode_values(values[start:start + block_size])
+                 for start in range(0, len(values), block_size)]
+        return b"".join(parts), np.array([len(part) for part in parts], dtype=np.int64)
+
+    def decode_values_many(self, data, byte_offsets, counts):
+        """
+        Decode consecutive blocks.
+
+        Args:
+            data (np.ndarray): uint8 bytes of the blocks
+            byte_offsets (np.ndarray): Start of every block in data, plus the end
+            counts (np.ndarray): Number of values in every block
+
+        Returns:
+            np.ndarray: int64 values of all blocks concatenated
+        """
+        if len(counts) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([
+            self.decode_values(data[byte_offsets[i]:byte_offsets[i + 1]], int(counts[i]))
+            for i in range(len(counts))
+        ])
+
+    def encode_doc_ids_many(self, doc_ids, block_size=None, base=0):
+        """
+        Encode a term's doc IDs block by block.
+
+        Args:
+            doc_ids (np.ndarray): Sorted doc IDs, a whole number of blocks
+                unless they end the list
+            block_size (int, optional): Defaults to the codec's block size
+            base (int): Last doc ID of the previous block, when a list is
+                encoded a slice at a time; 0 for the start of a list
+
+        Returns:
+            tuple: (encoded bytes, encoded length of every block)
+        """
+        # One gap sequence for the whole list chains each block to the previous one
+        return self.encode_values_many(np.diff(np.asarray(doc_ids, dtype=np.int64), prepend=base), block_size)
+
+    def decode_doc_ids(self, data, count, base):
+        """
+        Decode a single block of doc IDs.
+
+        Args:
+            data (np.ndarray): uint8 bytes of the block
+            count (int): Number of doc IDs in the block
+            base (int): Last doc ID of the previous block, 0 for the first
+        """
+        return base + np.cumsum(self.decode_values(data, count))
+
+    def decode_doc_ids_many(self, data, byte_offsets, counts):
+        return np.cumsum(self.decode_values_many(data, byte_offsets, counts))
+
+
+class VarintCodec(BlockCodec):
+    """Gaps in LEB128 variable-byte form: 7 bits per byte, high bit set on all but the last byte."""
+    name = VARINT
+
+    def encode_values(self, values):
+        return self.encode_values_many(values)[0]
+
+    def encode_values_many(self, values, block_size=None):
+        block_size = block_size or self.block_size
+        values = np.asarray(values, dtype=np.int64)
+        num_bytes = np.maximum((_bit_lengths(values) + 6) // 7, 1)
+        starts = np.cumsum(num_bytes) - num_bytes
+
+        encoded = np.empty(int(num_bytes.sum()), dtype=np.uint8)
+        for group in range(int(num_bytes.max()) if len(values) else 0):
+            present = num_bytes > group
+            more = (num_bytes[present] > group + 1).astype(np.int64) << 7
+            encoded[starts[present] + group] = ((values[present] >> (7 * group)) & 0x7F) | more
+
+        block_lengths = np.add.reduceat(num_bytes, np.arange(0, len(values), block_size)) if len(values) else num_bytes
+        return encoded.tobytes(), block_lengths.astype(np.int64)
+
+    def decode_values(self, data, count):
+        return self.decode_values_many(data, np.array([0, len(data)]), np.array([count]))
+
+    def decode_values_many(self, data, byte_offsets, counts):
+        # Blocks are byte-aligned runs of whole values, so all of them decode at once
+        data = np.asarray(data[byte_offsets[0]:byte_offsets[-1]])
+        if len(data) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        value_ends = np.flatnonzero(data < 0x80)
+        value_starts = np.concatenate(([0], value_ends[:-1] + 1))
+        groups = np.arange(len(data)) - np.repeat(value_starts, value_ends - value_starts + 1)
+        return np.add.reduceat((data & 0x7F).astype(np.int64) << (7 * groups), value_starts)
+
+
+class PForDeltaCodec(BlockCodec):
+    """
+    Patched frame of reference: every value of a block is bit-packed with one
+    width chosen to minimize the block size; values too wide for it are
+    stored separately as exceptions.
+
+    Block layout: width (1 byte), number of exceptions (1 byte), block_size
+    packed values (padded, so every block of a width has the same layout),
+    exception positions (1 byte each), exception values (uint32 each).
+    """
+    name = PFOR
+
+    EXCEPTION_BYTES = 5
+
+    def encode_values(self, values):
+        values = np.asarray(values, dtype=np.int64)
+        bit_lengths = _bit_lengths(values)
+
+        # Bytes needed for every candidate width: packed values plus exceptions
+        widths = np.arange(33)
+        exceptions = (bit_lengths[None, :] > widths[:, None]).sum(axis=1)
+        sizes = widths * self.block_size // 8 + exceptions * self.EXCEPTION_BYTES
+        width = int(np.argmin(sizes))
+
+        padded = np.zeros(self.block_size, dtype=np.int64)
+        padded[:len(values)] = values & ((1 << width) - 1)
+        exception_positions = np.flatnonzero(bit_lengths > width)
+        return b"".join([
+            bytes([width, len(exception_positions)]),
+            _pack_bits(padded, width),
+            exception_positions.astype(np.uint8).tobytes(),
+            values[exception_positions].astype('<u4').tobytes(),
+        ])
+
+    def decode_values(self, data, count):
+        return self.decode_values_many(data, np.array([0, len(data)]), np.array([count]))
+
+    def decode_values_many(self, data, byte_offsets, counts):
+        num_blocks = len(counts)
+        if num_blocks == 0:
+            return np.empty(0, dtype=np.int64)
+        data = np.asarray(data)
+        starts = np.asarray(byte_offsets[:-1], dtype=np.int64)
+        widths = data[starts].astype(np.int64)
+        num_exceptions = data[starts + 1].astype(np.int64)
+
+        # Blocks of the same width share a layout, so each width is unpacked in one go
+        values = np.zeros((num_blocks, self.block_size), dtype=np.int64)
+        for width in np.unique(widths):
+            if width == 0:
+                continue
+            selected = np.flatnonzero(widths == width)
+            gather = (starts[selected] + 2)[:, None] + np.arange(width * self.block_size // 8)
+            bits = np.unpackbits(data[gather], axis=1, bitorder='little')
+            bits = bits.reshape(len(selected), self.block_size, width).astype(np.int64)
+            values[selected] = bits @ (np.int64(1) << np.arange(width, dtype=np.int64))
+
+        total_exceptions = int(num_exceptions.sum())
+        if total_exceptions:
+            blocks = np.repeat(np.arange(num_blocks), num_exceptions)
+            ranks = np.arange(total_exceptions) - np.repeat(np.cumsum(num_exceptions) - num_exceptions, num_exceptions)
+            exception_starts = starts + 2 + widths * self.block_size // 8
+            positions = data[exception_starts[blocks] + ranks].astype(np.int64)
+            value_starts = exception_starts[blocks] + num_exceptions[blocks] + 4 * ranks
+            exception_values = sum(data[value_starts + i].astype(np.int64) << (8 * i) for i in range(4))
+            values[blocks, positions] = exception_values
+
+        return values[np.arange(self.block_size) < np.asarray(counts)[:, None]]
+
+
+class EliasFanoCodec(BlockCodec):
+    """
+    Elias-Fano coded doc IDs, compact for long and dense posting lists.
+
+    Each block stores its doc IDs minus the previous block's last doc ID:
+    the low bits of every value bit-packed, and the high bits as a unary
+    coded bit vector. Term frequencies use PForDelta.
+
+    Block layout: low bit width (1 byte), high bit vector length in bytes
+    (uint16), packed low bits, high bit vector.
+    """
+    name = ELIAS_FANO
+
+    def __init__(self, block_size):
+        super().__init__(block_size)
+        self._values_codec = PForDeltaCodec(block_size)
+
+    def encode_values_many(self, values, block_size=None):
+        return self._values_codec.encode_values_many(values, block_size)
+
+    def decode_values_many(self, data, byte_offsets, counts):
+        return self._values_codec.decode_values_many(data, byte_offsets, counts)
+
+    def _encode_block(self, values):
+        count = len(values)
+        universe = int(values[-1])
+        low_width = max(0, (universe // count).bit_length() - 1) if universe >= count else 0
+
+        high_bits = np.zeros(int(values[-1] >> low_width) + count, dtype=np.uint8)
+        high_bits[(values >> low_width) + np.arange(count)] = 1
+        high_bytes = np.packbits(high_bits, bitorder='little').tobytes()
+        return b"".join([
+            bytes([low_width]),
+            len(high_bytes).to_bytes(2, 'little'),
+            _pack_bits(values & ((1 << low_width) - 1), low_width),
+            high_bytes,
+        ])
+
+    def encode_doc_ids_many(self, doc_ids, block_size=None, base=0):
+        block_size = block_size or self.block_size
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        parts = []
+        for start in range(0, len(doc_ids), block_size):
+            block_base = int(doc_ids[start - 1]) if start else base
+            parts.append(self._encode_block(doc_ids[start:start + block_size] - block_base))
+        return b"".join(parts), np.array([len(part) for part in parts], dtype=np.int64)
+
+    def decode_doc_ids(self, data, count, base):
+        data = np.asarray(data)
+        low_width = int(data[0])
+        num_high_bytes = int(data[1]) | int(data[2]) << 8
+        num_low_bytes = (count * low_width + 7) // 8
+
+        lows = _unpack_bits(data[3:3 + num_low_bytes], count, low_width)
+        high_bits = np.unpackbits(data[3 + num_low_bytes:3 + num_low_bytes + num_high_bytes], bitorder='little')
+        highs = np.flatnonzero(high_bits)[:count] - np.arange(count)
+        return base + ((highs << low_width) | lows)
+
+    def decode_doc_ids_many(self, data, byte_offsets, counts):
+        counts = np.asarray(counts, dtype=np.int64)
+        total = int(counts.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+        data = np.asarray(data)
+        starts = np.asarray(byte_offsets[:-1], dtype=np.int64)
+        low_widths = data[starts].astype(np.int64)
+        num_high_bytes = data[starts + 1].astype(np.int64) | data[starts + 2].astype(np.int64) << 8
+        high_starts = starts + 3 + (counts * low_widths + 7) // 8
+
+        # Rank of every value within its block
+        ranks = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        # Blocks with the same low bit width share a layout up to their count, so each
+        # width is unpacked in one go, like PForDelta; values past a block's count are dropped
+        block_size = int(counts.max())
+        lows = np.zeros((len(counts), block_size), dtype=np.int64)
+        for width in np.unique(low_widths):
+            if width == 0:
+                continue
+            selected = np.flatnonzero(low_widths == width)
+            gather = (starts[selected] + 3)[:, None] + np.arange((width * block_size + 7) // 8)
+            bits = np.unpackbits(data[np.minimum(gather, len(data) - 1)], axis=1, count=width * block_size,
+                                 bitorder='little').reshape(len(selected), block_size, width)
+            lows[selected] = bits.astype(np.int64) @ (np.int64(1) << np.arange(width, dtype=np.int64))
+        lows = lows[np.arange(block_size) < counts[:, None]]
+
+        # The high bit vectors of all blocks, unpacked together; a block sets exactly count bits
+        high_byte_starts = np.cumsum(num_high_bytes) - num_high_bytes
+        gather = np.repeat(high_starts - high_byte_starts, num_high_bytes) + np.arange(int(num_high_bytes.sum()))
+        set_bits = np.flatnonzero(np.unpackbits(data[gather], bitorder='little'))
+        highs = set_bits - np.repeat(8 * high_byte_starts, counts) - ranks
+
+        # Values are relative to the previous block's last doc ID
+        values = (highs << np.repeat(low_widths, counts)) | lows
+        last_doc_ids = np.cumsum(values[np.cumsum(counts) - 1])
+        return values + np.repeat(np.concatenate(([0], last_doc_ids[:-1])), counts)
+
+CODECS = {codec.name: codec for codec in (VarintCodec, PForDeltaCodec, EliasFanoCodec)}
+
+
+def get_codec(name, block_size):
+    """
+    Look up a postings codec by the name recorded in an index manifest.
+
+    Returns:
+        BlockCodec: The codec, or None for raw int32 postings
+    """
+    if name == RAW:
+        return None
+    if name not in CODECS:
+        raise ValueError(f"Unknown postings codec {name!r}; expected one of {[RAW, *CODECS]}")
+    return CODECS[name](block_size)
@@ -0,0 +1,261 @@
+import re
+from collections import namedtuple
+
+# Query syntax tree nodes
+Term = namedtuple("Term", ["word"])
+Phrase = namedtuple("Phrase", ["words"])
+And = namedtuple("And", ["children"])
+Or = namedtuple("Or", ["children"])
+Not = namedtuple("Not", ["child"])
+# "word*"; replaced by the matching lexicon words before evaluation (see expand_prefixes)
+Prefix = namedtuple("Prefix", ["prefix"])
+
+# Quoted phrases, parentheses, a leading "-" and bare words
+TOKEN_PATTERN = re.compile(r'"([^"]*)"?|(\()|(\))|(-)(?=\S)|([^\s()"]+)')
+
+
+class QueryParser:
+    def __init__(self, normalize):
+        """
+        Parse search queries with phrases and boolean operators.
+
+        Supported syntax:
+            "exact phrase"   words must appear next to each other
+            a AND b          both sides must match
+            a OR b           either side may match
+            -a               excludes documents matching a
+            (a OR b) AND c   parentheses group sub-queries
+            comp*            any word starting with "comp"
+
+        Words without an operator between them are OR'ed, like a plain
+        ranked query; AND binds tighter than OR. Operators are only
+        recognized in upper case, so "and"/"or" stay ordinary words.
+
+        Args:
+            normalize (callable): Maps raw query text to index tokens,
+                e.g. SearchEngine._preprocess_query
+        """
+        self.normalize = normalize
+
+    def _tokenize(self, query):
+        tokens = []
+        for match in TOKEN_PATTERN.finditer(query):
+            phrase, left, right, minus, word = match.groups()
+            if left:
+                tokens.append(("(", None))
+            elif right:
+                tokens.append((")", None))
+            elif minus:
+                tokens.append(("-", None))
+            elif word in ("AND", "OR"):
+                tokens.append((word, None))
+            elif word is not None and len(word) > 1 and word.endswith("*"):
+                tokens.append(("prefix", word[:-1]))
+            elif word is not None:
+                tokens.append(("word", word))
+            else:
+                tokens.append(("phrase", phrase))
+        return tokens
+
+    def parse(self, query):
+        """
+        Parse a query string.
+
+        Args:
+            query (str): Raw query
+
+        Returns:
+            Term, Phrase, Prefix, And, Or or Not: Root of the query tree, or
+                None when nothing searchable is left after normalization
+        """
+        return _TreeBuilder(self._tokenize(query), self.normalize).build()
+
+
+class _TreeBuilder:
+    def __init__(self, tokens, normalize):
+        # Parsing state lives here, so one QueryParser can serve concurrent requests
+        self._tokens = tokens
+        self._pos = 0
+        self.normalize = normalize
+
+    def build(self):
+        node = self._parse_or()
+        # Stray closing parentheses end a sub-query early; keep parsing what follows
+        while self._pos < len(self._tokens):
+            self._pos += 1
+            node = self._combine(Or, [node, self._parse_or()])
+        return node
+
+    def _peek(self):
+        if self._pos < len(self._tokens):
+            return self._tokens[self._pos][0]
+        return None
+
+    def _combine(self, node_type, children):
+        children = [child for child in children if child is not None]
+        if not children:
+            return None
+        if len(children) == 1:
+            return children[0]
+        # Tuples keep parsed queries hashable, so they can be used as cache keys
+        return node_type(tuple(children))
+
+    def _parse_or(self):
+        children = [self._parse_and()]
+        while self._peek() == "OR":
+            self._pos += 1
+            children.append(self._parse_and())
+        return self._combine(Or, children)
+
+    def _parse_and(self):
+        children = [self._parse_sequence()]
+        while self._peek() == "AND":
+            self._pos += 1
+            children.append(self._parse_sequence())
+        return self._combine(And, children)
+
+    def _parse_sequence(self):
+        """Implicitly OR'ed words; excluded items apply to the whole sequence."""
+        included, excluded = [], []
+        while self._peek() not in (None, "AND", "OR", ")"):
+            negated = self._peek() == "-"
+            if negated:
+                self._pos += 1
+            node = self._parse_primary()
+            if node is None:
+                continue
+            (excluded if negated else included).append(node)
+
+        node = self._combine(Or, included)
+        if not excluded:
+            return node
+        return self._combine(And, [node] + [Not(child) for child in excluded])
+
+    def _parse_primary(self):
+        kind, value = self._tokens[self._pos]
+        self._pos += 1
+
+        if kind == "(":
+            node = self._parse_or()
+            if self._peek() == ")":
+                self._pos += 1
+            return node
+        if kind in ("word", "phrase"):
+            words = self.normalize(value)
+            if not words:
+                return None
+            if len(words) == 1:
+                return Term(words[0])
+            return Phrase(tuple(words)) if kind == "phrase" else Or(tuple(Term(word) for word in words))
+        if kind == "prefix":
+            prefix = normalize_prefix(value)
+            return Prefix(prefix) if prefix else None
+        # A dangling "-" or operator keyword used as a word
+        return None
+
+
+def normalize_prefix(text):
+    """
+    Lowercase a prefix and drop everything but letters, so "E-Mail" becomes
+    "email". Prefixes skip the word normalization: "in" or "a" are stop
+    words on their own, but "in*" should still find "index".
+    """
+    return "".join(character for character in text.lower() if character.isalpha())
+
+
+def query_terms(node):
+    """
+    List the words a query tree can match on, skipping excluded sub-queries.
+
+    Args:
+        node: Root of a query tree from QueryParser.parse
+
+    Returns:
+        list: Words in query order, without duplicates
+    """
+    if node is None or isinstance(node, Not):
+        return []
+    if isinstance(node, Term):
+        return [node.word]
+    if isinstance(node, Phrase):
+        return list(dict.fromkeys(node.words))
+
+    words = []
+    for child in node.children:
+        words.extend(query_terms(child))
+    return list(dict.fromkeys(words))
+
+
+def is_plain_query(node):
+    """Whether a query tree is just terms OR'ed together, as in a ranked query."""
+    if isinstance(node, Term):
+        return True
+    return isinstance(node, Or) and all(isinstance(child, Term) for child in node.children)
+
+
+def expand_prefixes(node, expand):
+    """
+    Replace every Prefix in a query tree by the words it matches.
+
+    Args:
+        node: Root of a query tree from QueryParser.parse
+        expand (callable): Maps a prefix to a list of words
+
+    Returns:
+        A tree without Prefix nodes, OR'ing the words of each prefix; None
+            when nothing is left
+    """
+    if isinstance(node, Prefix):
+        return _any_word(expand(node.prefix))
+    return _map_children(node, lambda child: expand_prefixes(child, expand))
+
+
+def correct_terms(node, correct):
+    """
+    Replace the words of a query tree with their spelling corrections.
+
+    Args:
+        node: Root of a query tree from QueryParser.parse
+        correct (callable): Maps a word to the words to search instead; a
+            known word maps to itself, an unknown one to its corrections or
+            an empty list
+
+    Returns:
+        A tree OR'ing the corrections of each Term; phrases take the first
+            correction of each word
+    """
+    if isinstance(node, Term):
+        words = correct(node.word)
+        return _any_word(words) if words else node
+    if isinstance(node, Phrase):
+        return Phrase(tuple((correct(word) or [word])[0] for word in node.words))
+    return _map_children(node, lambda child: correct_terms(child, correct))
+
+
+def _any_word(words):
+    if not words:
+        return None
+    return Term(words[0]) if len(words) == 1 else Or(tuple(Term(word) for word in words))
+
+
+def _map_children(node, transform):
+    """Rebuild an And, Or or Not from transformed children; other nodes are returned as they are."""
+    if isinstance(node, Not):
+        child = transform(node.child)
+        return Not(child) if child is not None else None
+    if not isinstance(node, (And, Or)):
+        return node
+
+    children = []
+    for child in node.children:
+        child = transform(child)
+        if child is None:
+            continue
+        # Flatten OR'ed expansions, so "a comp*" stays a plain ranked query
+        if isinstance(node, Or) and isinstance(child, Or):
+            children.extend(child.children)
+        else:
+            children.append(child)
+    if not children:
+        return None
+    return children[0] if len(children) == 1 else type(node)(tuple(children))
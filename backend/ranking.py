@@ -0,0 +1,90 @@
+import numpy as np
+
+
+class BM25Scorer:
+    def __init__(self, doc_lengths, k1=1.2, b=0.75, num_docs=None, avg_doc_length=None):
+        """
+        Vectorized Okapi BM25 scorer.
+
+        A shard of a larger collection scores its documents with the
+        collection's statistics, so its scores match an unsharded index.
+
+        Args:
+            doc_lengths (np.ndarray): Token count of every document, indexed by doc_id
+            k1 (float): Term frequency saturation
+            b (float): Strength of document length normalization
+            num_docs (int, optional): Collection size for the IDF; defaults
+                to len(doc_lengths)
+            avg_doc_length (float, optional): Collection average document
+                length; defaults to the mean of doc_lengths
+        """
+        self.k1 = k1
+        self.b = b
+        self.num_docs = len(doc_lengths) if num_docs is None else num_docs
+
+        doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        if avg_doc_length is None:
+            avg_doc_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        if avg_doc_length == 0:
+            avg_doc_length = 1.0
+
+        # Per-document part of the denominator, computed once for all queries
+        self._length_norms = (k1 * (1 - b + b * doc_lengths / avg_doc_length)).astype(np.float32)
+
+    def idf(self, document_frequency):
+        return np.log1p((self.num_docs - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def term_scores(self, doc_ids, term_frequencies, document_frequency):
+        """
+        Score postings of a single term.
+
+        Args:
+            doc_ids (np.ndarray): Doc IDs containing the term
+            term_frequencies (np.ndarray): Occurrences of the term in each doc
+            document_frequency (int): Length of the term's full posting list,
+                which may be longer than doc_ids when scoring a slice
+
+        Returns:
+            np.ndarray: BM25 contribution of the term for each doc in doc_ids
+        """
+        tfs = np.asarray(term_frequencies, dtype=np.float32)
+        weights = tfs * (self.k1 + 1) / (tfs + self._length_norms[doc_ids])
+        return (self.idf(document_frequency) * weights).astype(np.float32)
+
+    def accumulate(self, scores, doc_ids, term_frequencies, document_frequency=None):
+        """
+        Add the contribution of a single term to a score accumulator.
+
+        Args:
+            scores (np.ndarray): Accumulator indexed by doc_id
+            doc_ids (np.ndarray): Doc IDs containing the term
+            term_frequencies (np.ndarray): Occurrences of the term in each doc
+            document_frequency (int, optional): Collection document frequency
+                of the term; defaults to len(doc_ids)
+        """
+        if len(doc_ids) == 0:
+            return
+        if document_frequency is None:
+            document_frequency = len(doc_ids)
+        # Doc IDs are unique within a posting list, so fancy-indexed += is safe
+        scores[doc_ids] += self.term_scores(doc_ids, term_frequencies, document_frequency)
+
+    def new_accumulator(self):
+        return np.zeros(len(self._length_norms), dtype=np.float32)
+
+
+def select_top(doc_ids, scores, max_results):
+    """
+    Return the best max_results of doc_ids.
+
+    Highest score comes first and ties are broken by ascending doc_id, the
+    same order MaxScoreEvaluator.top_k produces.
+    """
+    if max_results <= 0:
+        return doc_ids[:0]
+    if len(doc_ids) > max_results:
+        # Keep every document tied with the cut-off score, so the tie-break decides
+        threshold = np.partition(scores, -max_results)[-max_results]
+        keep = scores >= threshold
+        doc_ids, scores = doc_ids[keep], scores[keep]
+    return doc_ids[np.lexsort((doc_ids, -scores))][:max_results]
@@ -1,71 +1,689 @@
-import pandas as pd
+import numpy as np
 import os
 import re
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-import nltk
+import threading
+from collections import ChainMap
+from functools import lru_cache, partial
+from binary_index import MANIFEST_FILE
+from ranking import BM25Scorer, select_top
+from top_k import MaxScoreEvaluator, TermCursor, PriorCursor, BOUND_SLACK
+from query_parser import (QueryParser, query_terms, is_plain_query, expand_prefixes, correct_terms,
+                          normalize_prefix)
+from lexicon_trie import LexiconTrie, default_trie_folder
+from spelling import SpellingIndex, default_spelling_folder
+from boolean_query import BooleanQueryEvaluator, locate
+from segments import SegmentedIndex, SegmentedDocStore, read_lexicon_additions, deltas_folder, SEGMENTS_FILE
+from cache import QueryResultCache, PostingsCache
+from sharding import ShardCoordinator, SHARDS_FILE
+from lexicon_table import LexiconHashTable
+from snapshot import read_current_snapshot, read_stopwords, CURRENT_FILE
+from metrics import QueryMetrics, current_trace
+from tiered_index import read_priors, open_first_tier, PRIOR_WEIGHT
+
+# Most frequent words a "word*" query is expanded to
+MAX_PREFIX_TERMS = 64
+# Known words an unknown query word is searched as
+MAX_CORRECTIONS = 3
+# Postings scored together by one slice of a batch; a query with more gets a slice of its own
+MAX_BATCH_POSTINGS = 1 << 22
+
+# The words nltk's word_tokenize splits in two once punctuation is removed; splitting
+# them here tokenizes queries the same way without importing nltk
+CONTRACTIONS = [re.compile(pattern) for pattern in (
+    r"(?i)\b(can)(not)\b", r"(?i)\b(gim)(me)\b", r"(?i)\b(gon)(na)\b",
+    r"(?i)\b(got)(ta)\b", r"(?i)\b(lem)(me)\b", r"(?i)\b(wan)(na)(?=\s)",
+)]
+
+class IndexGeneration:
+    def __init__(self, number, index_folder, doc_store_folder, base_lexicon, k1, b,
+                 prior_weight=PRIOR_WEIGHT, first_tier=True):
+        """
+        One consistent, read-only view of the lexicon, index and doc store.
+
+        A query reads everything from the generation it started with, so a
+        reload can open the next generation while queries keep running and
+        then swap it in with a single assignment.
+
+        Args:
+            number (int): Increases with every reload; part of cache keys
+            index_folder (str): Base binary index folder
+            doc_store_folder (str): Base doc store folder
+            base_lexicon (dict): word -> word_id of the lexicon file
+            k1 (float): BM25 k1
+            b (float): BM25 b
+            prior_weight (float): Weight of the static document priors added
+                to BM25 scores, if the index has priors
+            first_tier (bool): Answer from the index's first tier when it has one
+        """
+        self.number = number
+        self.coordinator = None
+        # Words added by incremental indexing are looked up after the base lexicon
+        self.lexicon = ChainMap(base_lexicon, read_lexicon_additions(index_folder))
+        self.index = SegmentedIndex(index_folder)
+        self.doc_store = SegmentedDocStore(doc_store_folder, self.index)
+        self.boolean_evaluator = BooleanQueryEvaluator(self.index, self.lexicon)
+        self.scorer = BM25Scorer(self.index.doc_lengths, k1=k1, b=b, **self.index.collection)
+
+        # The stored upper bounds only hold for the BM25 parameters the index was built with,
+        # and only while no deltas or unmerged deletions change the posting lists
+        if self.index.exact_bounds and self.index.manifest['bm25'] == {'k1': k1, 'b': b}:
+            self.evaluator = MaxScoreEvaluator(self.scorer)
+        else:
+            self.evaluator = None
+
+        # Static priors written by TieredIndexBuilder, already weighted
+        self.prior_scores = self.prior_cursor = None
+        priors = read_priors(self.index) if prior_weight else None
+        if priors is not None:
+            self.prior_scores = prior_weight * priors
+            self.prior_cursor = PriorCursor(self.prior_scores)
+
+        # The first tier and its cut-offs describe the base index alone, so like the stored
+        # bounds they only hold while no deltas or unmerged deletions change the posting lists
+        self.first_tier = self.first_tier_cutoffs = None
+        tier = open_first_tier(self.index) if first_tier and self.evaluator is not None else None
+        # A cut-off includes the prior at the weight the tier was built with, so it only
+        # bounds the dropped postings for priors weighted no higher than that
+        if tier is not None and (self.prior_scores is None
+                                 or prior_weight <= self.index.manifest["first_tier"]["prior_weight"]):
+            self.first_tier, self.first_tier_cutoffs = tier
+
+
+class ShardedGeneration:
+    def __init__(self, number, shards_folder, base_lexicon, k1, b, timeout, addresses=None, authkey=None,
+                 prior_weight=PRIOR_WEIGHT):
+        """
+        A generation whose index is split into shards searched by other processes.
+
+        Queries are ranked by the coordinator; results are read from the
+        shard doc stores, which the coordinator maps locally.
+
+        Args:
+            number (int): Increases with every reload; part of cache keys
+            shards_folder (str): Folder written by ShardedIndexBuilder
+            base_lexicon (dict): word -> word_id of the lexicon file
+            k1 (float): BM25 k1
+            b (float): BM25 b
+            timeout (float): Seconds to wait for the shards of a query
+            addresses (list, optional): Shard server addresses; see ShardCoordinator
+            authkey (bytes, optional): Shared secret of the shard servers
+            prior_weight (float): Weight of the shards' priors; see ShardCoordinator
+        """
+        self.number = number
+        self.lexicon = base_lexicon
+        self.coordinator = ShardCoordinator(shards_folder, k1=k1, b=b, timeout=timeout,
+                                            addresses=addresses, authkey=authkey, prior_weight=prior_weight)
+        self.doc_store = self.coordinator
+        # Postings live in the shard processes
+        self.index = self.scorer = self.evaluator = self.boolean_evaluator = None
 
-# Ensure NLTK resources are available
-nltk.download('stopwords', quiet=True)
 
 class SearchEngine:
-    def __init__(self, lexicon_path, barrels_folder, cleaned_dataset_path):
-        if not os.path.exists(barrels_folder):
-            raise FileNotFoundError(f"The barrels folder {barrels_folder} does not exist.")
-        
-        self.lexicon = pd.read_csv(lexicon_path).set_index('word')['word_id'].to_dict()
-        self.cleaned_dataset = pd.read_csv(cleaned_dataset_path).reset_index(drop=True)
-        self.barrels_folder = barrels_folder
-
-    def _load_barrel(self, word_id):
-        barrel_index = word_id % len(os.listdir(self.barrels_folder))
-        barrel_filename = f'inverted_index_barrel_{barrel_index}.csv'
-        barrel_path = os.path.join(self.barrels_folder, barrel_filename)
-
-        if not os.path.exists(barrel_path):
-            return {}
-
-        barrel_df = pd.read_csv(barrel_path)
-        return barrel_df.set_index('word_id')['doc_ids'].apply(
-            lambda x: list(map(int, re.split(r'[ ,]+', x))) if isinstance(x, str) else []
-        ).to_dict()
+    def __init__(self, lexicon_path=None, index_folder=None, doc_store_folder=None, k1=1.2, b=0.75,
+                 cache_size=1024, cache_ttl=300, postings_cache_bytes=64 * 1024 * 1024,
+                 warm_terms=None, reload_in_background=False,
+                 shard_timeout=2.0, shard_addresses=None, shard_authkey=None, trie_folder=None,
+                 typo_tolerance=True, spelling_folder=None, snapshot_folder=None,
+                 metrics_folder=None, slow_query_seconds=None, prior_weight=PRIOR_WEIGHT, first_tier=True):
+        # A snapshots folder written by IndexSnapshotBuilder replaces the lexicon,
+        # index and doc store paths, and a new snapshot is picked up like a rebuild
+        self.snapshot_folder = snapshot_folder
+        if snapshot_folder is None and not os.path.exists(index_folder):
+            raise FileNotFoundError(f"The index folder {index_folder} does not exist.")
+
+        # A folder written by ShardedIndexBuilder is searched through a shard coordinator;
+        # each shard has its own doc store, so doc_store_folder is not used then
+        self.sharded = snapshot_folder is None and os.path.exists(os.path.join(index_folder, SHARDS_FILE))
+        self.shard_timeout = shard_timeout
+        self.shard_addresses = shard_addresses
+        self.shard_authkey = shard_authkey
+
+        self.lexicon_path = lexicon_path
+        # Prefix index written by LexiconGenerator, for suggest() and "word*" queries
+        self.trie_folder = trie_folder
+        if trie_folder is None and lexicon_path is not None:
+            self.trie_folder = default_trie_folder(lexicon_path)
+        # Spelling index written by LexiconGenerator; unknown query words are searched as
+        # the closest known words unless typo_tolerance is off
+        self.typo_tolerance = typo_tolerance
+        self.spelling_folder = spelling_folder
+        if spelling_folder is None and lexicon_path is not None:
+            self.spelling_folder = default_spelling_folder(lexicon_path)
+        self.index_folder = index_folder
+        self.doc_store_folder = doc_store_folder
+        self.k1 = k1
+        self.b = b
+        # Static document priors and the first tier of an index processed by TieredIndexBuilder;
+        # a prior_weight of 0 ranks by BM25 alone
+        self.prior_weight = prior_weight
+        self.first_tier = first_tier
+        # Open a rebuilt index on a background thread and keep answering from the
+        # current one meanwhile, instead of reloading inside the query that noticed it
+        self.reload_in_background = reload_in_background
+
+        # Snapshots carry their own stop words
+        self.stop_words = self._read_stop_words() if snapshot_folder is None else None
+        self.parser = QueryParser(self._preprocess_query)
+        self.result_cache = QueryResultCache(max_entries=cache_size, ttl_seconds=cache_ttl)
+        self.postings_cache = PostingsCache(max_bytes=postings_cache_bytes)
+        # Per-stage latency and work counters of every request; see QueryMetrics
+        self.metrics = QueryMetrics(metrics_folder, slow_query_seconds)
+
+        self._reload_lock = threading.Lock()
+        self._reload_thread = None
+        self._generation = None
+        self._open_index()
+
+        if warm_terms:
+            self.warm_postings_cache(warm_terms)
+
+    # The current generation's components, for callers outside the query path
+    @property
+    def lexicon(self):
+        return self._generation.lexicon
+
+    @property
+    def index(self):
+        return self._generation.index
+
+    @property
+    def doc_store(self):
+        return self._generation.doc_store
+
+    @property
+    def scorer(self):
+        return self._generation.scorer
+
+    @property
+    def evaluator(self):
+        return self._generation.evaluator
+
+    @property
+    def boolean_evaluator(self):
+        return self._generation.boolean_evaluator
+
+    def _open_snapshot(self):
+        folder, manifest = read_current_snapshot(self.snapshot_folder)
+        components = manifest["components"]
+        # Components missing from the snapshot get paths that don't exist
+        path = lambda component: os.path.join(folder, components.get(component, component))
+        self.lexicon_path = path("lexicon")
+        self.index_folder = path("index")
+        self.doc_store_folder = path("doc_store")
+        self.trie_folder = path("trie")
+        self.spelling_folder = path("spelling")
+        self.stop_words = read_stopwords(path("stopwords"))
+        self.sharded = os.path.exists(os.path.join(self.index_folder, SHARDS_FILE))
+        print(f"Opened index snapshot {manifest['version']} at {folder}")
+
+    def _read_lexicon(self):
+        if os.path.isdir(self.lexicon_path):
+            return LexiconHashTable(self.lexicon_path)
+        # pandas is only needed for lexicon CSVs, so serving from a snapshot never imports it
+        import pandas as pd
+        return pd.read_csv(self.lexicon_path).set_index('word')['word_id'].to_dict()
+
+    def _read_stop_words(self):
+        import nltk
+        from nltk.corpus import stopwords
+        nltk.download('stopwords', quiet=True)
+        return set(stopwords.words('english'))
+
+    def _open_index(self):
+        self._index_version = self._manifest_mtime()
+        if self.snapshot_folder is not None:
+            self._open_snapshot()
+        self._base_lexicon = self._read_lexicon()
+        if os.path.exists(self.trie_folder):
+            self._trie = LexiconTrie(self.trie_folder)
+        else:
+            print(f"No lexicon trie at {self.trie_folder}; prefix queries match whole words only")
+            self._trie = None
+
+        self._corrections = None
+        if self.typo_tolerance and os.path.exists(self.spelling_folder):
+            spelling = SpellingIndex(self.spelling_folder)
+            # Repeated typos are corrected once
+            self._corrections = lru_cache(maxsize=4096)(partial(spelling.corrections, max_results=MAX_CORRECTIONS))
+        elif self.typo_tolerance:
+            print(f"No spelling index at {self.spelling_folder}; typo tolerance is off")
+        self._open_segments()
+
+    def _open_segments(self):
+        """
+        Open the base index together with its delta segments as a new generation.
+        """
+        self._segments_version = self._segments_mtime()
+        previous = self._generation
+        number = previous.number + 1 if previous is not None else 0
+        if self.sharded:
+            self._generation = ShardedGeneration(number, self.index_folder, self._base_lexicon, self.k1, self.b,
+                                                 self.shard_timeout, self.shard_addresses, self.shard_authkey,
+                                                 self.prior_weight)
+        else:
+            self._generation = IndexGeneration(number, self.index_folder, self.doc_store_folder,
+                                               self._base_lexicon, self.k1, self.b,
+                                               self.prior_weight, self.first_tier)
+        # Entries of older generations can no longer be hit; free their space
+        self.result_cache.clear()
+        self.postings_cache.clear()
+        if previous is not None and previous.coordinator is not None:
+            previous.coordinator.close()
+
+    def _manifest_mtime(self):
+        if self.snapshot_folder is not None:
+            return os.stat(os.path.join(self.snapshot_folder, CURRENT_FILE)).st_mtime_ns
+        manifest_file = SHARDS_FILE if self.sharded else MANIFEST_FILE
+        return os.stat(os.path.join(self.index_folder, manifest_file)).st_mtime_ns
+
+    def _segments_mtime(self):
+        try:
+            return os.stat(os.path.join(deltas_folder(self.index_folder), SEGMENTS_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def reload(self):
+        """
+        Reopen the lexicon, index and doc store, and drop cached results.
+        """
+        with self._reload_lock:
+            self._open_index()
+
+    def _reload_changed(self):
+        with self._reload_lock:
+            # The manifest is written last, so a new one means a finished rebuild
+            try:
+                version = self._manifest_mtime()
+            except FileNotFoundError:
+                return
+            if version != self._index_version:
+                self._open_index()
+            elif self._segments_mtime() != self._segments_version:
+                # Added or deleted documents only need the segments reopened
+                self._open_segments()
+
+    def _reload_if_rebuilt(self):
+        try:
+            changed = (self._manifest_mtime() != self._index_version
+                       or self._segments_mtime() != self._segments_version)
+        except FileNotFoundError:
+            return
+        if not changed:
+            return
+
+        if not self.reload_in_background:
+            self._reload_changed()
+            return
+        with self._reload_lock:
+            if self._reload_thread is None or not self._reload_thread.is_alive():
+                self._reload_thread = threading.Thread(target=self._reload_changed, daemon=True)
+                self._reload_thread.start()
+
+    def _load_postings(self, generation, word_id, first_tier=False):
+        trace = current_trace()
+        with trace.stage("postings"):
+            index = generation.first_tier if first_tier else generation.index
+            if not self.postings_cache.max_bytes:
+                postings = index.postings(word_id), index.term_frequencies(word_id)
+                trace.count("postings_bytes", postings[0].nbytes + postings[1].nbytes)
+                return postings
+
+            cache_key = (generation.number, word_id, "first_tier") if first_tier else (generation.number, word_id)
+            cached = self.postings_cache.get(cache_key)
+            if cached is not None:
+                trace.count("postings_cache_hits")
+                return cached
+
+            postings = index.postings(word_id), index.term_frequencies(word_id)
+            trace.count("postings_cache_misses")
+            trace.count("postings_bytes", postings[0].nbytes + postings[1].nbytes)
+            # Lists larger than the whole budget are never cached, so they stay views of the map
+            if postings[0].nbytes + postings[1].nbytes > self.postings_cache.max_bytes:
+                return postings
+
+            # Copy out of the map so hot lists stay resident in process memory
+            postings = np.array(postings[0]), np.array(postings[1])
+            self.postings_cache.put(cache_key, postings)
+            return postings
+
+    def warm_postings_cache(self, words):
+        """
+        Load the posting lists of the given words into the postings cache.
+
+        Args:
+            words (iterable): Terms expected to be queried often, most important first
+        """
+        generation = self._generation
+        if generation.index is None:
+            return
+        # The cache evicts the least recently used lists first, so the most important go in last
+        for word in reversed(list(words)):
+            if word in generation.lexicon:
+                self._load_postings(generation, generation.lexicon[word])
+
+    def _term_cursor(self, generation, word_id):
+        doc_ids, term_frequencies = self._load_postings(generation, word_id)
+        block_last_docs, block_max_scores = generation.index.blocks(word_id)
+        return TermCursor(doc_ids, term_frequencies, generation.index.upper_bound(word_id),
+                          block_last_docs, block_max_scores, generation.index.block_size)
 
     def _preprocess_query(self, query):
-        stop_words = set(stopwords.words('english'))
-        query = re.sub(r'[^\w\s]', '', query)
-        tokens = word_tokenize(query.lower())
-        return [token for token in tokens if token not in stop_words and token.isalpha()]
+        query = " " + re.sub(r'[^\w\s]', '', query.lower()) + " "
+        for contraction in CONTRACTIONS:
+            query = contraction.sub(r" \1 \2 ", query)
+        tokens = query.split()
+        return [token for token in tokens if token not in self.stop_words and token.isalpha()]
 
-    def _page_rank(self, word_results):
-        return sorted(word_results.items(), key=lambda x: x[1], reverse=True)
+    def _select_top(self, doc_ids, scores, max_results):
+        return select_top(doc_ids, scores, max_results)
 
-    def search(self, query, max_results=25):
-        tokens = self._preprocess_query(query)
-        if not tokens:
+    def _page_rank(self, scores, max_results, prior_scores=None):
+        candidates = np.flatnonzero(scores)
+        current_trace().count("candidates_scored", len(candidates))
+        candidate_scores = scores[candidates]
+        if prior_scores is not None:
+            candidate_scores = candidate_scores + prior_scores[candidates]
+        return self._select_top(candidates, candidate_scores, max_results)
+
+    def _rank_first_tier(self, generation, word_ids, max_results):
+        """
+        Rank a plain query over the first tier, or return None when the full
+        posting lists could rank it differently.
+
+        Every document in the first tier lists of the query terms (the full
+        lists of terms too short to be tiered) is scored exactly, against
+        the full index. Any other document only scores through postings the
+        tier dropped, so it gets at most the summed cut-off impacts of the
+        tiered terms; once the k-th exact score beats that sum, no such
+        document can reach the top k and the answer is the full ranking.
+        """
+        tier, index = generation.first_tier, generation.index
+        tiered = [word_id for word_id in word_ids if tier.document_frequency(word_id)]
+        candidates = np.unique(np.concatenate([
+            self._load_postings(generation, word_id, first_tier=word_id in tiered)[0] for word_id in word_ids
+        ]))
+        current_trace().count("candidates_scored", len(candidates))
+        scores = np.zeros(len(candidates), dtype=np.float64)
+        for word_id in word_ids:
+            # Only the blocks holding candidates are searched (boolean_query.locate)
+            found, positions = locate(candidates, index.posting_blocks(word_id), index.blocks(word_id)[0],
+                                      index.block_size)
+            if found.any():
+                scores[found] += generation.scorer.term_scores(
+                    candidates[found], index.term_frequencies(word_id)[positions[found]],
+                    index.document_frequency(word_id)
+                )
+        if generation.prior_scores is not None:
+            scores += generation.prior_scores[candidates]
+
+        dropped_bound = sum(float(generation.first_tier_cutoffs[word_id]) for word_id in tiered) * BOUND_SLACK
+        if len(candidates) < max_results or np.partition(scores, -max_results)[-max_results] <= dropped_bound:
+            return None
+        return self._select_top(candidates, scores, max_results).tolist()
+
+    def _rank(self, generation, word_ids, max_results):
+        if generation.evaluator is not None:
+            tier = generation.first_tier
+            if tier is not None and max_results > 0 and any(tier.document_frequency(word_id) for word_id in word_ids):
+                top = self._rank_first_tier(generation, word_ids, max_results)
+                if top is not None:
+                    current_trace().count("first_tier_answers")
+                    return top
+                current_trace().count("first_tier_fallthroughs")
+
+            cursors = [self._term_cursor(generation, word_id) for word_id in word_ids]
+            return [doc_id for doc_id, _ in generation.evaluator.top_k(cursors, max_results, generation.prior_cursor)]
+
+        # Exhaustive scoring when the index bounds don't match our k1/b
+        scores = generation.scorer.new_accumulator()
+        for word_id in word_ids:
+            doc_ids, term_frequencies = self._load_postings(generation, word_id)
+            generation.scorer.accumulate(scores, doc_ids, term_frequencies)
+        return self._page_rank(scores, max_results, generation.prior_scores).tolist()
+
+    def _rank_matches(self, generation, doc_ids, word_ids, max_results):
+        """Rank the documents matched by a boolean query with BM25 over its terms."""
+        current_trace().count("candidates_scored", len(doc_ids))
+        scores = np.zeros(len(doc_ids), dtype=np.float64)
+        for word_id in word_ids:
+            postings, term_frequencies = self._load_postings(generation, word_id)
+            found, positions = locate(doc_ids, postings)
+            if found.any():
+                scores[found] += generation.scorer.term_scores(
+                    doc_ids[found], term_frequencies[positions[found]], len(postings)
+                )
+        if generation.prior_scores is not None:
+            scores += generation.prior_scores[doc_ids]
+
+        order = np.lexsort((doc_ids, -scores))[:max_results]
+        return doc_ids[order].tolist()
+
+    def _expand_prefix(self, prefix):
+        if self._trie is None:
+            return [prefix]
+        return [word for word, _, _ in self._trie.complete(prefix, MAX_PREFIX_TERMS)]
+
+    def _parse(self, generation, query):
+        # "word*" becomes the most frequent words with that prefix
+        parsed_query = expand_prefixes(self.parser.parse(query), self._expand_prefix)
+        corrections = self._corrections
+        if corrections is not None:
+            parsed_query = correct_terms(
+                parsed_query, lambda word: [word] if word in generation.lexicon else corrections(word)
+            )
+        return parsed_query
+
+    def _ranked_doc_ids(self, generation, query, max_results):
+        trace = current_trace()
+        with trace.stage("parse"):
+            parsed_query = self._parse(generation, query)
+        if parsed_query is None:
+            return ()
+
+        # Keys are built from normalized tokens, so equivalent queries share an entry;
+        # a plain ranked query ignores token order and repeats
+        plain_query = is_plain_query(parsed_query)
+        words = query_terms(parsed_query)
+        cache_key = (generation.number, frozenset(words) if plain_query else parsed_query, max_results)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            trace.count("result_cache_hits")
+            return cached
+        trace.count("result_cache_misses")
+
+        if generation.coordinator is not None:
+            with trace.stage("shards"):
+                doc_ids, scores, complete = generation.coordinator.rank(parsed_query, generation.lexicon, max_results)
+                trace.count("candidates_scored", len(doc_ids))
+                sorted_doc_ids = tuple(self._select_top(doc_ids, scores, max_results).tolist())
+            # Results missing a timed-out shard are served but not cached
+            if complete:
+                self.result_cache.put(cache_key, sorted_doc_ids)
+            return sorted_doc_ids
+
+        # Repeated query tokens count once
+        word_ids = [generation.lexicon[word] for word in words if word in generation.lexicon]
+        if plain_query:
+            with trace.stage("rank"):
+                sorted_doc_ids = self._rank(generation, word_ids, max_results)
+        else:
+            with trace.stage("boolean"):
+                matches = generation.boolean_evaluator.evaluate(parsed_query)
+            with trace.stage("rank"):
+                sorted_doc_ids = self._rank_matches(generation, matches, word_ids, max_results)
+
+        sorted_doc_ids = tuple(sorted_doc_ids)
+        self.result_cache.put(cache_key, sorted_doc_ids)
+        return sorted_doc_ids
+
+    def _rank_batch(self, generation, word_id_lists, max_results):
+        """
+        Rank several plain queries together.
+
+        The queries are split into consecutive slices of at most
+        MAX_BATCH_POSTINGS postings, counted per query, so memory stays
+        bounded however large the batch. Within a slice every distinct term
+        is fetched and scored once, the scores of all its queries are summed
+        in one pass, keyed by (query, doc_id), and each query keeps its
+        max_results best documents.
+
+        Args:
+            generation (IndexGeneration): Index to rank with
+            word_id_lists (list): Word IDs of each query
+            max_results (int): Results per query
+
+        Returns:
+            list: Ranked doc IDs of each query
+        """
+        ranked = []
+        slice_start, slice_postings = 0, 0
+        for query_number, word_ids in enumerate(word_id_lists):
+            postings = sum(generation.index.document_frequency(word_id) for word_id in word_ids)
+            if slice_postings + postings > MAX_BATCH_POSTINGS and query_number > slice_start:
+                ranked += self._rank_batch_slice(generation, word_id_lists[slice_start:query_number], max_results)
+                slice_start, slice_postings = query_number, 0
+            slice_postings += postings
+        if slice_start < len(word_id_lists):
+            ranked += self._rank_batch_slice(generation, word_id_lists[slice_start:], max_results)
+        return ranked
+
+    def _rank_batch_slice(self, generation, word_id_lists, max_results):
+        term_scores = {}
+        for word_id in sorted(set().union(*word_id_lists)):
+            doc_ids, term_frequencies = self._load_postings(generation, word_id)
+            term_scores[word_id] = doc_ids, generation.scorer.term_scores(doc_ids, term_frequencies, len(doc_ids))
+
+        # (query, doc_id) pairs packed into one int64 key
+        stride = max(generation.index.num_docs, 1)
+        keys, scores = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.float32)]
+        for query_number, word_ids in enumerate(word_id_lists):
+            for word_id in word_ids:
+                doc_ids, doc_scores = term_scores[word_id]
+                keys.append(doc_ids.astype(np.int64) + query_number * stride)
+                scores.append(doc_scores)
+
+        # Unique keys come out sorted, so each query's documents form one run
+        unique_keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+        current_trace().count("candidates_scored", len(unique_keys))
+        totals = np.bincount(inverse, weights=np.concatenate(scores))
+        doc_ids = unique_keys % stride
+        if generation.prior_scores is not None:
+            totals += generation.prior_scores[doc_ids]
+        bounds = np.searchsorted(unique_keys // stride, np.arange(len(word_id_lists) + 1))
+
+        return [self._select_top(doc_ids[start:end], totals[start:end], max_results).tolist()
+                for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def search_batch(self, queries, max_results=25):
+        """
+        Search many queries at once.
+
+        Plain ranked queries are scored together by _rank_batch, so a term
+        shared by several queries is only fetched and scored once; boolean
+        and phrase queries, and all queries of a sharded index, are
+        evaluated one by one.
+
+        Args:
+            queries (list): Query strings
+            max_results (int): Results per query
+
+        Returns:
+            list: Results of each query, as returned by search()
+        """
+        with self.metrics.trace(f"<batch of {len(queries)}>", kind="batch", num_queries=len(queries)) as trace:
+            generation = self._current_generation()
+            ranked = [()] * len(queries)
+            batched = []
+
+            for query_number, query in enumerate(queries):
+                with trace.stage("parse"):
+                    parsed_query = self._parse(generation, query)
+                if parsed_query is None:
+                    continue
+                if not is_plain_query(parsed_query) or generation.coordinator is not None:
+                    ranked[query_number] = self._ranked_doc_ids(generation, query, max_results)
+                    continue
+
+                words = query_terms(parsed_query)
+                cache_key = (generation.number, frozenset(words), max_results)
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    trace.count("result_cache_hits")
+                    ranked[query_number] = cached
+                    continue
+                trace.count("result_cache_misses")
+
+                word_ids = [generation.lexicon[word] for word in words if word in generation.lexicon]
+                batched.append((query_number, cache_key, word_ids))
+
+            if batched:
+                with trace.stage("rank"):
+                    batch_doc_ids = self._rank_batch(generation, [word_ids for _, _, word_ids in batched], max_results)
+                for (query_number, cache_key, _), sorted_doc_ids in zip(batched, batch_doc_ids):
+                    ranked[query_number] = tuple(sorted_doc_ids)
+                    self.result_cache.put(cache_key, ranked[query_number])
+
+            return [self._results(generation, sorted_doc_ids) for sorted_doc_ids in ranked]
+
+    def suggest(self, text, max_results=10):
+        """
+        Complete the last word of a partly typed query.
+
+        Args:
+            text (str): Query typed so far
+            max_results (int): Suggestions to return
+
+        Returns:
+            list: Completed queries, most frequent last word first
+        """
+        head, _, last = text.lower().rpartition(' ')
+        # Cleaned like the prefix of a "word*" query, so both complete the same words
+        prefix = normalize_prefix(last)
+        if self._trie is None or not prefix:
             return []
+        head = head.strip() + ' ' if head.strip() else ''
+        return [head + word for word, _, _ in self._trie.complete(prefix, max_results)]
+
+    def close(self):
+        """Stop the shard processes of a sharded index, e.g. before a worker exits."""
+        generation = self._generation
+        if generation is not None and generation.coordinator is not None:
+            generation.coordinator.close()
+
+    def _current_generation(self):
+        self._reload_if_rebuilt()
+        return self._generation
+
+    def search(self, query, max_results=25):
+        with self.metrics.trace(query):
+            generation = self._current_generation()
+            return self._results(generation, self._ranked_doc_ids(generation, query, max_results))
 
-        word_results = {}
-        for token in tokens:
-            if token not in self.lexicon:
-                continue
-            word_id = self.lexicon[token]
-            barrel = self._load_barrel(word_id)
-            if word_id in barrel:
-                for doc_id in barrel[word_id]:
-                    word_results[doc_id] = word_results.get(doc_id, 0) + 1
+    def search_page(self, query, page=1, per_page=10, max_results=25):
+        """
+        Return one page of results, reusing the cached ranking across pages.
 
-        sorted_doc_ids = [doc_id for doc_id, _ in self._page_rank(word_results)]
+        Returns:
+            tuple: (results on the page, total number of ranked results)
+        """
+        with self.metrics.trace(query):
+            generation = self._current_generation()
+            sorted_doc_ids = self._ranked_doc_ids(generation, query, max_results)
+            start = (page - 1) * per_page
+            results = self._results(generation, sorted_doc_ids[start:start + per_page], first_rank=start + 1)
+            return results, len(sorted_doc_ids)
 
+    def _results(self, generation, sorted_doc_ids, first_rank=1):
         results = []
-        for rank, doc_id in enumerate(sorted_doc_ids[:max_results], 1):
-            if doc_id in self.cleaned_dataset.index:
-                title = self.cleaned_dataset.loc[doc_id, 'title']
-                url = self.cleaned_dataset.loc[doc_id, 'url']
-                results.append({
-                    'rank': rank,
-                    'doc_id': doc_id,
-                    'title': title.capitalize(),
-                    'url': url
-                })
+        with current_trace().stage("documents"):
+            for rank, doc_id in enumerate(sorted_doc_ids, first_rank):
+                document = generation.doc_store.get(doc_id)
+                if document is not None:
+                    results.append({
+                        'rank': rank,
+                        'doc_id': doc_id,
+                        'title': document['title'].capitalize(),
+                        'url': document['url']
+                    })
 
         return results
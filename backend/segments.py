@@ -0,0 +1,264 @@
+import csv
+import json
+import os
+from functools import lru_cache
+import numpy as np
+from binary_index import BinaryIndex
+from doc_store import DocStore
+
+# Combined posting lists of recently queried terms kept per SegmentedIndex
+COMBINED_CACHE_SIZE = 64
+
+# Delta segments live in a folder inside the base binary index
+DELTAS_FOLDER = "deltas"
+SEGMENTS_FILE = "segments.json"
+TOMBSTONES_FILE = "tombstones.bin"
+LEXICON_ADDITIONS_FILE = "lexicon_additions.csv"
+DELTA_INDEX_FOLDER = "index"
+DELTA_DOC_STORE_FOLDER = "doc_store"
+
+
+def deltas_folder(index_folder):
+    return os.path.join(index_folder, DELTAS_FOLDER)
+
+
+def read_segments_state(index_folder):
+    """
+    Read the segments file of an index folder.
+
+    Returns:
+        dict: The state written by IncrementalIndexer, or None when no
+            documents were ever added or deleted incrementally
+    """
+    path = os.path.join(deltas_folder(index_folder), SEGMENTS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def read_tombstones(index_folder, num_docs):
+    """
+    Read the tombstone bitmap of deleted doc IDs.
+
+    Args:
+        index_folder (str): Base binary index folder
+        num_docs (int): Length of the returned mask
+
+    Returns:
+        np.ndarray: Boolean mask, True for deleted doc IDs
+    """
+    path = os.path.join(deltas_folder(index_folder), TOMBSTONES_FILE)
+    deleted = np.zeros(num_docs, dtype=bool)
+    if os.path.exists(path):
+        bits = np.unpackbits(np.fromfile(path, dtype=np.uint8))[:num_docs].astype(bool)
+        deleted[:len(bits)] = bits
+    return deleted
+
+
+def read_lexicon_additions(index_folder):
+    """
+    Read the words added to the lexicon by incremental indexing.
+
+    Returns:
+        dict: word -> word_id, empty when nothing was added
+    """
+    path = os.path.join(deltas_folder(index_folder), LEXICON_ADDITIONS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline='', encoding='utf-8') as f:
+        return {row['word']: int(row['word_id']) for row in csv.DictReader(f)}
+
+
+class SegmentedIndex:
+    def __init__(self, index_folder, state=None, deleted=None):
+        """
+        Read a base binary index and its delta segments as one index.
+
+        Delta segments are small binary indexes with local doc IDs starting
+        at 0; their postings are shifted by the segment's first global doc
+        ID and appended after the base postings, so every posting list stays
+        sorted. Deleted documents are dropped from the lists using the
+        tombstone bitmap.
+
+        The stored upper bounds and block scores are only valid for the base
+        index on its own, so exact_bounds tells callers whether top-k
+        pruning can be used; otherwise postings have to be scored exhaustively
+        until the segments are merged.
+
+        Args:
+            index_folder (str): Base binary index folder
+            state (dict, optional): Segments state to open instead of the one
+                on disk, e.g. a snapshot taken by a merge
+            deleted (np.ndarray, optional): Tombstone mask to use with state
+        """
+        self.index_folder = index_folder
+        self.base = BinaryIndex(index_folder)
+        self.manifest = self.base.manifest
+        self.block_size = self.base.block_size
+
+        if state is None:
+            state = read_segments_state(index_folder)
+
+        # Deltas below the base's doc count were already merged into it
+        self.deltas = []
+        doc_length_parts = [self.base.doc_lengths]
+        num_docs = self.base.num_docs
+        for delta in (state or {}).get("deltas", []):
+            if delta["doc_id_start"] < self.base.num_docs:
+                continue
+            delta_folder = os.path.join(deltas_folder(index_folder), delta["name"])
+            index = BinaryIndex(os.path.join(delta_folder, DELTA_INDEX_FOLDER))
+            doc_length_parts.append(np.zeros(delta["doc_id_start"] - num_docs, dtype=self.base.doc_lengths.dtype))
+            doc_length_parts.append(index.doc_lengths)
+            num_docs = delta["doc_id_start"] + index.num_docs
+            self.deltas.append((delta["doc_id_start"], delta_folder, index))
+
+        self.doc_lengths = np.concatenate(doc_length_parts) if self.deltas else self.base.doc_lengths
+        self.num_docs = len(self.doc_lengths)
+        self.positional = self.base.positional and all(index.positional for _, _, index in self.deltas)
+
+        if state is not None and deleted is None:
+            deleted = read_tombstones(index_folder, self.num_docs)
+
+        # Tombstones already applied by the last merge need no filtering
+        self._deleted = None
+        if state is not None and state.get("num_deleted", 0) > state.get("purged_deleted", 0):
+            self._deleted = deleted
+
+        # BM25 statistics of the live documents. Deleted documents keep an empty
+        # doc_lengths slot, also after a merge, but no longer count as documents.
+        live = np.ones(self.num_docs, dtype=bool)
+        if deleted is not None:
+            live[:min(len(deleted), self.num_docs)] = ~deleted[:self.num_docs]
+        live_lengths = self.doc_lengths[live]
+        self.collection = {
+            "num_docs": len(live_lengths),
+            # Same average BM25Scorer computes, so merged and rebuilt indexes score alike
+            "avg_doc_length": float(np.asarray(live_lengths, dtype=np.float32).mean()) if len(live_lengths) else 0.0,
+        }
+
+        self.exact_bounds = not self.deltas and self._deleted is None
+
+        # Per instance, so a reload drops the previous generation's arrays with it
+        self._combined = lru_cache(maxsize=COMBINED_CACHE_SIZE)(self._combine)
+
+    def is_deleted(self, doc_id):
+        return self._deleted is not None and doc_id < len(self._deleted) and bool(self._deleted[doc_id])
+
+    def word_ids(self):
+        """Sorted IDs of the terms with postings in any segment."""
+        segments = [self.base] + [index for _, _, index in self.deltas]
+        return np.unique(np.concatenate([segment.word_ids() for segment in segments]))
+
+    def _combine(self, word_id):
+        """
+        Concatenate a term's postings over all segments, minus deleted docs.
+
+        Returns:
+            tuple: (doc_ids, term_frequencies, index of each kept posting in
+                the unfiltered concatenation or None, first unfiltered index
+                of every segment)
+        """
+        doc_id_parts = [self.base.postings(word_id)]
+        frequency_parts = [self.base.term_frequencies(word_id)]
+        for doc_id_start, _, index in self.deltas:
+            doc_id_parts.append(index.postings(word_id) + doc_id_start)
+            frequency_parts.append(index.term_frequencies(word_id))
+
+        segment_starts = np.cumsum([0] + [len(part) for part in doc_id_parts[:-1]])
+        doc_ids = np.concatenate(doc_id_parts).astype(doc_id_parts[0].dtype)
+        term_frequencies = np.concatenate(frequency_parts)
+        if self._deleted is None:
+            return doc_ids, term_frequencies, None, segment_starts
+
+        kept = np.flatnonzero(~self._deleted[doc_ids])
+        return doc_ids[kept], term_frequencies[kept], kept, segment_starts
+
+    def postings(self, word_id):
+        if self.exact_bounds:
+            return self.base.postings(word_id)
+        return self._combined(word_id)[0]
+
+    def posting_blocks(self, word_id):
+        if self.exact_bounds:
+            return self.base.posting_blocks(word_id)
+        return self._combined(word_id)[0]
+
+    def term_frequencies(self, word_id):
+        if self.exact_bounds:
+            return self.base.term_frequencies(word_id)
+        return self._combined(word_id)[1]
+
+    def document_frequency(self, word_id):
+        if self.exact_bounds:
+            return self.base.document_frequency(word_id)
+        return len(self.postings(word_id))
+
+    def upper_bound(self, word_id):
+        return self.base.upper_bound(word_id)
+
+    def blocks(self, word_id):
+        """
+        Return the base index's skip data, or (None, None) when postings come
+        from several segments and the stored blocks no longer line up.
+        """
+        if self.exact_bounds:
+            return self.base.blocks(word_id)
+        return None, None
+
+    def positions(self, word_id, posting_indices):
+        """
+        Return token positions like BinaryIndex.positions.
+
+        Args:
+            word_id (int): Term ID from the lexicon
+            posting_indices (np.ndarray): Sorted indices into postings(word_id)
+        """
+        if self.exact_bounds:
+            return self.base.positions(word_id, posting_indices)
+        if not self.positional:
+            raise ValueError("This index was built without positions")
+
+        _, _, kept, segment_starts = self._combined(word_id)
+        posting_indices = np.asarray(posting_indices, dtype=np.int64)
+        if kept is not None:
+            posting_indices = kept[posting_indices]
+
+        segments = [self.base] + [index for _, _, index in self.deltas]
+        owners = np.searchsorted(segment_starts, posting_indices, side='right') - 1
+        position_parts, count_parts = [], []
+        for segment_number in np.unique(owners):
+            local_indices = posting_indices[owners == segment_number] - segment_starts[segment_number]
+            positions, counts = segments[segment_number].positions(word_id, local_indices)
+            position_parts.append(positions)
+            count_parts.append(counts)
+
+        if not position_parts:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64)
+        return np.concatenate(position_parts), np.concatenate(count_parts)
+
+
+class SegmentedDocStore:
+    def __init__(self, doc_store_folder, index):
+        """
+        Look up document records in the base doc store and delta doc stores.
+
+        Args:
+            doc_store_folder (str): Base doc store folder
+            index (SegmentedIndex): Index whose deltas hold the other records
+        """
+        self.base = DocStore(doc_store_folder)
+        self.index = index
+        self._deltas = [
+            (doc_id_start, DocStore(os.path.join(delta_folder, DELTA_DOC_STORE_FOLDER)))
+            for doc_id_start, delta_folder, _ in index.deltas
+        ]
+
+    def get(self, doc_id):
+        if self.index.is_deleted(doc_id):
+            return None
+        for doc_id_start, doc_store in reversed(self._deltas):
+            if doc_id >= doc_id_start:
+                return doc_store.get(doc_id - doc_id_start)
+        return self.base.get(doc_id)
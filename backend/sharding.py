@@ -0,0 +1,568 @@
+import json
+import os
+import queue
+import threading
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from multiprocessing.connection import Listener, Client
+from binary_index import BinaryIndex, BinaryIndexWriter
+from boolean_query import BooleanQueryEvaluator, locate
+from doc_store import DocStore, DocStoreWriter
+from query_parser import Term, Phrase, Not, query_terms, is_plain_query
+from ranking import BM25Scorer, select_top
+from segments import SegmentedIndex, SegmentedDocStore
+from tiered_index import read_priors, PRIORS_FILE, PRIOR_DTYPE, PRIOR_WEIGHT
+from top_k import MaxScoreEvaluator, TermCursor, PriorCursor
+
+SHARDS_FILE = "shards.json"
+DOCUMENT_FREQUENCIES_FILE = "document_frequencies.bin"
+SHARD_INDEX_FOLDER = "index"
+SHARD_DOC_STORE_FOLDER = "doc_store"
+
+DOCUMENT_FREQUENCY_DTYPE = np.int32
+
+
+def shard_folder(shards_folder, shard_number):
+    return os.path.join(shards_folder, f"shard_{shard_number}")
+
+
+def read_shards_manifest(shards_folder):
+    """
+    Read the manifest written by ShardedIndexBuilder.
+
+    Returns:
+        dict: Shards with their first global doc ID, and the collection
+            statistics every shard scores with
+    """
+    path = os.path.join(shards_folder, SHARDS_FILE)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No shards manifest found at {path}")
+    with open(path) as f:
+        return json.load(f)
+
+
+def _query_words(node):
+    """Every word of a query tree, including excluded ones."""
+    if node is None:
+        return []
+    if isinstance(node, Term):
+        return [node.word]
+    if isinstance(node, Phrase):
+        return list(node.words)
+    if isinstance(node, Not):
+        return _query_words(node.child)
+    return [word for child in node.children for word in _query_words(child)]
+
+
+class ShardedIndexBuilder:
+    def __init__(self, index_folder, doc_store_folder, output_folder):
+        """
+        Split a built index into document-partitioned shards.
+
+        Each shard covers a contiguous range of doc IDs and gets its own
+        binary index and doc store with local doc IDs starting at 0, so it
+        can be searched by a separate process or machine. Barrels split the
+        index by term, which sends all the work of a hot term to one barrel;
+        shards split it by document, so every shard does a share of every
+        query.
+
+        Shard indexes are scored with the statistics of the whole collection
+        (document count, average length and every term's document frequency),
+        which makes shard scores directly comparable and the merged ranking
+        the same as the unsharded one. Priors written by TieredIndexBuilder
+        are split with the documents; the first tier is not.
+
+        Args:
+            index_folder (str): Binary index to split, with any delta segments
+            doc_store_folder (str): Doc store of the index
+            output_folder (str): Folder to write the shards to
+        """
+        self.index_folder = index_folder
+        self.doc_store_folder = doc_store_folder
+        self.output_folder = output_folder
+
+    def create_shards(self, num_shards, codec=None):
+        """
+        Write the shards and the shards manifest.
+
+        Args:
+            num_shards (int): Number of shards
+            codec (str, optional): Postings codec of the shards; defaults to
+                the codec of the source index
+
+        Returns:
+            int: Number of documents in the collection
+        """
+        try:
+            index = SegmentedIndex(self.index_folder)
+            doc_store = SegmentedDocStore(self.doc_store_folder, index)
+            k1, b = index.manifest["bm25"]["k1"], index.manifest["bm25"]["b"]
+            if codec is None:
+                codec = index.manifest.get("codec", "raw")
+
+            num_docs = index.num_docs
+            doc_lengths = np.asarray(index.doc_lengths)
+            # Statistics of the live documents, the same the unsharded index is scored with
+            collection = index.collection
+            doc_id_starts = np.linspace(0, num_docs, num_shards + 1).astype(np.int64)
+            priors = read_priors(index)
+
+            writers = []
+            for shard_number in range(num_shards):
+                start, end = doc_id_starts[shard_number], doc_id_starts[shard_number + 1]
+                writers.append(BinaryIndexWriter(
+                    os.path.join(shard_folder(self.output_folder, shard_number), SHARD_INDEX_FOLDER),
+                    doc_lengths[start:end], k1=k1, b=b, positional=index.positional, codec=codec,
+                    num_docs=collection["num_docs"], avg_doc_length=collection["avg_doc_length"]
+                ))
+
+            max_word_id = max([index.manifest["max_word_id"]] +
+                              [delta.manifest["max_word_id"] for _, _, delta in index.deltas])
+            document_frequencies = np.zeros(max_word_id + 1, dtype=DOCUMENT_FREQUENCY_DTYPE)
+            for word_id in index.word_ids().tolist():
+                doc_ids = index.postings(word_id)
+                if len(doc_ids) == 0:
+                    continue
+                term_frequencies = index.term_frequencies(word_id)
+                positions = index.positions(word_id, np.arange(len(doc_ids)))[0] if index.positional else None
+                document_frequencies[word_id] = len(doc_ids)
+
+                # Each shard's postings are one slice of the sorted list
+                cuts = np.searchsorted(doc_ids, doc_id_starts)
+                position_cuts = np.concatenate(([0], np.cumsum(term_frequencies)))[cuts]
+                for shard_number, writer in enumerate(writers):
+                    start, end = cuts[shard_number], cuts[shard_number + 1]
+                    if start == end:
+                        continue
+                    writer.add(
+                        word_id,
+                        doc_ids[start:end] - doc_id_starts[shard_number],
+                        term_frequencies[start:end],
+                        positions[position_cuts[shard_number]:position_cuts[shard_number + 1]]
+                        if index.positional else None,
+                        document_frequency=len(doc_ids)
+                    )
+            for writer in writers:
+                writer.close()
+
+            shards = []
+            for shard_number in range(num_shards):
+                start, end = int(doc_id_starts[shard_number]), int(doc_id_starts[shard_number + 1])
+                doc_store_writer = DocStoreWriter(
+                    os.path.join(shard_folder(self.output_folder, shard_number), SHARD_DOC_STORE_FOLDER)
+                )
+                for doc_id in range(start, end):
+                    document = doc_store.get(doc_id)
+                    if document is not None:
+                        doc_store_writer.add(doc_id - start, document['title'], document['url'], document['tags'])
+                doc_store_writer.close()
+                if priors is not None:
+                    path = os.path.join(shard_folder(self.output_folder, shard_number), PRIORS_FILE)
+                    priors[start:end].tofile(path + ".tmp")
+                    os.replace(path + ".tmp", path)
+                shards.append({"name": f"shard_{shard_number}", "doc_id_start": start, "num_docs": end - start})
+                print(f"Shard {shard_number} with doc IDs {start}-{end - 1} saved")
+
+            path = os.path.join(self.output_folder, DOCUMENT_FREQUENCIES_FILE)
+            document_frequencies.tofile(path + ".tmp")
+            os.replace(path + ".tmp", path)
+
+            manifest = {
+                "shards": shards,
+                "num_docs": num_docs,
+                # BM25 statistics of the live documents; num_docs is the doc ID range
+                "collection": collection,
+                "bm25": {"k1": k1, "b": b},
+                "positional": index.positional,
+                "codec": codec,
+                "build_id": time.time_ns(),
+            }
+            if priors is not None:
+                manifest["priors"] = {"file": PRIORS_FILE, "signals": index.manifest["priors"]["signals"]}
+            # The shards manifest goes last: searchers treat a new one as a finished build
+            path = os.path.join(self.output_folder, SHARDS_FILE)
+            with open(path + ".tmp", "w") as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(path + ".tmp", path)
+
+            print(f"{num_shards} shards saved to {self.output_folder}")
+            return num_docs
+
+        except Exception as e:
+            print(f"Error creating shards: {e}")
+            raise
+
+
+class Shard:
+    def __init__(self, shards_folder, shard_number, k1=1.2, b=0.75, prior_weight=PRIOR_WEIGHT):
+        """
+        Search one shard with collection-wide BM25 statistics.
+
+        Args:
+            shards_folder (str): Folder written by ShardedIndexBuilder
+            shard_number (int): Shard to open
+            k1 (float): BM25 k1
+            b (float): BM25 b
+            prior_weight (float): Weight of the static document priors added
+                to BM25 scores, if the shards have priors
+        """
+        manifest = read_shards_manifest(shards_folder)
+        self.doc_id_start = manifest["shards"][shard_number]["doc_id_start"]
+        self.index = BinaryIndex(os.path.join(shard_folder(shards_folder, shard_number), SHARD_INDEX_FOLDER))
+        self.scorer = BM25Scorer(self.index.doc_lengths, k1=k1, b=b,
+                                 **manifest["collection"])
+
+        # Shard bounds were computed with the collection statistics and the build's k1/b
+        if self.index.manifest['bm25'] == {'k1': k1, 'b': b}:
+            self.evaluator = MaxScoreEvaluator(self.scorer)
+        else:
+            self.evaluator = None
+
+        # The shard's slice of the priors, already weighted
+        self.prior_scores = self.prior_cursor = None
+        if prior_weight and "priors" in manifest:
+            priors = np.fromfile(os.path.join(shard_folder(shards_folder, shard_number), manifest["priors"]["file"]),
+                                 dtype=PRIOR_DTYPE)
+            self.prior_scores = prior_weight * priors
+            self.prior_cursor = PriorCursor(self.prior_scores)
+
+    def rank(self, parsed_query, query_lexicon, document_frequencies, max_results):
+        """
+        Rank the shard's documents for a query.
+
+        Args:
+            parsed_query: Query tree from QueryParser.parse
+            query_lexicon (dict): word -> word_id for the words of the query
+            document_frequencies (dict): word_id -> collection document frequency
+            max_results (int): Results to return
+
+        Returns:
+            tuple: (global doc IDs, scores) of the shard's best documents,
+                highest score first
+        """
+        word_ids = [query_lexicon[word] for word in query_terms(parsed_query) if word in query_lexicon]
+
+        if is_plain_query(parsed_query) and self.evaluator is not None:
+            cursors = []
+            for word_id in word_ids:
+                block_last_docs, block_max_scores = self.index.blocks(word_id)
+                cursors.append(TermCursor(self.index.postings(word_id), self.index.term_frequencies(word_id),
+                                          self.index.upper_bound(word_id), block_last_docs, block_max_scores,
+                                          self.index.block_size, document_frequencies[word_id]))
+            top = self.evaluator.top_k(cursors, max_results, self.prior_cursor)
+            doc_ids = np.array([doc_id for doc_id, _ in top], dtype=np.int64)
+            scores = np.array([score for _, score in top], dtype=np.float64)
+
+        elif is_plain_query(parsed_query):
+            accumulator = self.scorer.new_accumulator()
+            for word_id in word_ids:
+                self.scorer.accumulate(accumulator, self.index.postings(word_id),
+                                       self.index.term_frequencies(word_id), document_frequencies[word_id])
+            candidates = np.flatnonzero(accumulator)
+            candidate_scores = accumulator[candidates].astype(np.float64)
+            if self.prior_scores is not None:
+                candidate_scores += self.prior_scores[candidates]
+            # Candidates are sorted, so ranking their indices breaks ties by doc ID too
+            top = select_top(np.arange(len(candidates)), candidate_scores, max_results)
+            doc_ids, scores = candidates[top], candidate_scores[top]
+
+        else:
+            matches = BooleanQueryEvaluator(self.index, query_lexicon).evaluate(parsed_query)
+            scores = np.zeros(len(matches), dtype=np.float64)
+            for word_id in word_ids:
+                postings = self.index.postings(word_id)
+                found, positions = locate(matches, postings)
+                if found.any():
+                    scores[found] += self.scorer.term_scores(
+                        matches[found], self.index.term_frequencies(word_id)[positions[found]],
+                        document_frequencies[word_id]
+                    )
+            if self.prior_scores is not None:
+                scores += self.prior_scores[matches]
+            order = np.lexsort((matches, -scores))[:max_results]
+            doc_ids, scores = matches[order].astype(np.int64), scores[order]
+
+        return doc_ids + self.doc_id_start, scores
+
+
+# The shard of a worker process, opened once by its initializer
+_shard = None
+
+
+def _open_shard(shards_folder, shard_number, k1, b, prior_weight):
+    global _shard
+    _shard = Shard(shards_folder, shard_number, k1, b, prior_weight)
+
+
+def _rank_on_shard(request):
+    return _shard.rank(*request)
+
+
+class LocalShardClient:
+    def __init__(self, shards_folder, shard_number, k1=1.2, b=0.75, prior_weight=PRIOR_WEIGHT):
+        """
+        Run a shard in a dedicated worker process on this machine.
+
+        Args:
+            shards_folder (str): Folder written by ShardedIndexBuilder
+            shard_number (int): Shard the worker opens
+            k1 (float): BM25 k1
+            b (float): BM25 b
+            prior_weight (float): Weight of the shard's priors
+        """
+        self._executor = ProcessPoolExecutor(max_workers=1, initializer=_open_shard,
+                                             initargs=(shards_folder, shard_number, k1, b, prior_weight))
+
+    def submit(self, request):
+        return self._executor.submit(_rank_on_shard, request)
+
+    def close(self):
+        # Queued queries are dropped; the worker finishes its current one and exits
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _serve_connection(shard, connection):
+    with connection:
+        while True:
+            try:
+                request = connection.recv()
+            except EOFError:
+                return
+            try:
+                response = shard.rank(*request)
+            except Exception as e:
+                # The client re-raises errors, so one bad query doesn't drop the connection
+                response = e
+            connection.send(response)
+
+
+def serve_shard(shards_folder, shard_number, address, authkey, k1=1.2, b=0.75, prior_weight=PRIOR_WEIGHT):
+    """
+    Serve one shard to RemoteShardClients until the process is stopped.
+
+    Args:
+        shards_folder (str): Folder written by ShardedIndexBuilder
+        shard_number (int): Shard to serve
+        address (tuple): (host, port) to listen on
+        authkey (bytes): Shared secret clients must present
+        k1 (float): BM25 k1
+        b (float): BM25 b
+        prior_weight (float): Weight of the shard's priors
+    """
+    shard = Shard(shards_folder, shard_number, k1, b, prior_weight)
+    with Listener(address, authkey=authkey) as listener:
+        print(f"Shard {shard_number} serving on {address[0]}:{address[1]}")
+        while True:
+            connection = listener.accept()
+            threading.Thread(target=_serve_connection, args=(shard, connection), daemon=True).start()
+
+
+class RemoteShardClient:
+    def __init__(self, address, authkey, max_connections=4):
+        """
+        Query a shard served by serve_shard.
+
+        Requests and results are pickled over multiprocessing connections;
+        idle connections are kept open for the next request.
+
+        Args:
+            address (tuple): (host, port) of the shard server
+            authkey (bytes): Shared secret of the shard server
+            max_connections (int): Requests in flight at once
+        """
+        self.address = address
+        self.authkey = authkey
+        self._executor = ThreadPoolExecutor(max_workers=max_connections)
+        self._idle_connections = queue.SimpleQueue()
+
+    def _call(self, request):
+        try:
+            connection = self._idle_connections.get_nowait()
+        except queue.Empty:
+            connection = Client(self.address, authkey=self.authkey)
+
+        try:
+            connection.send(request)
+            response = connection.recv()
+        except Exception:
+            connection.close()
+            raise
+        self._idle_connections.put(connection)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def submit(self, request):
+        return self._executor.submit(self._call, request)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        while True:
+            try:
+                self._idle_connections.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class ShardCoordinator:
+    def __init__(self, shards_folder, k1=1.2, b=0.75, timeout=2.0, addresses=None, authkey=None,
+                 prior_weight=PRIOR_WEIGHT):
+        """
+        Scatter queries to all shards and gather their results.
+
+        Every query goes to all shards at once together with the collection
+        document frequencies of its terms. Shards that haven't answered
+        within the timeout are left out of that query's results, so one slow
+        shard can't hold up the rest.
+
+        Shard clients are started by the first query in each process, so a
+        coordinator opened before forking, as gunicorn's preload_app does,
+        gives every worker its own shard processes and connections.
+
+        Args:
+            shards_folder (str): Folder written by ShardedIndexBuilder
+            k1 (float): BM25 k1
+            b (float): BM25 b
+            timeout (float): Seconds to wait for the shards of a query
+            addresses (list, optional): (host, port) of a serve_shard server
+                for each shard; without it every shard runs in a local
+                worker process
+            authkey (bytes, optional): Shared secret of the shard servers
+            prior_weight (float): Weight of the shards' priors in local
+                worker processes; shard servers use the one serve_shard
+                was given
+        """
+        self.shards_folder = shards_folder
+        self.k1 = k1
+        self.b = b
+        self.prior_weight = prior_weight
+        self.addresses = addresses
+        self.authkey = authkey
+        self.manifest = read_shards_manifest(shards_folder)
+        self.timeout = timeout
+        self.timeouts = 0
+        self.failures = 0
+
+        path = os.path.join(shards_folder, DOCUMENT_FREQUENCIES_FILE)
+        self.document_frequencies = (np.fromfile(path, dtype=DOCUMENT_FREQUENCY_DTYPE)
+                                     if os.path.getsize(path) else np.zeros(0, dtype=DOCUMENT_FREQUENCY_DTYPE))
+
+        shards = self.manifest["shards"]
+        self.doc_id_starts = np.array([shard["doc_id_start"] for shard in shards], dtype=np.int64)
+        self.num_docs = self.manifest["num_docs"]
+        # Doc stores are mapped here, so results only need doc IDs from the shards
+        self.doc_stores = [DocStore(os.path.join(shard_folder(shards_folder, shard_number), SHARD_DOC_STORE_FOLDER))
+                           for shard_number in range(len(shards))]
+
+        if addresses is not None and len(addresses) != len(shards):
+            raise ValueError(f"Expected {len(shards)} shard addresses, got {len(addresses)}")
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._clients = []
+        self._closed = False
+
+    def _current_clients(self):
+        # Opened on first use in each process: gunicorn workers are forked from a
+        # master that preloads the app, and must not share its shard processes and pipes
+        with self._lock:
+            if self._pid != os.getpid() and not self._closed:
+                self._pid = os.getpid()
+                if self.addresses is not None:
+                    self._clients = [RemoteShardClient(tuple(address), self.authkey) for address in self.addresses]
+                else:
+                    self._clients = [
+                        LocalShardClient(self.shards_folder, shard_number, self.k1, self.b, self.prior_weight)
+                        for shard_number in range(len(self.doc_id_starts))
+                    ]
+            return self._clients if self._pid == os.getpid() else []
+
+    def document_frequency(self, word_id):
+        if word_id < 0 or word_id >= len(self.document_frequencies):
+            return 0
+        return int(self.document_frequencies[word_id])
+
+    def rank(self, parsed_query, lexicon, max_results):
+        """
+        Gather every shard's best documents for a query.
+
+        Args:
+            parsed_query: Query tree from QueryParser.parse
+            lexicon (dict): word -> word_id
+            max_results (int): Results per shard
+
+        Returns:
+            tuple: (global doc IDs, scores, whether every shard answered);
+                the best max_results of them are the query's results
+        """
+        query_lexicon = {word: int(lexicon[word]) for word in _query_words(parsed_query) if word in lexicon}
+        document_frequencies = {word_id: self.document_frequency(word_id) for word_id in query_lexicon.values()}
+        request = (parsed_query, query_lexicon, document_frequencies, max_results)
+
+        clients = self._current_clients()
+        futures = []
+        complete = len(clients) == len(self.doc_id_starts)
+        for client in clients:
+            try:
+                futures.append(client.submit(request))
+            except RuntimeError as e:
+                # A client shut down by a reload while this query was in flight
+                print(f"Shard unavailable: {e}")
+                complete = False
+        done, not_done = wait(futures, timeout=self.timeout)
+
+        doc_id_parts, score_parts = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.float64)]
+        for future in done:
+            if future.exception() is not None:
+                self.failures += 1
+                complete = False
+                print(f"Shard failed: {future.exception()}")
+                continue
+            doc_ids, scores = future.result()
+            doc_id_parts.append(doc_ids)
+            score_parts.append(scores)
+        if not_done:
+            self.timeouts += len(not_done)
+            complete = False
+            print(f"{len(not_done)} shard(s) timed out after {self.timeout}s")
+            for future in not_done:
+                future.cancel()
+
+        return np.concatenate(doc_id_parts), np.concatenate(score_parts), complete
+
+    def get(self, doc_id):
+        """
+        Fetch a document record by global doc ID, like DocStore.get.
+        """
+        if doc_id < 0 or doc_id >= self.num_docs:
+            return None
+        shard_number = int(np.searchsorted(self.doc_id_starts, doc_id, side='right')) - 1
+        return self.doc_stores[shard_number].get(doc_id - int(self.doc_id_starts[shard_number]))
+
+    def stats(self):
+        return {'shards': len(self.doc_id_starts), 'timeouts': self.timeouts, 'failures': self.failures}
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            clients = self._clients if self._pid == os.getpid() else []
+        for client in clients:
+            client.close()
+
+
+def main():
+    # File paths
+    index_folder = r"C:\Users\AT\CSV Dataset files\binary_index"
+    doc_store_folder = r"C:\Users\AT\CSV Dataset files\doc_store"
+    output_shards_folder = r"C:\Users\AT\CSV Dataset files\shards"
+
+    try:
+        builder = ShardedIndexBuilder(index_folder, doc_store_folder, output_shards_folder)
+        builder.create_shards(num_shards=4)
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+if __name__ == "__main__":
+    main()
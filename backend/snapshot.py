@@ -0,0 +1,254 @@
+import json
+import os
+import shutil
+import time
+from lexicon_table import LexiconHashTable
+from lexicon_trie import default_trie_folder
+from segments import DELTAS_FOLDER
+from spelling import default_spelling_folder
+
+# A snapshots folder holds numbered snapshot folders and a pointer to the current one
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "snapshot.json"
+SNAPSHOT_FORMAT = 1
+
+LEXICON_FOLDER = "lexicon"
+INDEX_FOLDER = "index"
+DOC_STORE_FOLDER = "doc_store"
+TRIE_FOLDER = "lexicon_trie"
+SPELLING_FOLDER = "spelling"
+STOPWORDS_FILE = "stopwords.txt"
+
+
+def snapshot_name(version):
+    return f"v{version:06d}"
+
+
+def read_current_snapshot(snapshots_folder):
+    """
+    Find the current snapshot of a snapshots folder.
+
+    Returns:
+        tuple: (snapshot folder, its manifest)
+    """
+    current_path = os.path.join(snapshots_folder, CURRENT_FILE)
+    if not os.path.exists(current_path):
+        raise FileNotFoundError(f"No current snapshot found at {current_path}")
+    with open(current_path) as f:
+        folder = os.path.join(snapshots_folder, f.read().strip())
+
+    with open(os.path.join(folder, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest["format"] != SNAPSHOT_FORMAT:
+        raise ValueError(f"Snapshot {folder} has format {manifest['format']}, expected {SNAPSHOT_FORMAT}")
+    return folder, manifest
+
+
+def read_stopwords(path):
+    with open(path, encoding="utf-8") as f:
+        return set(f.read().split())
+
+
+def _link_or_copy(source, destination):
+    # The indexers replace their files instead of rewriting them, so a hard link
+    # keeps this snapshot's version even after a rebuild
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def _next_version(snapshots_folder):
+    versions = [int(name[1:]) for name in os.listdir(snapshots_folder)
+                if name.startswith("v") and name[1:].isdigit()]
+    return max(versions, default=0) + 1
+
+
+def _start_snapshot(snapshots_folder):
+    """Create the staging folder of the next snapshot; returns (version, staging folder)."""
+    os.makedirs(snapshots_folder, exist_ok=True)
+    version = _next_version(snapshots_folder)
+    staging_folder = os.path.join(snapshots_folder, snapshot_name(version)) + ".tmp"
+    shutil.rmtree(staging_folder, ignore_errors=True)
+    os.makedirs(staging_folder)
+    return version, staging_folder
+
+
+def _copy_index(index_folder, doc_store_folder, staging_folder):
+    # Delta segments are appended to in place, so they are copied rather than linked
+    shutil.copytree(index_folder, os.path.join(staging_folder, INDEX_FOLDER),
+                    copy_function=_link_or_copy, ignore=shutil.ignore_patterns(DELTAS_FOLDER))
+    deltas = os.path.join(index_folder, DELTAS_FOLDER)
+    if os.path.exists(deltas):
+        shutil.copytree(deltas, os.path.join(staging_folder, INDEX_FOLDER, DELTAS_FOLDER))
+    if os.path.exists(doc_store_folder):
+        shutil.copytree(doc_store_folder, os.path.join(staging_folder, DOC_STORE_FOLDER),
+                        copy_function=_link_or_copy)
+
+
+def _finish_snapshot(snapshots_folder, staging_folder, version, manifest, keep):
+    """Write the manifest, make the snapshot current and delete all but the keep newest."""
+    name = snapshot_name(version)
+    folder = os.path.join(snapshots_folder, name)
+    with open(os.path.join(staging_folder, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(staging_folder, folder)
+
+    current_path = os.path.join(snapshots_folder, CURRENT_FILE)
+    with open(current_path + ".tmp", "w") as f:
+        f.write(name)
+    os.replace(current_path + ".tmp", current_path)
+    print(f"Snapshot {name} saved to {folder}")
+
+    for old_version in range(1, version - keep + 1):
+        old_folder = os.path.join(snapshots_folder, snapshot_name(old_version))
+        if not os.path.exists(old_folder):
+            continue
+        try:
+            shutil.rmtree(old_folder)
+        except OSError as e:
+            # Files still mapped by a running searcher can't be deleted on Windows
+            print(f"Could not remove old snapshot {old_folder}: {e}")
+    return folder
+
+
+def publish_index(snapshots_folder, index_folder, doc_store_folder, keep=3):
+    """
+    Add a snapshot that repeats the current one with a newer index and doc store.
+
+    IncrementalIndexer calls this after every change when it is given a
+    snapshots folder, so servers running from the snapshots pick up added,
+    deleted and merged documents like a new snapshot. Everything else is
+    linked from the current snapshot; words new to the lexicon are read
+    from the copied delta segments.
+
+    Args:
+        snapshots_folder (str): Folder with a current snapshot
+        index_folder (str): Binary index folder, with its delta segments
+        doc_store_folder (str): Doc store folder
+        keep (int): Snapshots to keep, including the new one
+
+    Returns:
+        str: Folder of the new snapshot
+    """
+    try:
+        current_folder, current_manifest = read_current_snapshot(snapshots_folder)
+        version, staging_folder = _start_snapshot(snapshots_folder)
+        components = current_manifest["components"]
+        for component, name in components.items():
+            if component in ("index", "doc_store"):
+                continue
+            source = os.path.join(current_folder, name)
+            if os.path.isdir(source):
+                shutil.copytree(source, os.path.join(staging_folder, name), copy_function=_link_or_copy)
+            else:
+                _link_or_copy(source, os.path.join(staging_folder, name))
+        _copy_index(index_folder, doc_store_folder, staging_folder)
+
+        manifest = dict(current_manifest, version=version, created=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        components=dict(components, index=INDEX_FOLDER, doc_store=DOC_STORE_FOLDER))
+        return _finish_snapshot(snapshots_folder, staging_folder, version, manifest, keep)
+
+    except Exception as e:
+        print(f"Error publishing index to snapshot: {e}")
+        raise
+
+
+class IndexSnapshotBuilder:
+    def __init__(self, lexicon_file, index_folder, doc_store_folder, snapshots_folder,
+                 trie_folder=None, spelling_folder=None):
+        """
+        Package a built index into a versioned snapshot that SearchEngine opens
+        without loading anything.
+
+        A snapshot folder holds the lexicon as a memory-mapped hash table, the
+        binary index, the doc store, the prefix and spelling indexes, the
+        stop words of the query path and a manifest listing them. Snapshots
+        are numbered; the CURRENT file names the one to serve and is replaced
+        last, so searchers switch to a new snapshot only once it is complete.
+
+        Args:
+            lexicon_file (str): Lexicon CSV written by LexiconGenerator
+            index_folder (str): Binary index folder, or a shards folder
+            doc_store_folder (str): Doc store folder
+            snapshots_folder (str): Folder to add the snapshot to
+            trie_folder (str, optional): Prefix index folder; defaults to the
+                one LexiconGenerator writes next to the lexicon
+            spelling_folder (str, optional): Spelling index folder; defaults to
+                the one LexiconGenerator writes next to the lexicon
+        """
+        self.lexicon_file = lexicon_file
+        self.index_folder = index_folder
+        self.doc_store_folder = doc_store_folder
+        self.snapshots_folder = snapshots_folder
+        self.trie_folder = trie_folder if trie_folder is not None else default_trie_folder(lexicon_file)
+        self.spelling_folder = spelling_folder if spelling_folder is not None else default_spelling_folder(lexicon_file)
+
+    def create_snapshot(self, keep=3):
+        """
+        Write a new snapshot and make it the current one.
+
+        Args:
+            keep (int): Snapshots to keep, including the new one; older ones
+                are deleted
+
+        Returns:
+            str: Folder of the new snapshot
+        """
+        try:
+            # The stop words are fetched here once, so searchers never need nltk
+            import nltk
+            from nltk.corpus import stopwords
+            nltk.download('stopwords', quiet=True)
+
+            version, staging_folder = _start_snapshot(self.snapshots_folder)
+            components = {"lexicon": LEXICON_FOLDER, "index": INDEX_FOLDER,
+                          "doc_store": DOC_STORE_FOLDER, "stopwords": STOPWORDS_FILE}
+
+            lexicon = LexiconHashTable.build(self.lexicon_file, os.path.join(staging_folder, LEXICON_FOLDER))
+            print(f"Lexicon hash table with {len(lexicon)} words saved")
+
+            _copy_index(self.index_folder, self.doc_store_folder, staging_folder)
+
+            # The prefix and spelling indexes are rewritten in place by LexiconGenerator
+            for component, source, destination in (("trie", self.trie_folder, TRIE_FOLDER),
+                                                   ("spelling", self.spelling_folder, SPELLING_FOLDER)):
+                if os.path.exists(source):
+                    shutil.copytree(source, os.path.join(staging_folder, destination))
+                    components[component] = destination
+                else:
+                    print(f"No {component} index at {source}; the snapshot is built without it")
+
+            with open(os.path.join(staging_folder, STOPWORDS_FILE), "w", encoding="utf-8") as f:
+                f.write("\n".join(sorted(set(stopwords.words('english')))))
+
+            manifest = {
+                "format": SNAPSHOT_FORMAT,
+                "version": version,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "components": components,
+                "num_words": len(lexicon),
+            }
+            return _finish_snapshot(self.snapshots_folder, staging_folder, version, manifest, keep)
+
+        except Exception as e:
+            print(f"Error creating snapshot: {e}")
+            raise
+
+
+def main():
+    # File paths
+    lexicon_file = r"C:\Users\AT\CSV Dataset files\lexicon.csv"
+    index_folder = r"C:\Users\AT\CSV Dataset files\binary_index"
+    doc_store_folder = r"C:\Users\AT\CSV Dataset files\doc_store"
+    snapshots_folder = r"C:\Users\AT\CSV Dataset files\snapshots"
+
+    try:
+        builder = IndexSnapshotBuilder(lexicon_file, index_folder, doc_store_folder, snapshots_folder)
+        builder.create_snapshot()
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import os
+from itertools import combinations
+import numpy as np
+
+SPELLING_FOLDER = "spelling"
+WORDS_FILE = "words.npy"
+DOCUMENT_FREQUENCIES_FILE = "document_frequencies.npy"
+DELETE_KEYS_FILE = "delete_keys.npy"
+DELETE_WORDS_FILE = "delete_words.npy"
+
+MAX_EDIT_DISTANCE = 2
+# Deletes are generated from this many leading characters only, which bounds
+# the index size; candidates are then checked against the whole word
+PREFIX_LENGTH = 7
+# Words seen in a single document are usually typos themselves
+MIN_DOCUMENT_FREQUENCY = 2
+# Tokens shorter than this are left alone
+MIN_WORD_LENGTH = 3
+
+
+def default_spelling_folder(lexicon_file):
+    """Spelling index folder LexiconGenerator writes next to a lexicon CSV."""
+    return os.path.join(os.path.dirname(os.path.abspath(lexicon_file)), SPELLING_FOLDER)
+
+
+def max_edit_distance(word):
+    """Edits allowed for a word: one for short words, MAX_EDIT_DISTANCE otherwise."""
+    return 1 if len(word) <= 4 else MAX_EDIT_DISTANCE
+
+
+def _deletes(word, distance):
+    """The word's prefix with up to distance characters removed, including no removal."""
+    prefix = word[:PREFIX_LENGTH]
+    keys = {prefix}
+    for removed in range(1, min(distance, len(prefix) - 1) + 1):
+        for positions in combinations(range(len(prefix)), removed):
+            keys.add("".join(char for i, char in enumerate(prefix) if i not in positions))
+    return keys
+
+
+def edit_distance(source, target, max_distance):
+    """
+    Optimal string alignment distance: insertions, deletions, substitutions
+    and transpositions of neighbouring characters each cost 1.
+
+    Returns:
+        int: The distance, or max_distance + 1 when it is larger
+    """
+    if abs(len(source) - len(target)) > max_distance:
+        return max_distance + 1
+
+    previous_previous = None
+    previous = list(range(len(target) + 1))
+    for i in range(1, len(source) + 1):
+        current = [i] + [0] * len(target)
+        for j in range(1, len(target) + 1):
+            cost = source[i - 1] != target[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (i > 1 and j > 1 and source[i - 1] == target[j - 2]
+                    and source[i - 2] == target[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class SpellingIndex:
+    def __init__(self, spelling_folder):
+        """
+        Open a memory-mapped symmetric delete (SymSpell) index for typo tolerance.
+
+        Every lexicon word is stored under each string obtained by deleting
+        up to MAX_EDIT_DISTANCE characters from it. A misspelled token's own
+        deletes are looked up with binary searches, which finds every word
+        within the edit distance without scanning the lexicon; the few
+        candidates are then checked with a real edit distance.
+
+        Args:
+            spelling_folder (str): Folder written by SpellingIndex.build
+        """
+        self.spelling_folder = spelling_folder
+        self.words = np.load(os.path.join(spelling_folder, WORDS_FILE), mmap_mode='r')
+        self.document_frequencies = np.load(os.path.join(spelling_folder, DOCUMENT_FREQUENCIES_FILE), mmap_mode='r')
+        self.delete_keys = np.load(os.path.join(spelling_folder, DELETE_KEYS_FILE), mmap_mode='r')
+        self.delete_words = np.load(os.path.join(spelling_folder, DELETE_WORDS_FILE), mmap_mode='r')
+
+    @staticmethod
+    def build(input_lexicon_file, spelling_folder):
+        """
+        Write the spelling index of a lexicon CSV.
+
+        Args:
+            input_lexicon_file (str): Lexicon with word and word_id columns,
+                and a document_frequency column to prefer common words by;
+                without it every word is indexed and ties go to the lower
+                word ID
+            spelling_folder (str): Folder to write the spelling index to
+
+        Returns:
+            SpellingIndex: The opened spelling index
+        """
+        # Only the offline build reads CSVs, so pandas is not imported when serving
+        import pandas as pd
+
+        os.makedirs(spelling_folder, exist_ok=True)
+        lexicon_df = pd.read_csv(input_lexicon_file, keep_default_na=False)
+        lexicon_df['word'] = lexicon_df['word'].astype(str)
+        if 'document_frequency' in lexicon_df.columns:
+            lexicon_df = lexicon_df[lexicon_df['document_frequency'] >= MIN_DOCUMENT_FREQUENCY]
+            document_frequencies = lexicon_df['document_frequency'].to_numpy(dtype=np.int32)
+        else:
+            # The lexicon assigns word IDs by frequency, so rank by word ID instead
+            document_frequencies = -lexicon_df['word_id'].to_numpy(dtype=np.int32)
+
+        words = lexicon_df['word'].tolist()
+        keys, word_numbers = [], []
+        for word_number, word in enumerate(words):
+            for key in _deletes(word, MAX_EDIT_DISTANCE):
+                keys.append(key)
+                word_numbers.append(word_number)
+
+        encoded_words = np.array([word.encode('utf-8') for word in words], dtype=bytes)
+        encoded_keys = np.array([key.encode('utf-8') for key in keys], dtype=bytes)
+        if len(encoded_keys) == 0:
+            encoded_words, encoded_keys = np.empty(0, dtype='S1'), np.empty(0, dtype='S1')
+        order = np.argsort(encoded_keys, kind='stable')
+
+        np.save(os.path.join(spelling_folder, WORDS_FILE), encoded_words)
+        np.save(os.path.join(spelling_folder, DOCUMENT_FREQUENCIES_FILE), document_frequencies)
+        np.save(os.path.join(spelling_folder, DELETE_KEYS_FILE), encoded_keys[order])
+        np.save(os.path.join(spelling_folder, DELETE_WORDS_FILE), np.asarray(word_numbers, dtype=np.int32)[order])
+        return SpellingIndex(spelling_folder)
+
+    def corrections(self, word, max_results=3):
+        """
+        Return the lexicon words closest to a misspelled word.
+
+        Only words at the smallest edit distance found are returned, the
+        most frequent first.
+
+        Args:
+            word (str): Token missing from the lexicon
+            max_results (int): Corrections to return
+
+        Returns:
+            list: Corrected words, empty when nothing is close enough
+        """
+        if len(word) < MIN_WORD_LENGTH or len(self.delete_keys) == 0:
+            return []
+
+        max_distance = max_edit_distance(word)
+        keys = np.array([key.encode('utf-8') for key in _deletes(word, max_distance)], dtype=bytes)
+        # Deletes longer than any stored key can't match, and would be truncated by the cast
+        keys = keys[np.char.str_len(keys) <= self.delete_keys.dtype.itemsize].astype(self.delete_keys.dtype)
+        starts = np.searchsorted(self.delete_keys, keys, side='left')
+        ends = np.searchsorted(self.delete_keys, keys, side='right')
+        counts = ends - starts
+        if counts.sum() == 0:
+            return []
+
+        gather = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        candidates = np.unique(self.delete_words[gather])
+
+        best_distance, best = max_distance + 1, []
+        for candidate in candidates.tolist():
+            distance = edit_distance(word, self.words[candidate].decode('utf-8'), max_distance)
+            if distance < best_distance:
+                best_distance, best = distance, [candidate]
+            elif distance == best_distance:
+                best.append(candidate)
+        if best_distance > max_distance:
+            return []
+
+        best.sort(key=lambda candidate: -int(self.document_frequencies[candidate]))
+        return [self.words[candidate].decode('utf-8') for candidate in best[:max_results]]
@@ -0,0 +1,337 @@
+import pandas as pd
+import numpy as np
+import heapq
+import os
+import shutil
+import warnings
+from binary_index import BinaryIndexWriter
+from columnar import read_chunks
+from doc_store import DocStoreWriter
+
+warnings.simplefilter(action='ignore', category=FutureWarning)
+
+# Buffered postings cost word_id + doc_id + position, 4 bytes each
+BYTES_PER_TOKEN = 12
+
+
+def _ascii_numbers(values):
+    """
+    Format non-negative integers as space-separated ASCII digits.
+
+    The digits are laid out with array arithmetic, so a long posting list
+    never becomes one Python string per number.
+
+    Returns:
+        bytes: e.g. b"3 17 250"
+    """
+    values = np.asarray(values, dtype=np.int64)
+    if len(values) == 0:
+        return b""
+    num_digits = np.ones(len(values), dtype=np.int64)
+    for power in range(1, 19):
+        num_digits += values >= 10 ** power
+    # Every number is followed by a space, dropped after the last one
+    ends = np.cumsum(num_digits + 1) - 1
+    text = np.full(int(ends[-1]) + 1, ord(" "), dtype=np.uint8)
+    remaining = values.copy()
+    for digit in range(int(num_digits.max())):
+        has_digit = num_digits > digit
+        text[ends[has_digit] - 1 - digit] = ord("0") + remaining[has_digit] % 10
+        remaining //= 10
+    return text[:-1].tobytes()
+
+
+def collapse_occurrences(doc_ids):
+    """
+    Collapse one term's occurrences into postings.
+
+    Args:
+        doc_ids (np.ndarray): Doc ID of every occurrence, sorted
+
+    Returns:
+        tuple: (unique doc IDs, term frequency of each)
+    """
+    doc_starts = np.concatenate(([0], np.flatnonzero(np.diff(doc_ids)) + 1))
+    term_frequencies = np.diff(np.append(doc_starts, len(doc_ids)))
+    return doc_ids[doc_starts], term_frequencies
+
+
+class SPIMIIndexer:
+    def __init__(self,
+                 input_cleaned_file,
+                 input_lexicon_file,
+                 output_binary_index_folder,
+                 output_doc_store_folder,
+                 output_barrels_folder=None,
+                 positional=True,
+                 codec="raw"):
+        """
+        Single-pass in-memory indexer (SPIMI) with an on-disk merge.
+
+        Streams the cleaned dataset in chunks and replaces the forward and
+        inverted index stages: tokens are buffered as (word_id, doc_id,
+        position) triples, and whenever the buffer reaches the memory budget
+        it is sorted by word_id and written to disk as a run. The runs are
+        then k-way merged straight into the binary index (and optionally the
+        CSV barrels). Memory use depends on the budget and the vocabulary,
+        not on the number of documents.
+
+        Args:
+            input_cleaned_file (str): Path to cleaned dataset, CSV or Parquet
+            input_lexicon_file (str): Path to lexicon file
+            output_binary_index_folder (str): Folder to save the binary index
+            output_doc_store_folder (str): Folder to save the doc store
+            output_barrels_folder (str, optional): Folder to save inverted
+                index barrels; skipped when None
+            positional (bool): Store token positions in the binary index
+            codec (str): Postings codec of the binary index (raw, varint,
+                pfor or elias_fano), recorded in its manifest
+        """
+        self.input_cleaned_file = input_cleaned_file
+        self.input_lexicon_file = input_lexicon_file
+        self.output_binary_index_folder = output_binary_index_folder
+        self.output_doc_store_folder = output_doc_store_folder
+        self.output_barrels_folder = output_barrels_folder
+        self.positional = positional
+        self.codec = codec
+
+        self.runs_folder = os.path.join(output_binary_index_folder, "_runs")
+
+    def _load_lexicon(self):
+        lexicon_df = pd.read_csv(self.input_lexicon_file, keep_default_na=False)
+        # A hash index over the words maps whole token arrays to word_ids at once
+        self._vocabulary = pd.Index(lexicon_df['word'])
+        self._vocabulary_ids = lexicon_df['word_id'].to_numpy(dtype=np.int32)
+
+    def _tokenize_chunk(self, chunk):
+        """
+        Turn a chunk of cleaned documents into posting triples.
+
+        Args:
+            chunk (pd.DataFrame): Rows of the cleaned dataset, indexed by doc_id
+
+        Returns:
+            tuple: (word_ids, doc_ids, positions) arrays in document order, and
+                the length of every document in the chunk
+        """
+        tokens = chunk['cleaned_text'].fillna('').str.split().explode().dropna()
+
+        vocabulary_positions = self._vocabulary.get_indexer(tokens.to_numpy())
+        known = vocabulary_positions >= 0
+        word_ids = self._vocabulary_ids[vocabulary_positions[known]]
+        doc_ids = tokens.index.to_numpy()[known].astype(np.int32)
+
+        # Position of every token among the known tokens of its document
+        unique_docs, first_token, counts = np.unique(doc_ids, return_index=True, return_counts=True)
+        positions = (np.arange(len(doc_ids)) - np.repeat(first_token, counts)).astype(np.int32)
+
+        # Documents without known tokens keep a length of 0
+        doc_lengths = np.zeros(len(chunk), dtype=np.int32)
+        doc_lengths[chunk.index.get_indexer(unique_docs)] = counts.astype(np.int32)
+        return (word_ids, doc_ids, positions), doc_lengths
+
+    def _write_run(self, buffered, run_number):
+        """
+        Sort buffered triples by word_id and save them as one run.
+
+        Triples are buffered in doc_id and position order, so a stable sort
+        on word_id alone leaves each word's postings sorted.
+        """
+        word_ids = np.concatenate([part[0] for part in buffered])
+        doc_ids = np.concatenate([part[1] for part in buffered])
+        positions = np.concatenate([part[2] for part in buffered])
+        order = np.argsort(word_ids, kind='stable')
+        word_ids, doc_ids = word_ids[order], doc_ids[order]
+
+        # Documents of every word in this run; runs hold disjoint documents, so a
+        # word's document frequency is known before its postings are merged
+        posting_starts = np.flatnonzero(np.concatenate(
+            ([True], (word_ids[1:] != word_ids[:-1]) | (doc_ids[1:] != doc_ids[:-1]))
+        )) if len(word_ids) else np.empty(0, dtype=np.int64)
+        run_words, run_document_frequencies = np.unique(word_ids[posting_starts], return_counts=True)
+
+        run_prefix = os.path.join(self.runs_folder, f"run_{run_number}")
+        np.save(f"{run_prefix}_words.npy", word_ids)
+        np.save(f"{run_prefix}_docs.npy", doc_ids)
+        np.save(f"{run_prefix}_positions.npy", positions[order])
+        np.save(f"{run_prefix}_df_words.npy", run_words)
+        np.save(f"{run_prefix}_dfs.npy", run_document_frequencies)
+        print(f"Run {run_number} with {len(word_ids)} postings saved")
+        return run_prefix
+
+    def _document_frequencies(self, run_prefixes):
+        """Document frequency of every word_id over all runs."""
+        document_frequencies = np.zeros(int(self._vocabulary_ids.max(initial=0)) + 1, dtype=np.int64)
+        for prefix in run_prefixes:
+            np.add.at(document_frequencies, np.load(f"{prefix}_df_words.npy"), np.load(f"{prefix}_dfs.npy"))
+        return document_frequencies
+
+    def _merge_runs(self, run_prefixes):
+        """
+        K-way merge the runs, yielding each word's postings in word_id order.
+
+        Runs hold increasing doc_id ranges, so one word's slices in run order
+        keep its doc IDs sorted. The slices are views of the memory-mapped
+        runs and are only read when used, so a word's postings never have to
+        fit in memory at once.
+
+        Yields:
+            tuple: (word_id, list of (doc_ids, positions) slices with one
+                entry per occurrence, in run order)
+        """
+        runs = [
+            tuple(np.load(f"{prefix}_{name}.npy", mmap_mode='r') for name in ("words", "docs", "positions"))
+            for prefix in run_prefixes
+        ]
+        cursors = [0] * len(runs)
+        heap = [(int(words[0]), run_number) for run_number, (words, _, _) in enumerate(runs) if len(words)]
+        heapq.heapify(heap)
+
+        while heap:
+            word_id = heap[0][0]
+            slices = []
+
+            while heap and heap[0][0] == word_id:
+                _, run_number = heapq.heappop(heap)
+                words, docs, positions = runs[run_number]
+                start = cursors[run_number]
+                end = start + int(np.searchsorted(words[start:], word_id, side='right'))
+
+                slices.append((docs[start:end], positions[start:end]))
+                cursors[run_number] = end
+                if end < len(words):
+                    heapq.heappush(heap, (int(words[end]), run_number))
+
+            yield word_id, slices
+
+    def _open_barrels(self, num_barrels):
+        if self.output_barrels_folder is None:
+            return []
+
+        os.makedirs(self.output_barrels_folder, exist_ok=True)
+        barrels = []
+        for i in range(num_barrels):
+            barrel_file = open(os.path.join(self.output_barrels_folder, f"inverted_index_barrel_{i}.csv"), "wb")
+            # Rows are written a posting list slice at a time, in the csv module's dialect
+            barrel_file.write(b"word_id,doc_ids,term_frequencies\r\n")
+            barrels.append(barrel_file)
+        return barrels
+
+    def _add_term(self, index_writer, barrel_file, word_id, slices, document_frequency):
+        """
+        Stream one word's run slices into the binary index and its barrel row.
+
+        Only one run slice is held in memory at a time. The barrel row lists
+        all doc IDs before all term frequencies, so with barrels the slices
+        are collapsed a second time for the frequencies.
+        """
+        index_writer.start_term(word_id, document_frequency)
+        if barrel_file is not None:
+            barrel_file.write(b"%d," % word_id)
+
+        separator = b""
+        for doc_ids, positions in slices:
+            unique_doc_ids, term_frequencies = collapse_occurrences(np.asarray(doc_ids))
+            index_writer.add_postings(unique_doc_ids, term_frequencies,
+                                      np.asarray(positions) if self.positional else None)
+            if barrel_file is not None:
+                barrel_file.write(separator + _ascii_numbers(unique_doc_ids))
+                separator = b" "
+        index_writer.finish_term()
+
+        if barrel_file is not None:
+            separator = b","
+            for doc_ids, _ in slices:
+                barrel_file.write(separator + _ascii_numbers(collapse_occurrences(np.asarray(doc_ids))[1]))
+                separator = b" "
+            barrel_file.write(b"\r\n")
+
+    def create_index(self, chunk_size=10000, memory_budget=256 * 1024 * 1024, num_barrels=10):
+        """
+        Build the doc store, binary index and barrels in one pass over the dataset.
+
+        Args:
+            chunk_size (int): Rows read from the cleaned dataset at a time
+            memory_budget (int): Bytes of buffered postings before a run is written
+            num_barrels (int): Number of inverted index barrels
+
+        Returns:
+            int: Number of documents indexed
+        """
+        try:
+            self._load_lexicon()
+            os.makedirs(self.runs_folder, exist_ok=True)
+
+            doc_store_writer = DocStoreWriter(self.output_doc_store_folder)
+            doc_length_parts = []
+            run_prefixes = []
+            buffered, buffered_tokens = [], 0
+
+            reader = read_chunks(self.input_cleaned_file, columns=['title', 'url', 'tags', 'cleaned_text'],
+                                 chunk_size=chunk_size)
+            for chunk in reader:
+                for doc_id, title, url, tags in zip(chunk.index, chunk['title'], chunk['url'], chunk['tags']):
+                    doc_store_writer.add(doc_id, title, url, tags)
+
+                triples, doc_lengths = self._tokenize_chunk(chunk)
+                doc_length_parts.append(doc_lengths)
+                buffered.append(triples)
+                buffered_tokens += len(triples[0])
+
+                if buffered_tokens * BYTES_PER_TOKEN >= memory_budget:
+                    run_prefixes.append(self._write_run(buffered, len(run_prefixes)))
+                    buffered, buffered_tokens = [], 0
+
+            if buffered:
+                run_prefixes.append(self._write_run(buffered, len(run_prefixes)))
+            doc_store_writer.close()
+            print(f"Doc store saved to {self.output_doc_store_folder}")
+
+            doc_lengths = np.concatenate(doc_length_parts) if doc_length_parts else np.zeros(0, dtype=np.int32)
+            index_writer = BinaryIndexWriter(self.output_binary_index_folder, doc_lengths,
+                                             positional=self.positional, codec=self.codec)
+            barrels = self._open_barrels(num_barrels)
+            document_frequencies = self._document_frequencies(run_prefixes)
+
+            for word_id, slices in self._merge_runs(run_prefixes):
+                self._add_term(index_writer, barrels[word_id % num_barrels] if barrels else None,
+                               word_id, slices, int(document_frequencies[word_id]))
+
+            index_writer.close()
+            for barrel_file in barrels:
+                barrel_file.close()
+            shutil.rmtree(self.runs_folder)
+
+            print(f"Binary index saved to {self.output_binary_index_folder}")
+            if barrels:
+                print(f"Inverted index barrels saved to {self.output_barrels_folder}")
+            return len(doc_lengths)
+
+        except Exception as e:
+            print(f"Error creating index: {e}")
+            raise
+
+
+def main():
+    # File paths
+    input_cleaned_file = r"C:\Users\AT\CSV Dataset files\cleaned_articles_test.parquet"
+    input_lexicon_file = r"C:\Users\AT\CSV Dataset files\lexicon.csv"
+    output_binary_index_folder = r"C:\Users\AT\CSV Dataset files\binary_index"
+    output_doc_store_folder = r"C:\Users\AT\CSV Dataset files\doc_store"
+    output_barrels_folder = r"C:\Users\AT\CSV Dataset files\inverted_index_barrels"
+
+    try:
+        indexer = SPIMIIndexer(
+            input_cleaned_file,
+            input_lexicon_file,
+            output_binary_index_folder,
+            output_doc_store_folder,
+            output_barrels_folder
+        )
+        indexer.create_index()
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+if __name__ == "__main__":
+    main()
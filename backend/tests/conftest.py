@@ -0,0 +1,87 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# Pipeline modules live in backend/, which pytest does not put on the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from binary_index import BinaryIndexWriter
+from doc_store import DocStoreWriter
+
+NUM_DOCS = 1500
+NUM_WORDS = 300
+
+
+def word(word_id):
+    """Alphabetic word of a word_id, so queries survive query preprocessing."""
+    return "w" + "".join(chr(ord("a") + int(digit)) for digit in str(word_id))
+
+
+def random_corpus(seed=0, num_docs=NUM_DOCS, num_words=NUM_WORDS):
+    """
+    Documents of Zipf-distributed word IDs in 1..num_words.
+
+    Head words appear in most documents, so their posting lists span many
+    blocks, while tail words appear in a handful.
+    """
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(1, 80, size=num_docs)
+    return [np.minimum(rng.zipf(1.3, size=length), num_words).astype(np.int64) for length in lengths]
+
+
+def write_index(folder, docs, num_words=NUM_WORDS, **writer_options):
+    """Write a positional binary index of docs; returns the posting lists by word_id."""
+    doc_lengths = np.array([len(tokens) for tokens in docs])
+    occurrences = {}
+    for doc_id, tokens in enumerate(docs):
+        for position, word_id in enumerate(tokens.tolist()):
+            occurrences.setdefault(word_id, {}).setdefault(doc_id, []).append(position)
+
+    writer = BinaryIndexWriter(folder, doc_lengths, positional=True, **writer_options)
+    postings = {}
+    for word_id in sorted(occurrences):
+        by_doc = occurrences[word_id]
+        doc_ids = np.array(sorted(by_doc))
+        term_frequencies = np.array([len(by_doc[doc_id]) for doc_id in doc_ids])
+        positions = np.concatenate([by_doc[doc_id] for doc_id in doc_ids])
+        writer.add(word_id, doc_ids, term_frequencies, positions)
+        postings[word_id] = doc_ids, term_frequencies
+    writer.close()
+    return postings
+
+
+def write_doc_store(folder, num_docs):
+    writer = DocStoreWriter(folder)
+    for doc_id in range(num_docs):
+        writer.add(doc_id, f"title {doc_id}", f"https://example.com/{doc_id}", "['Tag']")
+    writer.close()
+
+
+def write_lexicon(path, num_words=NUM_WORDS):
+    pd.DataFrame({"word": [word(word_id) for word_id in range(1, num_words + 1)],
+                  "word_id": range(1, num_words + 1)}).to_csv(path, index=False)
+
+
+@pytest.fixture
+def corpus_folder(tmp_path):
+    """Folder with a lexicon, binary index and doc store of random_corpus()."""
+    docs = random_corpus()
+    write_lexicon(str(tmp_path / "lexicon.csv"))
+    write_index(str(tmp_path / "binary_index"), docs)
+    write_doc_store(str(tmp_path / "doc_store"), len(docs))
+    return tmp_path
+
+
+@pytest.fixture
+def open_engine(corpus_folder, monkeypatch):
+    """Open a SearchEngine on corpus_folder; keyword arguments go to SearchEngine."""
+    from search import SearchEngine
+    # Stop words come from nltk's corpus, which tests do not download
+    monkeypatch.setattr(SearchEngine, "_read_stop_words", lambda self: set())
+
+    def open_engine(**options):
+        return SearchEngine(str(corpus_folder / "lexicon.csv"), str(corpus_folder / "binary_index"),
+                            str(corpus_folder / "doc_store"), typo_tolerance=False, **options)
+    return open_engine
@@ -0,0 +1,35 @@
+import numpy as np
+from cache import PostingsCache
+from conftest import word
+
+
+def test_postings_cache_evicts_least_recently_used():
+    cache = PostingsCache(max_bytes=3 * 8)
+    for key in range(4):
+        assert cache.put(key, (np.zeros(2, dtype=np.int32),))
+    assert cache.get(0) is None
+    assert cache.get(3) is not None
+    assert not cache.put("large", (np.zeros(7, dtype=np.int32),))
+    assert cache.resident_bytes == 24
+
+
+def test_warming_keeps_the_most_important_terms(open_engine):
+    engine = open_engine()
+    index = engine.index
+    sizes = {word_id: index.postings(word_id).nbytes + index.term_frequencies(word_id).nbytes
+             for word_id in (1, 2, 3)}
+    # Room for the two most important lists only
+    engine.postings_cache.max_bytes = sizes[1] + sizes[2]
+    engine.warm_postings_cache([word(1), word(2), word(3)])
+
+    cached = {key[1] for key in engine.postings_cache._entries}
+    assert cached == {1, 2}
+
+
+def test_lists_over_budget_are_not_copied(open_engine):
+    engine = open_engine()
+    engine.postings_cache.max_bytes = 16
+    doc_ids, _ = engine._load_postings(engine._generation, 1)
+    # Still a view of the memory-mapped postings file
+    assert not doc_ids.flags.owndata
+    assert engine.postings_cache.stats()["entries"] == 0
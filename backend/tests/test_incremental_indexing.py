@@ -0,0 +1,133 @@
+import os
+import numpy as np
+import pandas as pd
+from binary_index import BinaryIndex
+from incremental_indexing import IncrementalIndexer
+from ranking import BM25Scorer
+from lexicon_table import LexiconHashTable
+from segments import SegmentedIndex, read_lexicon_additions
+from snapshot import (SNAPSHOT_FORMAT, LEXICON_FOLDER, INDEX_FOLDER, DOC_STORE_FOLDER, STOPWORDS_FILE,
+                      _start_snapshot, _copy_index, _finish_snapshot)
+from tiered_index import TieredIndexBuilder, open_first_tier, read_priors
+from conftest import random_corpus, word, write_index
+
+
+def articles(docs, extra_words=()):
+    return pd.DataFrame({
+        "title": [f"new {doc_id}" for doc_id in range(len(docs))],
+        "url": [f"https://example.com/new/{doc_id}" for doc_id in range(len(docs))],
+        "tags": "['Tag']",
+        "cleaned_text": [" ".join([word(word_id) for word_id in tokens.tolist()] + list(extra_words))
+                         for tokens in docs],
+    })
+
+
+def test_merge_scores_like_a_rebuild_of_the_live_documents(corpus_folder, tmp_path):
+    docs = random_corpus()
+    new_docs = random_corpus(seed=1, num_docs=200)
+    indexer = IncrementalIndexer(str(corpus_folder / "binary_index"), str(corpus_folder / "doc_store"),
+                                 str(corpus_folder / "lexicon.csv"), merge_threshold=0)
+    indexer.add_documents(articles(new_docs))
+    # Mostly long documents, so the live average length moves
+    lengths = np.array([len(tokens) for tokens in docs])
+    deleted = np.argsort(-lengths)[:300].tolist() + [len(docs) + 5]
+    indexer.delete_documents(deleted)
+    indexer.merge()
+
+    all_docs = docs + new_docs
+    live_docs = [tokens for doc_id, tokens in enumerate(all_docs) if doc_id not in set(deleted)]
+    write_index(str(tmp_path / "rebuilt"), live_docs)
+    rebuilt = BinaryIndex(str(tmp_path / "rebuilt"))
+    merged = SegmentedIndex(str(corpus_folder / "binary_index"))
+
+    assert merged.collection["num_docs"] == len(live_docs)
+    assert merged.manifest["collection"] == merged.collection
+    merged_scorer = BM25Scorer(merged.doc_lengths, **merged.collection)
+    rebuilt_scorer = BM25Scorer(rebuilt.doc_lengths)
+    for word_id in (1, 2, 7, 40):
+        doc_ids = merged.postings(word_id)
+        merged_scores = merged_scorer.term_scores(doc_ids, merged.term_frequencies(word_id), len(doc_ids))
+        doc_ids = rebuilt.postings(word_id)
+        rebuilt_scores = rebuilt_scorer.term_scores(doc_ids, rebuilt.term_frequencies(word_id), len(doc_ids))
+        np.testing.assert_allclose(merged_scores, rebuilt_scores, rtol=1e-6)
+        np.testing.assert_allclose(merged.upper_bound(word_id), rebuilt.upper_bound(word_id), rtol=1e-6)
+
+
+def test_combined_postings_are_cached_per_index(corpus_folder):
+    indexer = IncrementalIndexer(str(corpus_folder / "binary_index"), str(corpus_folder / "doc_store"),
+                                 str(corpus_folder / "lexicon.csv"), merge_threshold=0)
+    indexer.add_documents(articles(random_corpus(seed=1, num_docs=10)))
+    first = SegmentedIndex(str(corpus_folder / "binary_index"))
+    second = SegmentedIndex(str(corpus_folder / "binary_index"))
+    first.postings(1)
+    assert first._combined.cache_info().currsize == 1
+    assert second._combined.cache_info().currsize == 0
+
+
+def test_lexicon_additions_are_rewritten_whole(corpus_folder):
+    index_folder = str(corpus_folder / "binary_index")
+    indexer = IncrementalIndexer(index_folder, str(corpus_folder / "doc_store"),
+                                 str(corpus_folder / "lexicon.csv"), merge_threshold=0)
+    indexer.add_documents(articles(random_corpus(seed=1, num_docs=3), ["zzfirst"]))
+    indexer.add_documents(articles(random_corpus(seed=2, num_docs=3), ["zzsecond", "zzthird"]))
+
+    additions = read_lexicon_additions(index_folder)
+    assert list(additions) == ["zzfirst", "zzsecond", "zzthird"]
+    assert len(set(additions.values())) == 3
+    assert not (corpus_folder / "binary_index" / "deltas" / "lexicon_additions.csv.tmp").exists()
+
+
+def test_merge_keeps_priors_and_first_tier(corpus_folder):
+    index_folder = str(corpus_folder / "binary_index")
+    TieredIndexBuilder(index_folder, str(corpus_folder / "doc_store"), first_tier_size=50).build()
+    indexer = IncrementalIndexer(index_folder, str(corpus_folder / "doc_store"),
+                                 str(corpus_folder / "lexicon.csv"), merge_threshold=0)
+    indexer.add_documents(articles(random_corpus(seed=1, num_docs=200)))
+    indexer.delete_documents(list(range(100)))
+    indexer.merge()
+
+    merged = BinaryIndex(index_folder)
+    assert "priors" in merged.manifest and merged.manifest["first_tier"]["postings_per_term"] == 50
+    priors = read_priors(merged)
+    assert len(np.fromfile(str(corpus_folder / "binary_index" / "priors.bin"), dtype=np.float32)) == merged.num_docs
+    # New documents get priors of their own rather than the 0 of documents added after the priors
+    assert (priors[-200:] > 0).all()
+
+    first_tier, _ = open_first_tier(merged)
+    for word_id in (1, 2, 7):
+        tier_doc_ids = first_tier.postings(word_id)
+        assert len(tier_doc_ids) == 50 and tier_doc_ids.min() >= 100
+        assert np.isin(tier_doc_ids, merged.postings(word_id)).all()
+
+
+def write_snapshot(corpus_folder):
+    """A first snapshot like IndexSnapshotBuilder writes, minus nltk's stop words."""
+    snapshots_folder = str(corpus_folder / "snapshots")
+    version, staging_folder = _start_snapshot(snapshots_folder)
+    LexiconHashTable.build(str(corpus_folder / "lexicon.csv"), os.path.join(staging_folder, LEXICON_FOLDER))
+    _copy_index(str(corpus_folder / "binary_index"), str(corpus_folder / "doc_store"), staging_folder)
+    open(os.path.join(staging_folder, STOPWORDS_FILE), "w").close()
+    components = {"lexicon": LEXICON_FOLDER, "index": INDEX_FOLDER, "doc_store": DOC_STORE_FOLDER,
+                  "stopwords": STOPWORDS_FILE}
+    _finish_snapshot(snapshots_folder, staging_folder, version,
+                     {"format": SNAPSHOT_FORMAT, "version": version, "components": components}, keep=3)
+    return snapshots_folder
+
+
+def test_changes_are_published_to_snapshots(corpus_folder):
+    from search import SearchEngine
+    snapshots_folder = write_snapshot(corpus_folder)
+    engine = SearchEngine(snapshot_folder=snapshots_folder, typo_tolerance=False)
+    indexer = IncrementalIndexer(str(corpus_folder / "binary_index"), str(corpus_folder / "doc_store"),
+                                 str(corpus_folder / "lexicon.csv"), merge_threshold=0,
+                                 snapshots_folder=snapshots_folder)
+    assert engine.search("zzfresh") == []
+
+    doc_ids = indexer.add_documents(articles(random_corpus(seed=1, num_docs=3), ["zzfresh"]))
+    assert sorted(result["doc_id"] for result in engine.search("zzfresh")) == doc_ids
+    indexer.delete_documents(doc_ids[:1])
+    assert sorted(result["doc_id"] for result in engine.search("zzfresh")) == doc_ids[1:]
+    indexer.merge()
+    assert sorted(result["doc_id"] for result in engine.search("zzfresh")) == doc_ids[1:]
+    # Only the newest snapshots are kept
+    assert sorted(os.listdir(snapshots_folder)) == ["CURRENT", "v000002", "v000003", "v000004"]
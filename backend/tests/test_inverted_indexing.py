@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from binary_index import BinaryIndex
+from inverted_indexing import InvertedIndexGenerator
+from conftest import random_corpus
+
+
+@pytest.fixture
+def forward_index(tmp_path):
+    docs = random_corpus(num_docs=500)
+    path = str(tmp_path / "forward_index.csv")
+    pd.DataFrame({
+        "doc_id": range(len(docs)),
+        "word_ids": [" ".join(map(str, tokens.tolist())) for tokens in docs],
+    }).to_csv(path, index=False)
+    return path, docs
+
+
+def build(tmp_path, forward_index_file, name, batch_tokens, extension=".csv"):
+    folder = tmp_path / name
+    generator = InvertedIndexGenerator(forward_index_file, str(folder / f"inverted_index{extension}"),
+                                       str(folder / "barrels"), str(folder / "binary_index"))
+    generator.create_inverted_index(num_processes=2, num_barrels=3, chunk_size=40, batch_tokens=batch_tokens)
+    return folder
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet"])
+def test_batches_build_the_same_index_as_one(tmp_path, forward_index, extension):
+    path, docs = forward_index
+    one_batch = build(tmp_path, path, "one_batch", 1 << 30, extension)
+    # Smaller than the longest posting lists, which then get batches of their own
+    many_batches = build(tmp_path, path, "many_batches", 500, extension)
+
+    for name in [f"inverted_index{extension}"] + [f"barrels/inverted_index_barrel_{i}{extension}" for i in range(3)]:
+        if extension == ".csv":
+            assert (one_batch / name).read_bytes() == (many_batches / name).read_bytes()
+        else:
+            # Row groups follow the batches, so compare the rows
+            pd.testing.assert_frame_equal(pd.read_parquet(one_batch / name), pd.read_parquet(many_batches / name))
+    for name in ("postings.bin", "term_frequencies.bin", "positions.bin", "position_offsets.bin", "offsets.bin"):
+        assert (one_batch / "binary_index" / name).read_bytes() == (many_batches / "binary_index" / name).read_bytes()
+
+    index = BinaryIndex(str(many_batches / "binary_index"))
+    for word_id in (1, 2, 30, 299):
+        expected = [doc_id for doc_id, tokens in enumerate(docs) if word_id in tokens]
+        assert index.postings(word_id).tolist() == expected
+        assert index.term_frequencies(word_id).tolist() == [int((docs[d] == word_id).sum()) for d in expected]
+        if expected:
+            positions, _ = index.positions(word_id, np.arange(len(expected)))
+            assert positions.tolist() == np.concatenate(
+                [np.flatnonzero(docs[d] == word_id) for d in expected]).tolist()
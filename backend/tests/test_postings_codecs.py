@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+from binary_index import BinaryIndex, BinaryIndexWriter, BLOCK_SIZE
+from postings_codecs import CODECS, RAW, get_codec
+
+# Around the block size, where blocks are empty, single, full or just spill over
+LENGTHS = [0, 1, BLOCK_SIZE - 1, BLOCK_SIZE, BLOCK_SIZE + 1, 5 * BLOCK_SIZE + 3]
+MAX_INT32 = 2 ** 31 - 1
+
+
+def doc_id_lists(length, max_doc_id=MAX_INT32):
+    """Dense, sparse and extreme sorted doc ID lists of a length, all within 0..max_doc_id."""
+    rng = np.random.default_rng(length)
+    yield np.arange(length, dtype=np.int64)
+    yield np.sort(rng.choice(max_doc_id + 1, size=length, replace=False)).astype(np.int64)
+    # Largest possible IDs, so the first gap and every block base are as wide as they get
+    yield np.arange(max_doc_id + 1 - length, max_doc_id + 1, dtype=np.int64)
+    if length:
+        # A lone first doc ID followed by a jump across the whole range
+        yield np.append(0, np.arange(max_doc_id + 2 - length, max_doc_id + 1)).astype(np.int64)
+
+
+def value_lists(length):
+    rng = np.random.default_rng(length)
+    yield np.ones(length, dtype=np.int64)
+    yield rng.integers(1, MAX_INT32, size=length, endpoint=True)
+    # Mostly small values with rare large exceptions, the case PForDelta patches
+    values = rng.integers(1, 8, size=length)
+    values[::37] = MAX_INT32
+    yield values
+
+
+def block_layout(block_lengths, length):
+    byte_offsets = np.concatenate(([0], np.cumsum(block_lengths))).astype(np.int64)
+    counts = np.minimum(BLOCK_SIZE, length - np.arange(0, length, BLOCK_SIZE))
+    return byte_offsets, counts
+
+
+@pytest.mark.parametrize("name", sorted(CODECS))
+@pytest.mark.parametrize("length", LENGTHS)
+def test_doc_ids_round_trip(name, length):
+    codec = get_codec(name, BLOCK_SIZE)
+    for doc_ids in doc_id_lists(length):
+        data, block_lengths = codec.encode_doc_ids_many(doc_ids)
+        data = np.frombuffer(data, dtype=np.uint8)
+        byte_offsets, counts = block_layout(block_lengths, length)
+        assert len(block_lengths) == len(counts)
+        assert codec.decode_doc_ids_many(data, byte_offsets, counts).tolist() == doc_ids.tolist()
+
+        # Every block decodes on its own from the previous block's last doc ID
+        for block, count in enumerate(counts.tolist()):
+            base = int(doc_ids[block * BLOCK_SIZE - 1]) if block else 0
+            decoded = codec.decode_doc_ids(data[byte_offsets[block]:byte_offsets[block + 1]], count, base)
+            assert decoded.tolist() == doc_ids[block * BLOCK_SIZE:block * BLOCK_SIZE + count].tolist()
+
+
+@pytest.mark.parametrize("name", sorted(CODECS))
+@pytest.mark.parametrize("length", LENGTHS)
+def test_doc_ids_encoded_in_slices_match_the_whole_list(name, length):
+    codec = get_codec(name, BLOCK_SIZE)
+    for doc_ids in doc_id_lists(length):
+        whole, whole_lengths = codec.encode_doc_ids_many(doc_ids)
+        parts, part_lengths = [], []
+        for start in range(0, length, 2 * BLOCK_SIZE):
+            base = int(doc_ids[start - 1]) if start else 0
+            data, block_lengths = codec.encode_doc_ids_many(doc_ids[start:start + 2 * BLOCK_SIZE], base=base)
+            parts.append(data)
+            part_lengths.extend(block_lengths.tolist())
+        assert b"".join(parts) == whole
+        assert part_lengths == whole_lengths.tolist()
+
+
+@pytest.mark.parametrize("name", sorted(CODECS))
+@pytest.mark.parametrize("length", LENGTHS)
+def test_values_round_trip(name, length):
+    codec = get_codec(name, BLOCK_SIZE)
+    for values in value_lists(length):
+        data, block_lengths = codec.encode_values_many(values)
+        byte_offsets, counts = block_layout(block_lengths, length)
+        decoded = codec.decode_values_many(np.frombuffer(data, dtype=np.uint8), byte_offsets, counts)
+        assert decoded.tolist() == values.tolist()
+
+
+def test_unknown_codec():
+    assert get_codec(RAW, BLOCK_SIZE) is None
+    with pytest.raises(ValueError):
+        get_codec("gzip", BLOCK_SIZE)
+
+
+@pytest.mark.parametrize("codec", [RAW] + sorted(CODECS))
+def test_index_round_trip(tmp_path, codec):
+    num_docs = 20000
+    doc_lengths = np.random.default_rng(0).integers(1, 500, size=num_docs)
+    lists = {}
+    word_id = 1
+    for length in LENGTHS:
+        for doc_ids in doc_id_lists(length, max_doc_id=num_docs - 1):
+            for term_frequencies in value_lists(length):
+                lists[word_id] = doc_ids, term_frequencies
+                word_id += 2  # Every other word ID has no postings at all
+    lists[word_id] = np.arange(num_docs), np.ones(num_docs, dtype=np.int64)
+
+    writer = BinaryIndexWriter(str(tmp_path), doc_lengths, codec=codec)
+    for word_id, (doc_ids, term_frequencies) in lists.items():
+        writer.add(word_id, doc_ids, term_frequencies)
+    writer.close()
+
+    index = BinaryIndex(str(tmp_path))
+    assert index.manifest["codec"] == codec
+    for word_id, (doc_ids, term_frequencies) in lists.items():
+        assert index.postings(word_id).tolist() == doc_ids.tolist()
+        assert index.term_frequencies(word_id).tolist() == term_frequencies.tolist()
+        assert index.document_frequency(word_id) == len(doc_ids)
+        assert len(index.postings(word_id + 1)) == 0
+
+        block_last_docs, _ = index.blocks(word_id)
+        assert block_last_docs.tolist() == doc_ids[BLOCK_SIZE - 1::BLOCK_SIZE].tolist() + (
+            [int(doc_ids[-1])] if len(doc_ids) % BLOCK_SIZE else [])
+        posting_blocks = index.posting_blocks(word_id)
+        if codec != RAW:
+            blocks = [posting_blocks.block(block).tolist() for block in range(len(block_last_docs))]
+            assert sum(blocks, []) == doc_ids.tolist()
@@ -0,0 +1,48 @@
+import pytest
+from query_parser import And, Not, Or, Prefix, QueryParser, Term
+
+STOP_WORDS = {"a", "in", "on", "the"}
+
+
+def normalize(text):
+    # Like SearchEngine._preprocess_query: lowercase letters only, no stop words
+    words = "".join(c if c.isalpha() or c.isspace() else " " for c in text.lower()).split()
+    return [word for word in words if word not in STOP_WORDS]
+
+
+@pytest.fixture
+def parser():
+    return QueryParser(normalize)
+
+
+@pytest.mark.parametrize("query, prefix", [
+    ("in*", "in"), ("on*", "on"), ("a*", "a"), ("The*", "the"), ("E-Mail*", "email"), ("c++*", "c"),
+])
+def test_prefixes_keep_stop_words(parser, query, prefix):
+    assert parser.parse(query) == Prefix(prefix)
+
+
+@pytest.mark.parametrize("query", ["*", "**", "42*", "-*"])
+def test_prefixes_without_letters(parser, query):
+    assert parser.parse(query) is None
+
+
+def test_prefixes_in_boolean_queries(parser):
+    assert parser.parse('data AND in* -"the cloud"') == And((
+        Term("data"), And((Prefix("in"), Not(Term("cloud")))),
+    ))
+    assert parser.parse("in* OR machine learning") == Or((Prefix("in"), Or((Term("machine"), Term("learning")))))
+    # Stop words still drop out of plain words
+    assert parser.parse("on* the") == Prefix("on")
+
+
+def test_suggestions_complete_the_same_prefix_as_queries(open_engine, corpus_folder):
+    from lexicon_trie import LexiconTrie, default_trie_folder
+    lexicon = str(corpus_folder / "lexicon.csv")
+    LexiconTrie.build(lexicon, default_trie_folder(lexicon))
+    engine = open_engine()
+
+    parsed = QueryParser(normalize).parse("W-B*")
+    suggestions = engine.suggest("data W-B", max_results=5)
+    assert suggestions
+    assert suggestions == ["data " + word for word in engine._expand_prefix(parsed.prefix)[:5]]
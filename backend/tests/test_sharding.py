@@ -0,0 +1,95 @@
+import multiprocessing
+import os
+import pickle
+import numpy as np
+import pytest
+from query_parser import And, Or, Term
+from ranking import select_top
+from sharding import Shard, ShardCoordinator, ShardedIndexBuilder
+from tiered_index import TieredIndexBuilder
+from conftest import word
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="forked workers need fork")
+
+
+@pytest.fixture
+def coordinator(corpus_folder):
+    shards_folder = str(corpus_folder / "shards")
+    ShardedIndexBuilder(str(corpus_folder / "binary_index"), str(corpus_folder / "doc_store"),
+                        shards_folder).create_shards(num_shards=3)
+    coordinator = ShardCoordinator(shards_folder, timeout=30)
+    yield coordinator
+    coordinator.close()
+
+
+QUERY = Or([Term(word(1)), Term(word(7))])
+LEXICON = {word(1): 1, word(7): 7}
+
+
+def rank_in_forked_worker(coordinator):
+    """Rank QUERY in a child forked like a gunicorn worker; returns the child's results."""
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        try:
+            # The parent's processes are listed in the child too
+            inherited = {process.pid for process in multiprocessing.active_children()}
+            doc_ids, scores, complete = coordinator.rank(QUERY, LEXICON, 10)
+            # Joins the shard processes the child started, which os._exit would leave running
+            coordinator.close()
+            started = {process.pid for process in multiprocessing.active_children()} - inherited
+            with os.fdopen(write_end, "wb") as f:
+                pickle.dump((doc_ids, scores, complete, len(started)), f)
+        finally:
+            os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end, "rb") as f:
+        results = pickle.load(f)
+    os.waitpid(pid, 0)
+    return results
+
+
+def test_forked_workers_open_their_own_shard_clients(coordinator):
+    # Nothing is started until a query needs the shards
+    assert coordinator._clients == []
+    answers = [rank_in_forked_worker(coordinator) for _ in range(2)]
+    assert coordinator._clients == []
+
+    doc_ids, scores, complete = coordinator.rank(QUERY, LEXICON, 10)
+    assert complete and len(doc_ids) == 30
+    assert len(coordinator._clients) == 3
+    for child_doc_ids, child_scores, child_complete, child_processes in answers:
+        assert child_complete and child_processes == 0
+        # Shards answer in any order
+        assert sorted(child_doc_ids.tolist()) == sorted(doc_ids.tolist())
+        np.testing.assert_allclose(np.sort(child_scores), np.sort(scores))
+
+    # A worker forked after the parent's first query still starts its own shards
+    child_doc_ids, _, child_complete, child_processes = rank_in_forked_worker(coordinator)
+    assert child_complete and child_processes == 0 and sorted(child_doc_ids.tolist()) == sorted(doc_ids.tolist())
+    doc_ids_again, _, _ = coordinator.rank(QUERY, LEXICON, 10)
+    assert sorted(doc_ids_again.tolist()) == sorted(doc_ids.tolist())
+
+    coordinator.close()
+    assert multiprocessing.active_children() == []
+
+
+@pytest.mark.parametrize("k1", [1.2, 1.0])  # 1.0 doesn't match the build, so shards score exhaustively
+@pytest.mark.parametrize("query, text", [(QUERY, f"{word(1)} {word(7)}"),
+                                         (And([Term(word(1)), Term(word(7))]), f"{word(1)} AND {word(7)}")])
+def test_shards_rank_with_priors_like_the_unsharded_index(corpus_folder, open_engine, k1, query, text):
+    TieredIndexBuilder(str(corpus_folder / "binary_index"), str(corpus_folder / "doc_store")).build(first_tier=False)
+    shards_folder = str(corpus_folder / "shards")
+    ShardedIndexBuilder(str(corpus_folder / "binary_index"), str(corpus_folder / "doc_store"),
+                        shards_folder).create_shards(num_shards=3)
+
+    engine = open_engine(cache_size=0, k1=k1)
+    document_frequencies = {word_id: engine.index.document_frequency(word_id) for word_id in LEXICON.values()}
+    doc_id_parts, score_parts = [], []
+    for shard_number in range(3):
+        doc_ids, scores = Shard(shards_folder, shard_number, k1=k1).rank(query, LEXICON, document_frequencies, 10)
+        doc_id_parts.append(doc_ids)
+        score_parts.append(scores)
+    doc_ids = select_top(np.concatenate(doc_id_parts), np.concatenate(score_parts), 10)
+    assert doc_ids.tolist() == [result["doc_id"] for result in engine.search(text, max_results=10)]
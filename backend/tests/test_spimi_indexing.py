@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+from binary_index import BinaryIndex
+from spimi_indexing import SPIMIIndexer, _ascii_numbers
+from conftest import random_corpus, word, write_lexicon
+
+
+@pytest.fixture
+def cleaned_file(tmp_path):
+    docs = random_corpus(num_docs=600)
+    path = str(tmp_path / "cleaned.csv")
+    pd.DataFrame({
+        "title": [f"title {doc_id}" for doc_id in range(len(docs))],
+        "url": [f"https://example.com/{doc_id}" for doc_id in range(len(docs))],
+        "tags": "['Tag']",
+        "cleaned_text": [" ".join(word(word_id) for word_id in tokens.tolist()) for tokens in docs],
+    }).to_csv(path, index=False)
+    write_lexicon(str(tmp_path / "lexicon.csv"))
+    return path, docs
+
+
+def build(tmp_path, cleaned_file, name, memory_budget, codec="raw"):
+    folder = tmp_path / name
+    SPIMIIndexer(cleaned_file, str(tmp_path / "lexicon.csv"), str(folder / "binary_index"),
+                 str(folder / "doc_store"), str(folder / "barrels"), codec=codec).create_index(
+        chunk_size=50, memory_budget=memory_budget, num_barrels=3)
+    return folder
+
+
+@pytest.mark.parametrize("codec", ["raw", "pfor"])
+def test_many_runs_build_the_same_index_as_one(tmp_path, cleaned_file, codec):
+    path, docs = cleaned_file
+    # A budget of a few hundred tokens writes a run per chunk
+    one_run = build(tmp_path, path, "one_run", 1 << 30, codec)
+    many_runs = build(tmp_path, path, "many_runs", 1000, codec)
+
+    for name in ("postings.bin", "term_frequencies.bin", "positions.bin", "block_max_scores.bin", "upper_bounds.bin"):
+        assert (one_run / "binary_index" / name).read_bytes() == (many_runs / "binary_index" / name).read_bytes()
+    for barrel in range(3):
+        name = f"inverted_index_barrel_{barrel}.csv"
+        assert (one_run / "barrels" / name).read_bytes() == (many_runs / "barrels" / name).read_bytes()
+
+    index = BinaryIndex(str(many_runs / "binary_index"))
+    for word_id in (1, 2, 50):
+        expected = [doc_id for doc_id, tokens in enumerate(docs) if word_id in tokens]
+        assert index.postings(word_id).tolist() == expected
+        assert index.term_frequencies(word_id).tolist() == [int((docs[d] == word_id).sum()) for d in expected]
+
+
+def test_barrels_match_the_index(tmp_path, cleaned_file):
+    path, _ = cleaned_file
+    folder = build(tmp_path, path, "index", 1000)
+    index = BinaryIndex(str(folder / "binary_index"))
+    barrel = pd.read_csv(folder / "barrels" / "inverted_index_barrel_1.csv", keep_default_na=False)
+    assert len(barrel) > 0
+    for word_id, doc_ids, term_frequencies in barrel.itertuples(index=False):
+        assert doc_ids.split() == [str(doc_id) for doc_id in index.postings(word_id).tolist()]
+        assert term_frequencies.split() == [str(tf) for tf in index.term_frequencies(word_id).tolist()]
+
+
+def test_ascii_numbers():
+    values = np.array([0, 7, 10, 99, 100, 123456, 2 ** 31 - 1])
+    assert _ascii_numbers(values) == " ".join(map(str, values.tolist())).encode()
+    assert _ascii_numbers([]) == b""
@@ -0,0 +1,99 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+from binary_index import BinaryIndex
+from ranking import BM25Scorer
+from tiered_index import TieredIndexBuilder, open_first_tier, read_priors
+from conftest import NUM_WORDS, word
+
+BACKEND_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Far shorter than the head terms' lists, so most query terms are tiered
+FIRST_TIER_SIZE = 50
+
+
+@pytest.fixture
+def tiered_index(corpus_folder):
+    index_folder = str(corpus_folder / "binary_index")
+    TieredIndexBuilder(index_folder, str(corpus_folder / "doc_store"), first_tier_size=FIRST_TIER_SIZE).build()
+    return BinaryIndex(index_folder)
+
+
+def random_queries(count=60):
+    rng = np.random.default_rng(3)
+    # Head terms, which are tiered, mixed with rarer ones, which are not
+    return [" ".join(word(word_id) for word_id in rng.choice(np.arange(1, 40), size=rng.integers(1, 4), replace=False))
+            for _ in range(count)]
+
+
+def exact_scores(index, words, engine):
+    """Score of every document over the full index, prior included."""
+    scorer = BM25Scorer(index.doc_lengths)
+    scores = read_priors(index).astype(np.float64)
+    for word_id in {engine.lexicon[w] for w in words.split()}:
+        doc_ids = index.postings(word_id)
+        scores[doc_ids] += scorer.term_scores(doc_ids, index.term_frequencies(word_id), len(doc_ids))
+    return scores
+
+
+def test_search_imports_without_pandas():
+    # Serving from a snapshot must not pay for pandas, even with tiered indexes
+    code = "import sys, search; sys.exit('pandas' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], cwd=BACKEND_FOLDER).returncode == 0
+
+
+def test_cutoffs_bound_the_dropped_postings(tiered_index):
+    first_tier, cutoffs = open_first_tier(tiered_index)
+    scorer = BM25Scorer(tiered_index.doc_lengths)
+    priors = read_priors(tiered_index)
+    num_tiered = 0
+    for word_id in range(1, NUM_WORDS + 1):
+        doc_ids = tiered_index.postings(word_id)
+        kept = np.isin(doc_ids, first_tier.postings(word_id))
+        if len(doc_ids) <= FIRST_TIER_SIZE:
+            assert first_tier.document_frequency(word_id) == 0 and cutoffs[word_id] == 0
+            continue
+        num_tiered += 1
+        impacts = scorer.term_scores(doc_ids, tiered_index.term_frequencies(word_id), len(doc_ids)) + priors[doc_ids]
+        assert kept.sum() == FIRST_TIER_SIZE
+        np.testing.assert_allclose(cutoffs[word_id], impacts[~kept].max(), rtol=1e-6)
+        assert impacts[kept].min() >= impacts[~kept].max()
+    assert num_tiered > 0
+
+
+def test_first_tier_ranks_like_the_full_index(tiered_index, open_engine, monkeypatch):
+    from search import SearchEngine
+    answers = []
+    rank_first_tier = SearchEngine._rank_first_tier
+    monkeypatch.setattr(SearchEngine, "_rank_first_tier",
+                        lambda *args: answers.append(rank_first_tier(*args)) or answers[-1])
+    tiered = open_engine(cache_size=0)
+    full = open_engine(cache_size=0, first_tier=False)
+    assert tiered._generation.first_tier is not None and full._generation.first_tier is None
+
+    for max_results in (1, 10, 100):
+        for query in random_queries():
+            scores = exact_scores(tiered_index, query, tiered)
+            expected = [r["doc_id"] for r in full.search(query, max_results=max_results)]
+            results = [r["doc_id"] for r in tiered.search(query, max_results=max_results)]
+            # Near-tied documents may swap between float32 and float64 sums
+            np.testing.assert_allclose(scores[results], scores[expected], rtol=1e-5)
+    # Both answers from the first tier and fallthroughs to the full index were checked
+    assert any(answer is not None for answer in answers) and None in answers
+
+
+def test_batch_ranks_like_single_queries(tiered_index, open_engine):
+    engine = open_engine(cache_size=0)
+    queries = random_queries()
+    for query, batch in zip(queries, engine.search_batch(queries, max_results=10)):
+        scores = exact_scores(tiered_index, query, engine)
+        single = engine.search(query, max_results=10)
+        np.testing.assert_allclose(scores[[r["doc_id"] for r in batch]], scores[[r["doc_id"] for r in single]],
+                                   rtol=1e-5)
+
+
+def test_first_tier_is_skipped_for_heavier_priors(tiered_index, open_engine):
+    # The cut-offs were computed with the priors at weight 1
+    assert open_engine(prior_weight=2.0)._generation.first_tier is None
+    assert open_engine(prior_weight=0.5)._generation.first_tier is not None
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from binary_index import BinaryIndex
+from ranking import BM25Scorer, select_top
+from top_k import MaxScoreEvaluator, PriorCursor, TermCursor
+from conftest import NUM_WORDS, word
+
+
+def term_cursors(index, word_ids):
+    cursors = []
+    for word_id in word_ids:
+        block_last_docs, block_max_scores = index.blocks(word_id)
+        cursors.append(TermCursor(index.postings(word_id), index.term_frequencies(word_id),
+                                  index.upper_bound(word_id), block_last_docs, block_max_scores,
+                                  index.block_size))
+    return cursors
+
+
+def exact_scores(index, word_ids, prior_scores=None):
+    """float64 BM25 score of every document, NaN where no query term matches."""
+    scorer = BM25Scorer(index.doc_lengths)
+    scores = np.zeros(index.num_docs)
+    matched = np.zeros(index.num_docs, dtype=bool)
+    for word_id in set(word_ids):
+        doc_ids = index.postings(word_id)
+        scores[doc_ids] += scorer.term_scores(doc_ids, index.term_frequencies(word_id), len(doc_ids))
+        matched[doc_ids] = True
+    if prior_scores is not None:
+        scores += prior_scores
+    scores[~matched] = np.nan
+    return scores
+
+
+def assert_exact_top_k(results, scores, k):
+    """results are the k best of scores: same scores in order, each belonging to its document."""
+    ranked = np.sort(scores[~np.isnan(scores)])[::-1][:k]
+    doc_ids = [doc_id for doc_id, _ in results]
+    assert len(set(doc_ids)) == len(doc_ids)
+    np.testing.assert_allclose([score for _, score in results], ranked, rtol=1e-5)
+    np.testing.assert_allclose(scores[doc_ids], ranked, rtol=1e-5)
+
+
+def random_queries(seed, count=150):
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        # Mostly head words, whose lists span many blocks and get pruned
+        pool = 20 if rng.random() < 0.7 else NUM_WORDS
+        yield rng.choice(np.arange(1, pool + 1), size=rng.integers(1, 5), replace=False).tolist()
+
+
+@pytest.fixture
+def index(corpus_folder):
+    return BinaryIndex(str(corpus_folder / "binary_index"))
+
+
+@pytest.mark.parametrize("k", [1, 10, 50])
+def test_max_score_matches_exhaustive(index, k):
+    evaluator = MaxScoreEvaluator(BM25Scorer(index.doc_lengths))
+    for word_ids in random_queries(k):
+        results = evaluator.top_k(term_cursors(index, word_ids), k)
+        assert_exact_top_k(results, exact_scores(index, word_ids), k)
+
+
+def test_max_score_with_prior_matches_exhaustive(index):
+    evaluator = MaxScoreEvaluator(BM25Scorer(index.doc_lengths))
+    prior_scores = np.random.default_rng(1).random(index.num_docs).astype(np.float32) * 3
+    for word_ids in random_queries(2):
+        results = evaluator.top_k(term_cursors(index, word_ids), 10, PriorCursor(prior_scores))
+        assert_exact_top_k(results, exact_scores(index, word_ids, prior_scores), 10)
+
+
+def test_batch_matches_single_queries(open_engine, index):
+    engine = open_engine(cache_size=0)
+    queries = [[word(word_id) for word_id in word_ids] for word_ids in random_queries(3, count=80)]
+    batch_results = engine.search_batch([" ".join(words) for words in queries], max_results=10)
+
+    for words, batch in zip(queries, batch_results):
+        single = engine.search(" ".join(words), max_results=10)
+        scores = exact_scores(index, [engine.lexicon[w] for w in words])
+        ranked = np.sort(scores[~np.isnan(scores)])[::-1][:10]
+        # Near-tied documents may swap between float32 and float64 sums
+        np.testing.assert_allclose(scores[[r["doc_id"] for r in single]], ranked, rtol=1e-5)
+        np.testing.assert_allclose(scores[[r["doc_id"] for r in batch]], ranked, rtol=1e-5)
+        assert [r["rank"] for r in batch] == list(range(1, len(single) + 1))
+
+
+def test_batch_slices_rank_like_one_slice(open_engine, monkeypatch):
+    import search
+    engine = open_engine(cache_size=0)
+    queries = [" ".join(word(word_id) for word_id in word_ids) for word_ids in random_queries(4, count=60)]
+    whole = engine.search_batch(queries, max_results=10)
+    # Head terms alone exceed this, so most queries get a slice of their own
+    monkeypatch.setattr(search, "MAX_BATCH_POSTINGS", 500)
+    assert engine.search_batch(queries, max_results=10) == whole
+
+
+@pytest.mark.parametrize("max_results", [0, -1, -5])
+def test_select_top_without_results(max_results):
+    doc_ids = np.arange(5)
+    assert select_top(doc_ids, np.ones(5, dtype=np.float32), max_results).tolist() == []
@@ -0,0 +1,255 @@
+import json
+import os
+import re
+import numpy as np
+from binary_index import BinaryIndex, BinaryIndexWriter, MANIFEST_FILE, SCORE_DTYPE
+from doc_store import DocStore
+from ranking import BM25Scorer
+
+PRIORS_FILE = "priors.bin"
+FIRST_TIER_FOLDER = "first_tier"
+# Best impact among each term's dropped postings, indexed by word_id
+CUTOFFS_FILE = "cutoffs.bin"
+PRIOR_DTYPE = np.float32
+
+# Share of each signal in a document's prior; signals a collection lacks are left
+# out and the others keep their relative weights
+PRIOR_SIGNALS = {"length": 0.4, "tags": 0.2, "popularity": 0.4}
+# Medium articles carry at most five tags
+MAX_TAGS = 5
+# Documents at least this long (as a percentile of all lengths) get the full length prior
+LENGTH_PERCENTILE = 90
+
+# Postings kept per term in the first tier; shorter lists are not tiered
+FIRST_TIER_SIZE = 1000
+# Weight of the prior against the BM25 score, when picking the first tier and when ranking
+PRIOR_WEIGHT = 1.0
+
+# Tags are stored as a Python list literal, e.g. "['Python', 'Data Science']"
+TAG_PATTERN = re.compile(r"'[^']*'|\"[^\"]*\"")
+
+
+def count_tags(tags):
+    """Number of tags in a doc store tags field."""
+    if not isinstance(tags, str):
+        return 0
+    return len(TAG_PATTERN.findall(tags))
+
+
+def compute_priors(doc_lengths, tag_counts, popularity=None):
+    """
+    Combine static document signals into one prior per document.
+
+    Every signal is scaled to [0, 1] on a log scale where that matters:
+    the document length up to the LENGTH_PERCENTILE length, the number of
+    tags up to MAX_TAGS, and popularity (e.g. claps or inbound links) up to
+    the most popular document.
+
+    Args:
+        doc_lengths (np.ndarray): Token count of every document
+        tag_counts (np.ndarray): Tags of every document
+        popularity (np.ndarray, optional): Popularity of every document;
+            NaN where unknown
+
+    Returns:
+        tuple: (float32 prior in [0, 1] of every document, weight of each
+            signal that was used)
+    """
+    doc_lengths = np.asarray(doc_lengths, dtype=np.float64)
+    signals = {}
+    if len(doc_lengths):
+        full_length = max(np.percentile(doc_lengths, LENGTH_PERCENTILE), 1.0)
+        signals["length"] = np.minimum(np.log1p(doc_lengths) / np.log1p(full_length), 1.0)
+        signals["tags"] = np.minimum(np.asarray(tag_counts, dtype=np.float64), MAX_TAGS) / MAX_TAGS
+    if popularity is not None:
+        popularity = np.nan_to_num(np.maximum(np.asarray(popularity, dtype=np.float64), 0.0))
+        if popularity.max(initial=0.0) > 0:
+            signals["popularity"] = np.log1p(popularity) / np.log1p(popularity.max())
+
+    weights = {name: PRIOR_SIGNALS[name] for name in signals}
+    priors = np.zeros(len(doc_lengths), dtype=np.float64)
+    for name, values in signals.items():
+        priors += weights[name] * values
+    if weights:
+        priors /= sum(weights.values())
+    return priors.astype(PRIOR_DTYPE), weights
+
+
+def read_priors(index):
+    """
+    Read the priors written by TieredIndexBuilder.
+
+    Args:
+        index (BinaryIndex | SegmentedIndex): Index to read the priors of
+
+    Returns:
+        np.ndarray: Prior of every document of the index, 0 for documents
+            added after the priors were computed; None when the index has
+            no priors
+    """
+    if "priors" not in index.manifest:
+        return None
+    priors = np.fromfile(os.path.join(index.index_folder, index.manifest["priors"]["file"]), dtype=PRIOR_DTYPE)
+    padded = np.zeros(index.num_docs, dtype=PRIOR_DTYPE)
+    padded[:min(len(priors), index.num_docs)] = priors[:index.num_docs]
+    return padded
+
+
+def open_first_tier(index):
+    """
+    Open the first tier written by TieredIndexBuilder.
+
+    Returns:
+        tuple: (BinaryIndex holding the highest impact postings of every
+            tiered term, best impact among the dropped postings of every
+            word_id), or None when the index has no first tier or one
+            written without cut-off impacts
+    """
+    first_tier = index.manifest.get("first_tier")
+    if first_tier is None or "cutoffs" not in first_tier:
+        return None
+    folder = os.path.join(index.index_folder, first_tier["folder"])
+    cutoffs = np.fromfile(os.path.join(folder, first_tier["cutoffs"]), dtype=SCORE_DTYPE)
+    return BinaryIndex(folder), cutoffs
+
+
+class TieredIndexBuilder:
+    def __init__(self, index_folder, doc_store_folder, popularity_file=None,
+                 first_tier_size=FIRST_TIER_SIZE, prior_weight=PRIOR_WEIGHT):
+        """
+        Add static document priors and a first tier of postings to a built
+        binary index.
+
+        A document's prior combines its length, how many tags it has and,
+        when a popularity file is given, its popularity; SearchEngine adds
+        it to the BM25 score of every result. The first tier keeps, for
+        every term with more than first_tier_size postings, only the
+        postings with the highest impact (BM25 score plus weighted prior).
+        It is a binary index of its own, stored with the best impact among
+        every term's dropped postings (its cut-off), so a query on frequent
+        terms can be answered from far shorter lists whenever the cut-offs
+        prove that the full lists would give the same results.
+
+        Args:
+            index_folder (str): Binary index folder to add to
+            doc_store_folder (str): Doc store of the index, for the tags
+            popularity_file (str, optional): CSV or Parquet file with url and
+                popularity columns, such as claps or inbound link counts
+            first_tier_size (int): Postings kept per term in the first tier
+            prior_weight (float): Weight of the prior in a posting's impact
+        """
+        self.index_folder = index_folder
+        self.doc_store_folder = doc_store_folder
+        self.popularity_file = popularity_file
+        self.first_tier_size = first_tier_size
+        self.prior_weight = prior_weight
+
+    def _read_documents(self, num_docs):
+        doc_store = DocStore(self.doc_store_folder)
+        tag_counts = np.zeros(num_docs, dtype=np.int32)
+        urls = [None] * num_docs
+        for doc_id in range(min(num_docs, doc_store.num_docs)):
+            document = doc_store.get(doc_id)
+            if document is not None:
+                tag_counts[doc_id] = count_tags(document['tags'])
+                urls[doc_id] = document['url']
+        return tag_counts, urls
+
+    def _read_popularity(self, urls):
+        # columnar imports pandas, which search.py loads this module without
+        from columnar import read_chunks
+        popularity_by_url = {}
+        for chunk in read_chunks(self.popularity_file, columns=['url', 'popularity']):
+            popularity_by_url.update(zip(chunk['url'], chunk['popularity'].astype(float)))
+        return np.array([popularity_by_url.get(url, np.nan) for url in urls], dtype=np.float64)
+
+    def _write_first_tier(self, index, priors):
+        # The tier is scored exactly like the index it was cut from, shards included
+        bm25 = dict(index.manifest["bm25"], **index.manifest.get("collection", {}))
+        scorer = BM25Scorer(index.doc_lengths, **bm25)
+        folder = os.path.join(self.index_folder, FIRST_TIER_FOLDER)
+        writer = BinaryIndexWriter(folder, index.doc_lengths, codec=index.manifest.get("codec", "raw"), **bm25)
+
+        # Terms that are not tiered drop nothing
+        cutoffs = np.zeros(index.manifest["max_word_id"] + 1, dtype=np.float64)
+        num_tiered = 0
+        for word_id in range(1, index.manifest["max_word_id"] + 1):
+            doc_ids = index.postings(word_id)
+            if len(doc_ids) <= self.first_tier_size:
+                continue
+            term_frequencies = index.term_frequencies(word_id)
+            impacts = scorer.term_scores(doc_ids, term_frequencies, len(doc_ids)) + self.prior_weight * priors[doc_ids]
+            # The tier stays in doc_id order, so it is searched like any other index
+            keep = np.sort(np.argpartition(-impacts, self.first_tier_size)[:self.first_tier_size])
+            writer.add(word_id, doc_ids[keep], term_frequencies[keep], document_frequency=len(doc_ids))
+            dropped = np.ones(len(doc_ids), dtype=bool)
+            dropped[keep] = False
+            cutoffs[word_id] = impacts[dropped].max()
+            num_tiered += 1
+        writer.close()
+        path = os.path.join(folder, CUTOFFS_FILE)
+        cutoffs.astype(SCORE_DTYPE).tofile(path + ".tmp")
+        os.replace(path + ".tmp", path)
+        return num_tiered
+
+    def build(self, first_tier=True):
+        """
+        Write the priors and, optionally, the first tier, then record them in
+        the index manifest, which makes searchers reload the index.
+
+        Args:
+            first_tier (bool): Also write the first tier; priors alone only
+                change the ranking
+
+        Returns:
+            int: Number of terms in the first tier
+        """
+        try:
+            index = BinaryIndex(self.index_folder)
+            tag_counts, urls = self._read_documents(index.num_docs)
+            popularity = self._read_popularity(urls) if self.popularity_file is not None else None
+            priors, weights = compute_priors(index.doc_lengths, tag_counts, popularity)
+
+            path = os.path.join(self.index_folder, PRIORS_FILE)
+            priors.tofile(path + ".tmp")
+            os.replace(path + ".tmp", path)
+            print(f"Priors of {len(priors)} documents from {', '.join(weights) or 'no signals'} saved to {path}")
+
+            manifest = dict(index.manifest)
+            # The popularity file is recorded so a segment merge can recompute the priors
+            manifest["priors"] = {"file": PRIORS_FILE, "signals": weights, "popularity_file": self.popularity_file}
+            manifest.pop("first_tier", None)
+            num_tiered = 0
+            if first_tier:
+                num_tiered = self._write_first_tier(index, priors)
+                manifest["first_tier"] = {"folder": FIRST_TIER_FOLDER, "cutoffs": CUTOFFS_FILE,
+                                          "postings_per_term": self.first_tier_size,
+                                          "prior_weight": self.prior_weight, "num_terms": num_tiered}
+                print(f"First tier of {num_tiered} terms saved to {os.path.join(self.index_folder, FIRST_TIER_FOLDER)}")
+
+            # The manifest goes last: searchers reopen the index when it changes
+            path = os.path.join(self.index_folder, MANIFEST_FILE)
+            with open(path + ".tmp", "w") as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(path + ".tmp", path)
+            return num_tiered
+
+        except Exception as e:
+            print(f"Error creating tiered index: {e}")
+            raise
+
+
+def main():
+    # File paths
+    index_folder = r"C:\Users\AT\CSV Dataset files\binary_index"
+    doc_store_folder = r"C:\Users\AT\CSV Dataset files\doc_store"
+
+    try:
+        builder = TieredIndexBuilder(index_folder, doc_store_folder)
+        builder.build()
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import heapq
+import numpy as np
+from metrics import current_trace
+
+# Guards block/term bounds against float32 rounding in the summed scores
+BOUND_SLACK = 1 + 1e-5
+
+# Posting blocks per scoring window, trading bound tightness for fewer Python-level steps
+WINDOW_BLOCKS = 8
+
+
+class TermCursor:
+    def __init__(self, doc_ids, term_frequencies, upper_bound,
+                 block_last_docs, block_max_scores, block_size, document_frequency=None):
+        """
+        Position within one term's posting list for document-at-a-time scoring.
+
+        Args:
+            doc_ids (np.ndarray): Sorted doc IDs of the term
+            term_frequencies (np.ndarray): Term frequencies parallel to doc_ids
+            upper_bound (float): Highest score the term gives any document
+            block_last_docs (np.ndarray): Last doc ID of each posting block
+            block_max_scores (np.ndarray): Highest score within each posting block
+            block_size (int): Number of postings per block
+            document_frequency (int, optional): Document frequency the term
+                is scored with, e.g. over all shards; defaults to len(doc_ids)
+        """
+        self.doc_ids = doc_ids
+        self.term_frequencies = term_frequencies
+        self.num_postings = len(doc_ids)
+        self.document_frequency = len(doc_ids) if document_frequency is None else document_frequency
+        self.upper_bound = upper_bound * BOUND_SLACK
+        self.block_last_docs = block_last_docs
+        self.block_max_scores = block_max_scores
+        self.block_size = block_size
+        self.pos = 0
+
+    @property
+    def exhausted(self):
+        return self.pos >= self.num_postings
+
+    def current_doc(self):
+        return int(self.doc_ids[self.pos])
+
+    def current_block(self):
+        return self.pos // self.block_size
+
+    def lookahead_doc(self, num_blocks):
+        """Last doc ID of the block num_blocks - 1 ahead of the current one."""
+        block = min(self.current_block() + num_blocks, len(self.block_last_docs)) - 1
+        return int(self.block_last_docs[block])
+
+    def window_blocks(self, end_doc):
+        """Blocks [first, last] holding this cursor's postings up to end_doc."""
+        first = self.current_block()
+        last = first + int(np.searchsorted(self.block_last_docs[first:], end_doc))
+        return first, min(last, len(self.block_last_docs) - 1)
+
+    def window_max(self, end_doc):
+        first, last = self.window_blocks(end_doc)
+        return float(self.block_max_scores[first:last + 1].max()) * BOUND_SLACK
+
+    def advance_past(self, end_doc):
+        """Move to the first posting after end_doc."""
+        _, last = self.window_blocks(end_doc)
+        block_start = max(last * self.block_size, self.pos)
+        block = self.doc_ids[block_start:(last + 1) * self.block_size]
+        self.pos = block_start + int(np.searchsorted(block, end_doc, side="right"))
+
+    def term_scores(self, scorer, doc_ids, term_frequencies):
+        """Scores of postings of this cursor's term."""
+        return scorer.term_scores(doc_ids, term_frequencies, self.document_frequency)
+
+
+class PriorCursor(TermCursor):
+    def __init__(self, prior_scores):
+        """
+        Static document scores, added to the score of every result.
+
+        The evaluator never walks this cursor; it is only probed for the
+        candidates the query terms find, like a non-essential term that
+        every document contains.
+
+        Args:
+            prior_scores (np.ndarray): Weighted prior of every document,
+                indexed by doc_id
+        """
+        num_docs = len(prior_scores)
+        upper_bound = float(prior_scores.max()) if num_docs else 0.0
+        super().__init__(np.arange(num_docs), prior_scores, upper_bound,
+                         np.array([num_docs - 1]), np.array([upper_bound]), max(num_docs, 1))
+
+    def term_scores(self, scorer, doc_ids, term_frequencies):
+        return term_frequencies
+
+
+class MaxScoreEvaluator:
+    def __init__(self, scorer):
+        """
+        Top-k retrieval with block-max MaxScore dynamic pruning.
+
+        Terms are split into essential and non-essential lists: once the
+        k-th best score (the threshold) exceeds the summed upper bounds of
+        the lowest-impact terms, those terms can no longer produce a result
+        on their own and are only probed for candidates found elsewhere.
+        Essential lists are walked a window of posting blocks at a time, and
+        blocks whose maximum score cannot beat the threshold are skipped
+        without being scored.
+
+        Args:
+            scorer (BM25Scorer): Scorer used for the postings
+        """
+        self.scorer = scorer
+
+    def _score_essential(self, essential, end_doc, other_bounds, threshold):
+        """Score the live essential postings up to end_doc and advance past them."""
+        doc_parts, score_parts = [], []
+        for cursor, other_bound in zip(essential, other_bounds):
+            first, last = cursor.window_blocks(end_doc)
+            live = np.flatnonzero(
+                cursor.block_max_scores[first:last + 1] * BOUND_SLACK + other_bound > threshold
+            ) + first
+
+            window_start = cursor.pos
+            cursor.advance_past(end_doc)
+            for block in live.tolist():
+                start = max(block * cursor.block_size, window_start)
+                stop = min((block + 1) * cursor.block_size, cursor.pos)
+                if start >= stop:
+                    continue
+                doc_ids = np.asarray(cursor.doc_ids[start:stop])
+                doc_parts.append(doc_ids)
+                score_parts.append(cursor.term_scores(
+                    self.scorer, doc_ids, cursor.term_frequencies[start:stop]
+                ))
+
+        if not doc_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        doc_ids = np.concatenate(doc_parts)
+        scores = np.concatenate(score_parts).astype(np.float64)
+        if len(doc_parts) == 1 or len(essential) == 1:
+            return doc_ids, scores
+
+        doc_ids, inverse = np.unique(doc_ids, return_inverse=True)
+        return doc_ids, np.bincount(inverse, weights=scores)
+
+    def _score_non_essential(self, non_essential, doc_ids, scores, threshold):
+        """Probe non-essential lists for the surviving candidates, highest bound first."""
+        remaining = sum(cursor.upper_bound for cursor in non_essential)
+        for cursor in reversed(non_essential):
+            keep = scores + remaining > threshold
+            doc_ids, scores = doc_ids[keep], scores[keep]
+            if len(doc_ids) == 0:
+                break
+
+            remaining -= cursor.upper_bound
+            positions = np.searchsorted(cursor.doc_ids, doc_ids)
+            positions = np.minimum(positions, cursor.num_postings - 1)
+            matches = np.asarray(cursor.doc_ids[positions]) == doc_ids
+            if matches.any():
+                scores[matches] += cursor.term_scores(
+                    self.scorer,
+                    doc_ids[matches],
+                    cursor.term_frequencies[positions[matches]],
+                )
+
+        keep = scores > threshold
+        return doc_ids[keep], scores[keep]
+
+    def top_k(self, cursors, k, prior=None):
+        """
+        Return the k highest scoring documents.
+
+        Args:
+            cursors (list): TermCursor for every query term
+            k (int): Number of results to return
+            prior (PriorCursor, optional): Static scores added to every
+                result; always non-essential, so it only prunes
+
+        Returns:
+            list: (doc_id, score) tuples, highest score first with ties
+                broken by ascending doc_id
+        """
+        cursors = [cursor for cursor in cursors if cursor.num_postings > 0]
+        if k <= 0 or not cursors:
+            return []
+
+        trace = current_trace()
+        cursors.sort(key=lambda cursor: cursor.upper_bound)
+        prior_bound = prior.upper_bound if prior is not None else 0.0
+        bound_prefix = prior_bound + np.cumsum([cursor.upper_bound for cursor in cursors])
+        priors = [prior] if prior is not None else []
+
+        # Bounded min-heap of (score, -doc_id); its root is the current k-th best
+        heap = []
+        while True:
+            threshold = heap[0][0] if len(heap) == k else 0.0
+
+            num_non_essential = int(np.searchsorted(bound_prefix, threshold, side="right"))
+            non_essential = priors + cursors[:num_non_essential]
+            essential = [cursor for cursor in cursors[num_non_essential:] if not cursor.exhausted]
+            if not essential:
+                break
+            non_essential_bound = bound_prefix[num_non_essential - 1] if num_non_essential else prior_bound
+
+            # Window spanning a few blocks of the densest essential list
+            end_doc = min(cursor.lookahead_doc(WINDOW_BLOCKS) for cursor in essential)
+            in_window = [cursor for cursor in essential if cursor.current_doc() <= end_doc]
+            window_maxes = [cursor.window_max(end_doc) for cursor in in_window]
+            window_bound = non_essential_bound + sum(window_maxes)
+
+            if window_bound <= threshold:
+                for cursor in in_window:
+                    cursor.advance_past(end_doc)
+                continue
+
+            # A block can only matter if it beats the threshold together with everything else
+            other_bounds = [window_bound - window_max for window_max in window_maxes]
+            doc_ids, scores = self._score_essential(in_window, end_doc, other_bounds, threshold)
+            trace.count("candidates_scored", len(doc_ids))
+            if non_essential:
+                doc_ids, scores = self._score_non_essential(non_essential, doc_ids, scores, threshold)
+            else:
+                keep = scores > threshold
+                doc_ids, scores = doc_ids[keep], scores[keep]
+
+            for doc_id, score in zip(doc_ids.tolist(), scores.tolist()):
+                entry = (score, -doc_id)
+                if len(heap) < k:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+
+        return [(-neg_doc_id, score) for score, neg_doc_id in sorted(heap, reverse=True)]
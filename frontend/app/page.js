@@ -8,6 +8,7 @@ export default function SearchPage() {
   const [totalPages, setTotalPages] = useState(0); // Total pages
   const [searched, setSearched] = useState(false); // Track if search has been performed
   const [loading, setLoading] = useState(false); // Track loading state
+  const [suggestions, setSuggestions] = useState([]); // Completions of the word being typed
 
   const fetchResults = async (page = 1) => {
     setResults([]); // Clear results before fetching new ones
@@ -111,6 +112,37 @@ export default function SearchPage() {
     };
   }, []); // Empty dependency array since we want this to run only once on mount
 
+  // Fetch completions while typing, after a short pause
+  useEffect(() => {
+    if (!query.trim() || query.endsWith(" ")) {
+      setSuggestions([]);
+      return;
+    }
+
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const response = await fetch(
+          `http://127.0.0.1:5000/suggest?query=${encodeURIComponent(query)}&limit=8`,
+          { signal: controller.signal }
+        );
+        if (response.ok) {
+          const data = await response.json();
+          setSuggestions(data.suggestions || []);
+        }
+      } catch (error) {
+        if (error.name !== "AbortError") {
+          console.error("Error fetching suggestions:", error.message);
+        }
+      }
+    }, 150);
+
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [query]);
+
   const renderPagination = () => {
     const visiblePages = 5; // Number of visible page links
     const pages = [];
@@ -199,7 +231,14 @@ export default function SearchPage() {
           value={query}
           onChange={(e) => setQuery(e.target.value)}
           onKeyDown={(e) => e.key === "Enter" && handleSearch()}
+          list="search-suggestions"
+          autoComplete="off"
         />
+        <datalist id="search-suggestions">
+          {suggestions.map((suggestion) => (
+            <option key={suggestion} value={suggestion} />
+          ))}
+        </datalist>
         <span className="search-icon" onClick={handleSearch}></span>
       </div>
 